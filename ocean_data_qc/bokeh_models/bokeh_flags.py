@@ -10,6 +10,7 @@ from bokeh.models.widgets.markups import Div
 from bokeh.models.widgets import Select
 from bokeh.layouts import row, column
 import numpy as np
+import pandas as pd
 
 from ocean_data_qc.env import Environment
 from ocean_data_qc.constants import *
@@ -18,8 +19,24 @@ import traceback
 
 class BokehFlags(Environment):
     ''' Class to manage Flag Controls and its Events
+
+        The flag updates can be undone. Only the delta of each update is stored in the stacks:
+
+            {
+                'column': 'SALNTY_FLAG_W',
+                'rows': np.array([3, 7, 8]),            # row positions in the DF and in the CDS
+                'hash_ids': pd.Index([...]),            # HASH_IDs of the rows
+                'index': cruise_data.df.index,          # index of the DF when the update was made
+                'old_values': np.array([2, 2, 3]),
+                'new_value': 4,
+            }
+
+        So undoing or redoing an update costs the same as the update itself.
+        If rows were added or removed afterwards (cruise data update) the positions are searched
+        again by HASH_ID (see _get_delta_rows)
     '''
     env = Environment
+    UNDO_LEVELS = 100
 
     @property
     def all_flags_list(self):
@@ -35,6 +52,8 @@ class BokehFlags(Environment):
         self.all_flags_vb_bt = None
         self.flags_control_header_row = None
         self.flag_rows = []
+        self.undo_stack = []
+        self.redo_stack = []
 
         self._init_flagger_select()
         self._init_flags_control_header()
@@ -242,10 +261,6 @@ class BokehFlags(Environment):
 
     def update_flag_value(self, flag_value=None, flag_to_update=None, row_indexes=[]):
         lg.info('-- UPDATE FLAG VALUE')
-        self.env.bk_bridge.call_js({
-            'object': 'tools',
-            'function': 'show_wait_cursor',
-        })
         if flag_value is None:
             lg.error('>> An empty flag value got to `self.env.bk_flags.update_flag_value()`')
         if flag_to_update is None:
@@ -253,19 +268,132 @@ class BokehFlags(Environment):
         if row_indexes == []:
             lg.error('>> NO row_indexes selected')
 
-        self.env.cruise_data.update_flag_values(
-            column=flag_to_update,
-            new_flag_value=flag_value,
-            row_indices=row_indexes,
+        rows = np.unique(np.asarray(row_indexes, dtype=int))
+        df = self.env.cruise_data.df
+        old_values = df[flag_to_update].to_numpy()[rows].astype(int)
+        self._set_flag_values(flag_to_update, rows, old_values, flag_value)
+
+        self.undo_stack.append({
+            'column': flag_to_update,
+            'rows': rows,
+            'hash_ids': df.index[rows],
+            'index': df.index,
+            'old_values': old_values,
+            'new_value': flag_value,
+        })
+        if len(self.undo_stack) > self.UNDO_LEVELS:
+            del self.undo_stack[0]
+        self.redo_stack = []
+
+        self._show_snackbar('{} values of {} updated with the flag value {}'.format(
+            len(rows),
+            flag_to_update,
+            flag_value,
+        ))
+
+    def undo(self):
+        ''' Restores the old values of the last flag update '''
+        lg.info('-- UNDO FLAG UPDATE')
+        if self.undo_stack == []:
+            self._show_snackbar('There is nothing to undo')
+            return
+        delta = self.undo_stack.pop()
+        rows, old_values = self._get_delta_rows(delta)
+        if rows is None or rows.size == 0:
+            self._show_snackbar('The flag update cannot be undone, the rows of the data changed')
+            return
+        self._set_flag_values(
+            column=delta['column'],
+            rows=rows,
+            old_values=self.env.cruise_data.df[delta['column']].to_numpy()[rows].astype(int),
+            new_values=old_values,
+            action='QC Undo'
         )
-        new_values = np.array(self.env.source.data[flag_to_update], dtype=int)  # TODO: Int8 or Int64
-        new_values[row_indexes] = flag_value
-        self.env.source.data[flag_to_update] = new_values
-        self.env.bk_sources.cds_df[flag_to_update] = new_values
+        self.redo_stack.append(delta)
+        self._show_snackbar('Undone: {} values of {} updated with the flag value {}'.format(
+            rows.size, delta['column'], delta['new_value']
+        ))
+
+    def redo(self):
+        ''' Applies again the last flag update undone '''
+        lg.info('-- REDO FLAG UPDATE')
+        if self.redo_stack == []:
+            self._show_snackbar('There is nothing to redo')
+            return
+        delta = self.redo_stack.pop()
+        rows, old_values = self._get_delta_rows(delta)
+        if rows is None or rows.size == 0:
+            self._show_snackbar('The flag update cannot be redone, the rows of the data changed')
+            return
+        self._set_flag_values(
+            column=delta['column'],
+            rows=rows,
+            old_values=self.env.cruise_data.df[delta['column']].to_numpy()[rows].astype(int),
+            new_values=delta['new_value'],
+            action='QC Redo'
+        )
+        self.undo_stack.append(delta)
+        self._show_snackbar('Redone: {} values of {} updated with the flag value {}'.format(
+            rows.size, delta['column'], delta['new_value']
+        ))
+
+    def _get_delta_rows(self, delta):
+        ''' Returns the current positions of the rows of the @delta and their old values.
+            If the index of the DF changed the rows are searched by HASH_ID, the removed rows are skipped.
+            If they cannot be found (repeated HASH_IDs or the column was removed) both stacks
+            are cleared and (None, None) is returned
+        '''
+        df = self.env.cruise_data.df
+        if delta['index'] is df.index or delta['index'].equals(df.index):
+            return delta['rows'], delta['old_values']
+        keys = self.env.cruise_data.row_keys.index
+        if delta['column'] not in df.columns or not keys.is_unique:
+            lg.warning('>> THE ROWS OF THE DATA CHANGED, THE UNDO AND REDO STACKS ARE CLEARED')
+            self.undo_stack = []
+            self.redo_stack = []
+            return None, None
+        rows = keys.get_indexer(delta['hash_ids'])
+        found = rows >= 0
+        return rows[found], delta['old_values'][found]
+
+    def _set_flag_values(self, column, rows, old_values, new_values, action='QC Update'):
+        ''' Updates the flag @column in the positions @rows of the DF, the CDS and the flag views.
+            Only the modified rows are patched, the whole column is not sent again
+                @old_values: current values of the rows
+                @new_values: one value for all the rows, or one value per row
+        '''
+        self.env.bk_bridge.call_js({
+            'object': 'tools',
+            'function': 'show_wait_cursor',
+        })
+        new_values = np.broadcast_to(np.asarray(new_values, dtype=int), rows.shape)
+        for value in np.unique(new_values):     # a moves log entry per row, with its new value
+            self.env.cruise_data.update_flag_values(
+                column=column,
+                new_flag_value=int(value),
+                row_indices=rows[new_values == value].tolist(),
+                action=action,
+            )
+        cps = self.env.cruise_data.update_flag_cps({        # _SALINITY, _OXYGEN...
+            column: self.env.cruise_data.df.index[rows]
+        })
 
-        # Updating flag colors
         self.env.doc.hold('collect')
-        self.env.bk_plots_handler.replot_color_circles()
+        patches = {
+            column: list(zip(rows.tolist(), new_values.tolist()))
+        }
+        cds_df = self.env.bk_sources.cds_df
+        cds_df.iloc[rows, cds_df.columns.get_loc(column)] = new_values
+        for cp, positions in cps.items():
+            if cp in cds_df.columns:
+                values = self.env.cruise_data.df[cp].to_numpy()[positions]
+                cds_df.iloc[positions, cds_df.columns.get_loc(cp)] = values
+                if cp in self.env.source.data:
+                    patches[cp] = list(zip(positions.tolist(), values.tolist()))
+        self.env.source.patch(patches)
+
+        # Updating flag colors
+        self.env.bk_plots_handler.patch_color_circles(column, rows, old_values, new_values)
 
         # NOTE: update datatable and prof sources is needed because the new flag could be invisible,
         #       then the profiles should be invisible as well
@@ -278,14 +406,12 @@ class BokehFlags(Environment):
             'object': 'tools',
             'function': 'show_default_cursor',
         })
+
+    def _show_snackbar(self, msg):
         self.env.bk_bridge.call_js({
             'object': 'tools',
             'function': 'show_snackbar',
-            'params': ['{} values of {} updated with the flag value {}'.format(
-                len(row_indexes),
-                flag_to_update,
-                flag_value,
-            )],
+            'params': [msg],
         })
 
     def _update_visible_flags(self, to_visible_flags=[]):
@@ -15,6 +15,7 @@ from ocean_data_qc.bokeh_models.bokeh_map import BokehMap
 from ocean_data_qc.bokeh_models.bokeh_export import BokehExport
 
 from ocean_data_qc.data_models.cruise_data_handler import CruiseDataHandler
+from ocean_data_qc.data_models.loading_task import LoadingTask
 
 from bokeh.layouts import column
 from bokeh.models.layouts import Spacer
@@ -35,8 +36,14 @@ class BokehLoader(Environment):
     def init_bokeh(self, args={}):
         if self.env.ts_state is None:
             self.env.ts_state = args.get('ts_state', None)
-        if self.env.cruise_data is None:
-            self.env.cd_handler._init_cruise_data()
+        if self.env.cruise_data is None:  # the bokeh objects are created when the file is loaded
+            return LoadingTask(
+                target=self.env.cd_handler._init_cruise_data,
+                on_done=self._init_bokeh_objects
+            )
+        self._init_bokeh_objects()
+
+    def _init_bokeh_objects(self):
         BokehSources()
         self.env.bk_sources.load_data()
         BokehPlotsHandler()
@@ -75,6 +82,7 @@ class BokehLoader(Environment):
             'bk_bridge',
             'cruise_data',      # only if a session is closed or the opening is cancelled
             'f_handler',        # nothing important in the __init__ method
+            'cd_writer',        # background thread, the pending changes are discarded with the cruise data
             'ts_state',
             'oct_eq',           # octave path manager
             'bk_export',
@@ -115,6 +123,7 @@ class BokehLoader(Environment):
 
     def reset_env_cruise_data(self):
         lg.info('-- RESET ENV + CRUISE DATA')
+        self.env.cd_writer.discard()
         self.reset_bokeh()
         self.reset_env(reset=['cruise_data'])
 
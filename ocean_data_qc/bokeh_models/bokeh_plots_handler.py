@@ -12,6 +12,8 @@ from ocean_data_qc.env import Environment
 from ocean_data_qc.bokeh_models.bokeh_plots import BokehPlots
 from ocean_data_qc.constants import *
 
+import numpy as np
+
 
 class BokehPlotsHandler(Environment):
     ''' The purpose of this class is to instantiate all the bokeh
@@ -174,6 +176,22 @@ class BokehPlotsHandler(Environment):
                     self.env.flag_views[tab][key].filters = [IndexFilter([])]
         # lg.info('>> SELF.ENV.FLAG_VIEWS: {}'.format(self.env.flag_views))
 
+    def patch_color_circles(self, column, rows, old_values, new_values):
+        ''' Moves the @rows from the views of their @old_values to the views of their @new_values,
+            in the tabs where the flag @column is selected. The rest of the views are not modified
+        '''
+        lg.info('-- PATCH COLOR CIRCLES')
+        for tab in list(self.env.tabs_flags_plots.keys()):
+            if self.env.tabs_flags_plots[tab]['flag'] != column:
+                continue
+            for key in np.union1d(old_values, new_values).tolist():
+                if key not in self.env.flag_views[tab]:
+                    continue
+                view = self.env.flag_views[tab][key]
+                indices = np.setdiff1d(view.filters[0].indices, rows[old_values == key])
+                indices = np.union1d(indices, rows[new_values == key])
+                view.filters = [IndexFilter(indices.astype(int).tolist())]
+
     def deselect_tool(self):
         self.env.reset_selection = True  # this does not work anymore
         self.env.selection = []
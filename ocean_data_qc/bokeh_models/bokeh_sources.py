@@ -30,7 +30,7 @@ class BokehSources(Environment):
         self._init_cds_df()
         self._init_bathymetric_map_data()
         self.env.stations = self.env.cruise_data.stations
-        self.env.source = ColumnDataSource(self.env.cds_df)
+        self.env.source = ColumnDataSource(self.env.cds_df[self._get_source_cols()])
         self._init_prof_ml_source()
         self._init_astk_src()
         self._init_all_flag_values()
@@ -43,10 +43,20 @@ class BokehSources(Environment):
         if self.env.cruise_data.df is None:
             self.env.cruise_data.load_file()  # for AQC files
         length = len(self.env.cruise_data.df.index)
-        index = np.array(np.array(list(range(0,length))))
-        self.env.cds_df = self.env.cruise_data.df.copy(deep=True)   # TODO: copy only the columns needed, not all of them??
-        self.env.cds_df['INDEX'] = index                               # NOTE: the index will coincide with the row position
-        self.env.cds_df = self.env.cds_df.set_index(['INDEX'])          #       so .iloc can be used in order to get the rows
+        self.env.cds_df = self.env.cruise_data.df.copy(deep=False)     # NOTE: the columns may be memory-mapped, they are
+                                                                       #       not copied, so they are read only if they are used
+        self.env.cds_df.index = pd.Index(np.arange(length), name='INDEX')  # NOTE: the index will coincide with the row position
+                                                                       #       so .iloc can be used in order to get the rows
+
+    def _get_source_cols(self):
+        ''' Only the columns used by the plots are sent to the main ColumnDataSource:
+            the plotted columns, the flags (to color the circles and the tooltips) and the station
+        '''
+        cols = [STNNBR]
+        for g in self.env.f_handler.graphs:   # the axis names without the reverse sign
+            cols.extend([g.x, g.y])
+        cols.extend(self.env.cruise_data.get_cols_by_attrs('flag'))
+        return [c for c in dict.fromkeys(cols) if c in self.env.cds_df.columns]
 
     def _epsg4326_to_epsg3857(self, lon, lat):
         x = lon * 20037508.34 / 180
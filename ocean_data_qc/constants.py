@@ -22,9 +22,13 @@ OUTPUT_BACKEND = 'canvas'    # Even if I change this to 'canvas',
 STNNBR = 'STNNBR'           # Stations column
 CTDPRS = 'CTDPRS'           # Pressure
 FLAG_END = '_FLAG_W'        # Flag distinctive
+CRUISE_ID = 'CRUISE_ID'     # Source file of each row in the multi-file projects
 
 NA_REGEX_LIST = [r'^-999[9]?[\.0]*?$']
 NA_REGEX = '^-999[9]?[\.0]*?$'
+NA_VALUES = [-999, -9999]  # missing values in numeric columns
+
+STR_COLS = [STNNBR, 'TIME', 'DATE', CRUISE_ID]  # always loaded as strings, as the catalog 'string' columns
 
 # ---------------------- URLS ----------------------------- #
 
@@ -78,6 +82,7 @@ FILES = path.join(APPDATA, 'ocean-data-qc', 'files')
 TMP = path.join(APPDATA, 'ocean-data-qc', 'files', 'tmp')
 UPD = path.join(APPDATA, 'ocean-data-qc', 'files', 'tmp', 'update')
 EXPORT = path.join(APPDATA, 'ocean-data-qc', 'files', 'tmp', 'export')
+ORIGINALS = path.join(APPDATA, 'ocean-data-qc', 'files', 'tmp', 'originals')   # files of a multi-file project
 IMG = path.join(OCEAN_DATA_QC_PY, 'static', 'img')
 
 PROJ_SETTINGS = path.join(TMP, 'settings.json')
@@ -87,6 +92,7 @@ DEFAULT_SETTINGS = path.join(OCEAN_DATA_QC_JS, 'src', 'files', 'default_settings
 SHARED_DATA = path.join(FILES, 'shared_data.json')
 
 MOVES_CSV = path.join(TMP, 'moves.csv')
+PENDING_WRITES = path.join(TMP, 'pending_writes')     # it exists while some changes are not written yet
 
 APP_SHORT_NAME = 'OCEANDATAQC'
 APP_LONG_NAME = 'AtlantOS Ocean Data QC'
@@ -4,14 +4,22 @@
 #    AUTHORS and LICENSE files at the root folder of this application   #
 #########################################################################
 
+from ocean_data_qc.data_models.computed_parameter_registry import ComputedParameterRegistry
 from ocean_data_qc.data_models.cruise_data_handler import CruiseDataHandler
+from ocean_data_qc.data_models.cruise_data_writer import CruiseDataWriter
 from ocean_data_qc.data_models.electron_bokeh_bridge import ElectronBokehBridge
 from ocean_data_qc.data_models.files_handler import FilesHandler
 from ocean_data_qc.data_models.octave_equations import OctaveEquations
 
+import multiprocessing
 
-CruiseDataHandler()
-FilesHandler()
-OctaveEquations()
-ElectronBokehBridge()
+
+# the worker processes of the multi-file projects only parse the files (see CruiseDataMulti)
+if multiprocessing.parent_process() is None:
+    ComputedParameterRegistry()
+    CruiseDataHandler()
+    CruiseDataWriter()
+    FilesHandler()
+    OctaveEquations()
+    ElectronBokehBridge()
 
@@ -6,26 +6,36 @@
 
 from bokeh.util.logconfig import bokeh_logger as lg
 from ocean_data_qc.constants import *
-from ocean_data_qc.data_models.exceptions import ValidationError
+from ocean_data_qc.data_models.computed_parameter_compiler import EquationCompiler
 from ocean_data_qc.env import Environment
 
-import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+import numpy as np
+import os
+import pandas as pd
 from os import path, environ, getenv
+from pandas.api.types import is_numeric_dtype
 import re
-from math import *
 import seawater as sw
 import types
+import threading
 import subprocess as sbp
 from importlib import import_module
 
 
 class ComputedParameter(Environment):
     env = Environment
+    _octave_lock = threading.Lock()     # oct2py runs only one Octave session, shared by all the threads
+    PROFILE_FUNCS = ['bfrq', 'gpan', 'gvel', 'dist']    # the result of a row depends on the other rows
 
     def __init__(self, cruise_data=False):
         lg.info('-- INIT COMPUTED PARAMETER')
-        self.sandbox_vars = None
         self.sandbox_funcs = None
+        self.sandbox_version = None
+        self.octave_funcs = set()
+        self._deps_cache = None        # (cols, key, result) of check_dependencies
         if cruise_data is not False:
             self.cruise_data = cruise_data
         else:
@@ -50,15 +60,8 @@ class ComputedParameter(Environment):
 
     @property
     def proj_settings_cps(self):
-        # TODO: this is executed many time when the app load a file, avoid multiple file reading to improve efficiency
-        try:
-            proj_settings = json.load(open(PROJ_SETTINGS))
-            return proj_settings['computed_params'] if 'computed_params' in proj_settings else {}
-        except Exception:
-            raise ValidationError(
-                'Project JSON settings file could be opened to process the calculated parameters',
-                rollback='cd'  # TODO: only if we are loading the files in the initialization
-            )
+        ''' The settings file is only parsed when it changes (see ComputedParameterRegistry) '''
+        return self.env.cp_registry.all()
 
     def add_computed_parameter(self, arg):
         ''' It adds the computed parameter to cols and to the project.
@@ -73,39 +76,158 @@ class ComputedParameter(Environment):
                 'msg': 'value is mandatory',
             }
 
-        for cp in self.proj_settings_cps:  # NOTE: list of dicts, I need to iterate over all the items to get the cp to add
-            if cp['param_name'] == val:
-                prec = int(cp['precision'])
-                new_cp = {
-                    'eq': cp['equation'],
-                    'computed_param_name': cp['param_name'],
-                    'precision': prec,
+        cp = self.env.cp_registry.get(val)
+        if cp is not None:
+            if prevent_save:  # loading time
+                self.cruise_data._report_progress('Computing {}'.format(val))
+            prec = int(cp['precision'])
+            new_cp = {
+                'eq': cp['equation'],
+                'computed_param_name': cp['param_name'],
+                'precision': prec,
+            }
+            result = self.compute_equation(new_cp)
+            if result.get('success', False):
+                self._add_col(cp)
+                if prevent_save is False:
+                    self.cruise_data.save_col_attribs()
+            else:
+                self._log_failure(val, result)
+            return result
+
+    def compute_cps(self, names=None, add_cols=True, dirty=None, log_moves=True):
+        ''' Computes the CPs of the project (only the CPs in @names if it is set) and adds them to the DF.
+            The CPs form a graph of dependencies, for instance _SALINITY and _PRESSURE are needed
+            to compute _THETA, and _THETA is needed to compute AOU:
+
+                * a CP is computed as soon as the CPs it needs are computed, in a thread pool,
+                  so the independent branches of the graph are computed at the same time.
+                  The Octave functions are not thread safe, they are run one by one
+                * the new columns are kept in memory and passed to the CPs that need them,
+                  the DF is only modified at the end, in this thread
+
+            @add_cols - the computed CPs are added to cols as well
+            @dirty - {column: HASH_IDs of the modified rows, or None if all the rows were modified}.
+                     If it is set only the CPs that depend on the modified columns are computed again,
+                     and only the modified rows if the equation is computed row by row.
+                     The CPs whose values change are added to @dirty, so the CPs that depend
+                     on them are updated as well
+            @log_moves - the functions that read the DF directly add their messages to the actions history
+            Returns {param_name: result}, with the same result as compute_equation
+        '''
+        lg.info('-- COMPUTE CPS')
+        registry = self.env.cp_registry
+        cps = OrderedDict((c['param_name'], c) for c in registry.all())
+        names = list(cps.keys()) if names is None else [n for n in names if n in cps]
+        results = {}
+        nodes = {}
+        for n in names:
+            try:
+                nodes[n] = self._compile_cp(n)
+            except ValueError as e:
+                results[n] = {
+                    'success': False,
+                    'msg': 'The equation could not be computed: {}'.format(cps[n]['equation']),
+                    'error': '{}'.format(e),
+                }
+
+        # a CP that is not computed now is taken from the DF as any other column
+        deps = {n: [i for i in nodes[n].ids if i in nodes and i != n] for n in nodes}
+        dependents = {n: [] for n in nodes}
+        for n in nodes:
+            for d in deps[n]:
+                dependents[d].append(n)
+        pending = {n: len(deps[n]) for n in nodes}
+        ready = [n for n in names if n in nodes and pending[n] == 0][::-1]
+
+        def release(n):
+            for d in dependents[n]:
+                pending[d] -= 1
+                if pending[d] == 0:
+                    ready.append(d)
+
+        df = self.cruise_data.df
+        memo = {}
+        futures = {}
+        workers = max(min(len(nodes), os.cpu_count() or 1), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while ready or futures:
+                while ready:
+                    n = ready.pop()
+                    compiled = nodes[n]
+                    missing = [i for i in compiled.ids if i not in memo and i not in df.columns]
+                    if missing:
+                        results[n] = {
+                            'success': False,
+                            'msg': 'Some identifiers do not exist in the current dataframe: {}'.format(missing[0]),
+                        }
+                        release(n)
+                        continue
+                    rows = None
+                    if dirty is not None and n in df.columns:
+                        inputs = [i for i in self._get_inputs(compiled) if i in dirty]
+                        if inputs and self._is_row_wise(compiled) and all(dirty[i] is not None for i in inputs):
+                            rows = df.index.intersection(
+                                pd.Index([]).append([dirty[i] for i in inputs]).unique()
+                            )
+                        if inputs == [] or (rows is not None and rows.empty):
+                            results[n] = {'success': True}     # the values of the CP did not change
+                            release(n)
+                            continue
+                    self.cruise_data._report_progress('Computing {}'.format(n))
+                    columns = {i: memo[i] if i in memo else df[i] for i in compiled.ids}
+                    index = df.index
+                    if rows is not None:
+                        columns = {i: c.loc[rows] for i, c in columns.items()}
+                        index = rows
+                    f = executor.submit(
+                        self._evaluate, compiled, columns, index, int(cps[n]['precision']), log_moves
+                    )
+                    futures[f] = (n, rows)
+                if futures:
+                    done, not_done = wait(list(futures.keys()), return_when=FIRST_COMPLETED)
+                    for f in done:
+                        n, rows = futures.pop(f)
+                        try:
+                            column = values = f.result()
+                            if rows is not None:        # the rest of the rows keep the old values
+                                column = df[n].astype(np.result_type(df[n].dtype, values.dtype))
+                                column.loc[rows] = values
+                            if dirty is not None:
+                                changed = self._get_changed_rows(df[n] if n in df.columns else None, column)
+                                if changed is None or not changed.empty:
+                                    dirty[n] = changed
+                            memo[n] = column
+                            results[n] = {'success': True}
+                        except Exception as e:
+                            results[n] = {
+                                'success': False,
+                                'msg': 'The equation could not be computed: {} = {}'.format(n, nodes[n].eq),
+                                'error': '{}'.format(e),
+                            }
+                        release(n)
+
+        for n in nodes:
+            if n not in results:
+                results[n] = {
+                    'success': False,
+                    'msg': 'Circular dependency in the equation of {}'.format(n),
                 }
-                result = self.compute_equation(new_cp)
-                if result.get('success', False):
-                    self.cruise_data.cols[val] = {
-                        'external_name': [],
-                        'data_type': 'integer' if prec == 0 else 'float',
-                        'attrs': ['computed'],
-                        'unit': cp.get('units', False),
-                        'precision': prec,
-                        'export': False
-                    }
-                    if prevent_save is False:
-                        self.cruise_data.save_col_attribs()
-                    lg.info('>> CP <<{}>> ADDED'.format(val))
-                else:
-                    msg = ''
-                    if 'error' in result:
-                        msg = result.get('error', '')  # TODO: remove "\n" fro here?
-                    elif 'msg' in result:
-                        msg = result.get('msg', '')
-                    lg.warning('>> CP <<{}>> COULD NOT BE COMPUTED: {}'.format(
-                        cp['param_name'], msg
-                    ))
-                return result
+        for n in names:             # the columns are added in the order of the settings
+            if results[n].get('success', False):
+                if n in memo:
+                    self._store(n, memo[n])
+                if add_cols:
+                    self._add_col(cps[n])
+            else:
+                self._log_failure(n, results[n])
+        return results
 
     def compute_equation(self, args):
+        ''' Computes the equation and stores the result in the column @computed_param_name.
+            The equation is compiled only once (see EquationCompiler), the following times
+            the cached compiled equation is evaluated directly over the columns
+        '''
         try:
             prec = int(args.get('precision', 5))
         except Exception:
@@ -115,104 +237,160 @@ class ComputedParameter(Environment):
             args.get('computed_param_name', 'AUX'),
             prec
         )
-        eq = re.sub(' ', '', eq)   # remove spaces
-
-        if eq == '':
+        if re.sub(' ', '', eq) == '':
             lg.error('ERROR: Empty equation')
 
-        def repl(match):
-            """ This function is run for each found ocurrence """
-            inner_word = match.group(0)
-            new_var = False
-            param_name = inner_word[2:-1]   # removin characters: ${PARAM} >> PARAM
-            for elem in self.proj_settings_cps:
-                if elem['param_name'] == param_name:
-                    new_var = '({})'.format(elem.get('equation', False))
-
-            if new_var is False:
-                lg.error('The computed parameter does not exist')
-            lg.info('>> INNER WORD: {} | NEW VAR: {}'.format(inner_word, new_var))
-            return new_var
-
-        while re.search(r'\$\{[a-zA-Z0-9_]+\}', eq) is not None:
-            eq = re.sub(r'\$\{[a-zA-Z0-9_]+\}', repl, eq)
-
-        if self.sandbox_funcs is None:
-            self.sandbox_funcs = self._get_sandbox_funcs(locals())
-        if self.sandbox_vars is None:
-            self.sandbox_vars = self._get_sandbox_vars(globals())
-        ids = self._get_eq_ids(eq)
+        try:
+            compiled = self._compile(eq)
+        except ValueError as e:
+            return {
+                'success': False,
+                'msg': 'The equation could not be computed: {}'.format(eq),
+                'error': '{}'.format(e),
+            }
 
         # check if all the identifiers are in the df
-        for i in ids:
-            if i not in self.cruise_data.df.columns:  # already calculated parameters also can be use as columns
+        df = self.cruise_data.df
+        for i in compiled.ids:
+            if i not in df.columns:  # already calculated parameters also can be use as columns
                 return {
                     'success': False,
                     'msg': 'Some identifiers do not exist in the current dataframe: {}'.format(i),
                 }
 
-        eq = '{} = {}'.format(computed_param_name, eq)
-        # lg.info('>> EQUATION: {}'.format(eq))
         try:
-            self.cruise_data.df.eval(
-                expr=eq,
-                engine='python',                 # NOTE: numexpr does not support custom functions
-                inplace=True,
-                local_dict=self.sandbox_funcs,
-                global_dict=self.sandbox_vars
-            )
+            column = self._evaluate(compiled, {i: df[i] for i in compiled.ids}, df.index, precision)
         except Exception as e:
             # lg.warning('>> THE CP {} COULD NOT BE CALCULATED: {}'.format(computed_param_name, e))
             return {
                 'success': False,
-                'msg': 'The equation could not be computed: {}'.format(eq),
+                'msg': 'The equation could not be computed: {} = {}'.format(computed_param_name, compiled.eq),
                 'error': '{}'.format(e),
             }
-        if computed_param_name == 'AUX' and 'AUX' in self.cruise_data.df.columns:
-            del self.cruise_data.df['AUX']
-        else:
-            self.cruise_data.df = self.cruise_data.df.round({computed_param_name: precision})
+        if computed_param_name != 'AUX':     # AUX is only used to check if the equation can be computed
+            self._store(computed_param_name, column)
 
         return {
             'success': True,
         }
 
-    def _get_eq_ids(self, eq):
-        ''' Return a list of identifiers used by the equation
-            The parameters ${} should already be replaced before
-            Pure numbers are deleted from the list
+    def _compile(self, eq):
+        ''' Replaces the references to other CPs ${} and returns the CompiledEquation.
+            Raises ValueError if the equation is not valid
         '''
-        func_list = []
-        for key, value in self.sandbox_funcs.items():
-            if value != None:
-                func_list.append(key)
+        self._init_sandbox()
+        return EquationCompiler.compile(self.env.cp_registry.expand(eq), self.sandbox_funcs, self.sandbox_version)
 
-        var_list = []
-        for key, value in self.sandbox_vars.items():
-            if value != None:
-                var_list.append(key)
+    def _compile_cp(self, name):
+        ''' CompiledEquation of the CP @name of the project, parsed only once by the registry '''
+        self._init_sandbox()
+        return self.env.cp_registry.compile(name, self.sandbox_funcs, self.sandbox_version)
 
-        ids = re.findall('[a-zA-Z0-9_]+', eq)
-        ids = [x for x in ids if (x not in func_list) and (x not in var_list)]
+    def _init_sandbox(self):
+        if self.sandbox_funcs is None:
+            self.sandbox_funcs = self._get_sandbox_funcs()
+            self.sandbox_version = hash(tuple(sorted(
+                k for k, v in self.sandbox_funcs.items() if v is not None
+            )))
+            self.octave_funcs = set(
+                k for k, v in self.sandbox_funcs.items()
+                if self.equations is not None and getattr(v, '__self__', None) is self.equations
+            )
 
-        # remove numbers from the list
-        ids = [x for x in ids if re.match(r'[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?', x) is None]
-        return ids
+    def _evaluate(self, compiled, columns, index, precision, log_moves=True):
+        ''' Runs the @compiled equation with the @columns and returns
+            the result as a column with the @index of the DF, rounded to @precision
+        '''
+        funcs = {}
+        if not log_moves and self.equations is not None:
+            funcs = {
+                f: partial(self.sandbox_funcs[f], log=False)
+                for f in compiled.funcs if f in self.equations.DF_INPUTS
+            }
+        if self.octave_funcs.intersection(compiled.funcs):
+            with self._octave_lock:
+                result = compiled.evaluate(columns, funcs)
+        else:
+            result = compiled.evaluate(columns, funcs)
+        if isinstance(result, np.ndarray) and result.ndim == 2 and 1 in result.shape:
+            result = result.ravel()     # the octave functions return a column vector
+        column = pd.Series(result, index=index)     # a Series is aligned with the index
+        if is_numeric_dtype(column):
+            column = column.round(precision)
+        return column
+
+    def is_input(self, column):
+        ''' Checks if the @column is used to compute some of the CPs of the project '''
+        for name in self.env.cp_registry.names():
+            try:
+                if column in self._get_inputs(self._compile_cp(name)):
+                    return True
+            except ValueError:
+                pass
+        return False
+
+    def _get_inputs(self, compiled):
+        ''' Columns used by the @compiled equation, including the columns
+            that some Octave functions read directly from the DF (OctaveEquations.DF_INPUTS)
+        '''
+        inputs = list(compiled.ids)
+        if self.equations is not None:
+            for f in compiled.funcs:
+                inputs.extend(self.equations.DF_INPUTS.get(f, []))
+        return inputs
+
+    def _is_row_wise(self, compiled):
+        ''' The value of each row is computed only with the values of the same row '''
+        df_funcs = self.equations.DF_INPUTS if self.equations is not None else {}
+        return not any(f in self.PROFILE_FUNCS or f in df_funcs for f in compiled.funcs)
+
+    def _get_changed_rows(self, old, new):
+        ''' HASH_IDs of the rows where @new is different from @old, None if there was no old column '''
+        if old is None:
+            return None
+        diff = (old != new) & ~(old.isna() & new.isna())
+        return new.index[diff.to_numpy()]
+
+    def _store(self, name, column):
+        self.cruise_data.df[name] = column
+        self.cruise_data.stats.invalidate(name)
+
+    def _add_col(self, cp):
+        prec = int(cp['precision'])
+        self.cruise_data.cols[cp['param_name']] = {
+            'external_name': [],
+            'data_type': 'integer' if prec == 0 else 'float',
+            'attrs': ['computed'],
+            'unit': cp.get('units', False),
+            'precision': prec,
+            'export': False
+        }
+        lg.info('>> CP <<{}>> ADDED'.format(cp['param_name']))
 
-    def _get_sandbox_funcs(self, loc_dict={}):
-        local_dict = loc_dict.copy()        # deepcopy() > recursively  ???
+    def _log_failure(self, name, result):
+        msg = ''
+        if 'error' in result:
+            msg = result.get('error', '')  # TODO: remove "\n" fro here?
+        elif 'msg' in result:
+            msg = result.get('msg', '')
+        lg.warning('>> CP <<{}>> COULD NOT BE COMPUTED: {}'.format(name, msg))
 
-        for elem in local_dict:             # resets all the values
-            local_dict[elem] = None
+    def _get_sandbox_funcs(self):
+        local_dict = {}
 
-        # math functions
+        # math functions, the numpy ufuncs are used because they are applied to whole columns
         local_dict.update({
-            'acos': acos, 'asin': asin, 'atan': atan, 'atan2': atan2,
-            'ceil': ceil, 'cos': cos, 'cosh': cosh, 'degrees': degrees,
-            'exp': exp, 'fabs': fabs, 'floor': floor, 'fmod': fmod,
-            'frexp': frexp, 'hypot': hypot, 'ldexp': ldexp, 'log': log,
-            'log10': log10, 'modf': modf, 'pow': pow, 'radians': radians,
-            'sin': sin, 'sinh': sinh, 'sqrt': sqrt, 'tan': tan, 'tanh': tanh,
+            'acos': np.arccos, 'asin': np.arcsin, 'atan': np.arctan, 'atan2': np.arctan2,
+            'ceil': np.ceil, 'cos': np.cos, 'cosh': np.cosh, 'degrees': np.degrees,
+            'exp': np.exp, 'fabs': np.fabs, 'floor': np.floor, 'fmod': np.fmod,
+            'frexp': np.frexp, 'hypot': np.hypot, 'ldexp': np.ldexp, 'log': np.log,
+            'log10': np.log10, 'modf': np.modf, 'pow': np.power, 'radians': np.radians,
+            'sin': np.sin, 'sinh': np.sinh, 'sqrt': np.sqrt, 'tan': np.tan, 'tanh': np.tanh,
+
+            # names of the functions supported by pandas eval
+            'arcsin': np.arcsin, 'arccos': np.arccos, 'arctan': np.arctan, 'arctan2': np.arctan2,
+            'arcsinh': np.arcsinh, 'arccosh': np.arccosh, 'arctanh': np.arctanh,
+            'expm1': np.expm1, 'log1p': np.log1p, 'abs': np.abs,
         })
 
         # seawater functions
@@ -241,17 +419,11 @@ class ComputedParameter(Environment):
                         local_dict.update({elem_str: elem_obj})
         return local_dict
 
-    def _get_sandbox_vars(self, glob_dict={}):
-        global_dict = glob_dict.copy()
-
-        for elem in global_dict:
-            global_dict[elem] = None
-
-        return global_dict
-
     def check_dependencies(self):
-        ''' If the CP can be computed then the dependencies are satisfied
-            Maybe it is a good idea to avoid the eval method for efficiency?
+        ''' The dependencies of a CP are satisfied if the equation is valid, all the functions
+            exist in the sandbox and all the identifiers are columns of the catalog.
+            The equations are resolved statically, they are not computed.
+            The result is cached until the columns or the CPs of the project change
 
             This is used when the form 'add_computed_parameter_expression' is loaded
 
@@ -260,26 +432,26 @@ class ComputedParameter(Environment):
                 'cp_param_2': False,                 # dependencies don't satisfied
             }
         '''
-        proj_settings = json.load(open(PROJ_SETTINGS))
-        computed_params = proj_settings.get('computed_params', False)
-        if computed_params is not False:
-            result = {}
-            for cp in computed_params:
-                args = {
-                    'eq': cp.get('equation', False),
-                }
-                ce_result = self.compute_equation(args)
-                if ce_result.get('success', False) is True:
-                    result.update({
-                        cp.get('param_name'): True
-                    })
-                else:
-                    result.update({
-                        cp.get('param_name'): False
-                    })
-            return result
-        else:
-            return {}
+        cols = self.cruise_data.cols
+        computed_params = self.proj_settings_cps
+        key = (
+            getattr(cols, 'version', None),
+            tuple((cp.get('param_name'), cp.get('equation', False)) for cp in computed_params)
+        )
+        if self._deps_cache is not None and self._deps_cache[0] is cols and self._deps_cache[1] == key:
+            return dict(self._deps_cache[2])
+
+        lg.info('-- CHECK DEPENDENCIES')
+        result = {}
+        for cp in computed_params:
+            try:
+                compiled = self._compile_cp(cp.get('param_name'))
+                satisfied = all(i in cols for i in compiled.ids)
+            except ValueError:
+                satisfied = False
+            result[cp.get('param_name')] = satisfied
+        self._deps_cache = (cols, key, result)
+        return dict(result)
 
     def get_all_parameters(self):
         lg.info('-- GET ALL PARAMETERS')
@@ -307,6 +479,7 @@ class ComputedParameter(Environment):
             try:
                 if value in self.cruise_data.df.columns:
                     del self.cruise_data.df[value]
+                    self.cruise_data.stats.invalidate(value)
                 del self.cruise_data.cols[value]
                 return {
                     'success': True,
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+
+import ast
+import copy
+import re
+import threading
+
+
+class CompiledEquation(object):
+    ''' Equation parsed and validated only once:
+            * ids: columns used by the equation, in order of appearance
+            * funcs: sandbox functions called by the equation
+            * evaluate(columns): runs the compiled code with {column name: values}
+    '''
+
+    def __init__(self, eq, code, ids, funcs, sandbox_funcs):
+        self.eq = eq
+        self.ids = ids
+        self.funcs = funcs
+        self._code = code
+        self._funcs_ns = {
+            EquationCompiler.FUNC_PREFIX + f: sandbox_funcs[f] for f in funcs
+        }
+
+    def evaluate(self, columns, funcs={}):
+        ''' @columns - {column name: column values} for all the ids of the equation.
+            @funcs - {function name: function} to use instead of some sandbox functions
+            The operations are applied to the whole columns (vectorized)
+        '''
+        namespace = dict(self._funcs_ns)
+        namespace.update({EquationCompiler.FUNC_PREFIX + f: v for f, v in funcs.items()})
+        namespace.update(columns)
+        return eval(self._code, {'__builtins__': {}}, namespace)
+
+
+class EquationCompiler(object):
+    ''' Compiles the equations of the computed parameters. The equations use the pandas syntax,
+        where the sandbox functions are prefixed with @, for instance:
+
+            @pden(_SALINITY, CTDTMP, _PRESSURE, 0) - 1000
+
+        The equation is parsed with the ast module and only the nodes in ALLOWED_NODES
+        are accepted: arithmetic, comparisons, numbers, column names and calls to the sandbox
+        functions. Then it is compiled to Python bytecode that operates on whole columns.
+        As in pandas eval, the logical operators are element-wise: and, or, not and the chained
+        comparisons (a < b < c) are translated to &, | and ~ (see ElementWise)
+
+        The compiled equations are cached by the text of the equation and by the version of the
+        sandbox (the available functions change if Octave is detected or not)
+    '''
+    FUNC_PREFIX = '__f_'        # the functions are renamed, so a column can have the name of a function
+    ALLOWED_NODES = (
+        ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+        ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr, ast.BitXor,
+        ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    )
+    _cache = {}                 # {(equation, sandbox version): CompiledEquation}
+    _lock = threading.Lock()
+
+    @classmethod
+    def compile(cls, eq, sandbox_funcs, sandbox_version):
+        ''' Returns the CompiledEquation of @eq. The references ${} should be already replaced.
+            Raises ValueError if the equation is not valid
+        '''
+        key = (eq, sandbox_version)
+        with cls._lock:
+            compiled = cls._cache.get(key)
+        if compiled is not None:
+            return compiled
+        compiled = cls._compile(eq, sandbox_funcs)
+        with cls._lock:
+            cls._cache[key] = compiled
+        return compiled
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache = {}
+
+    @classmethod
+    def _compile(cls, eq, sandbox_funcs):
+        lg.info('-- COMPILE EQUATION: {}'.format(eq))
+        text = re.sub(r'@(?=[a-zA-Z_])', '', eq.strip())       # @func >> func
+        try:
+            tree = ast.parse(text, mode='eval')
+        except SyntaxError as e:
+            raise ValueError('Syntax error in the equation: {}'.format(e.msg))
+
+        tree = ast.fix_missing_locations(ElementWise().visit(tree))
+        func_nodes = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, cls.ALLOWED_NODES):
+                raise ValueError('Element not allowed in the equation: {}'.format(type(node).__name__))
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.keywords:
+                    raise ValueError('Only calls to functions with positional arguments are allowed')
+                if node.func.id not in sandbox_funcs or sandbox_funcs[node.func.id] is None:
+                    raise ValueError('The function does not exist: {}'.format(node.func.id))
+                func_nodes.add(node.func)
+            elif isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError('Only numbers are allowed as constants: {}'.format(node.value))
+
+        ids = []
+        funcs = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                if node in func_nodes:
+                    if node.id not in funcs:
+                        funcs.append(node.id)
+                    node.id = cls.FUNC_PREFIX + node.id
+                elif node.id not in ids:
+                    ids.append(node.id)
+        code = compile(tree, '<equation>', 'eval')
+        return CompiledEquation(eq, code, ids, funcs, sandbox_funcs)
+
+
+class ElementWise(ast.NodeTransformer):
+    ''' Translates the logical operators to the element-wise operators of numpy and pandas '''
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = node.values[0]
+        for value in node.values[1:]:
+            result = ast.BinOp(left=result, op=op, right=value)
+        return result
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(op=ast.Invert(), operand=node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        ''' a < b < c >> (a < b) & (b < c) '''
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        result = None
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            comparison = ast.Compare(left=left, ops=[op], comparators=[right])
+            result = comparison if result is None else ast.BinOp(left=result, op=ast.BitAnd(), right=comparison)
+            left = copy.deepcopy(right)     # the nodes are not shared, the names are renamed later
+        return result
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.exceptions import ValidationError
+from ocean_data_qc.data_models.computed_parameter_compiler import EquationCompiler
+from ocean_data_qc.env import Environment
+
+from collections import OrderedDict
+import os
+import re
+import threading
+
+
+class ComputedParameterRegistry(Environment):
+    ''' Computed parameters defined in the project settings (computed_params), parsed only once:
+
+            * get(name) returns the definition of a CP, all() returns all of them in the settings order
+            * expand(eq) replaces the references to other CPs ${NAME} with their equations
+            * compile(name, ...) returns the CompiledEquation of a CP, the errors are cached as well
+
+        The settings file is parsed again only if it was modified (its modification time or size changed)
+        or if invalidate() is called (FilesHandler.invalidate_cache). If the definitions did not change
+        the parsed equations are kept
+    '''
+    env = Environment
+    REF = re.compile(r'\$\{([a-zA-Z0-9_]+)\}')
+
+    def __init__(self):
+        self.env.cp_registry = self
+        self._lock = threading.RLock()      # the LoadingTask computes the CPs in its own thread
+        self._stamp = None                  # (mtime_ns, size) of the settings file
+        self._cps = OrderedDict()           # {param_name: definition}
+        self._expanded = {}                 # {param_name: equation with the references replaced}
+        self._compiled = {}                 # {(param_name, sandbox version): CompiledEquation or ValueError}
+
+    def get(self, name):
+        ''' Definition of the CP @name: {'param_name', 'equation', 'precision', 'units'}, None if it does not exist '''
+        with self._lock:
+            self._refresh()
+            return self._cps.get(name)
+
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return list(self._cps.values())
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return list(self._cps.keys())
+
+    def expand(self, eq):
+        ''' Replaces the references ${NAME} with the equations of the CPs.
+            Raises ValueError if some CP does not exist or the references are circular
+        '''
+        eq = eq.strip()
+        with self._lock:
+            self._refresh()
+            return self._expand(eq, [])
+
+    def compile(self, name, sandbox_funcs, sandbox_version):
+        ''' CompiledEquation of the CP @name. Raises ValueError if the equation is not valid '''
+        with self._lock:
+            self._refresh()
+            key = (name, sandbox_version)
+            if key not in self._compiled:
+                if name not in self._cps:
+                    raise ValueError('The computed parameter does not exist: {}'.format(name))
+                try:
+                    self._compiled[key] = EquationCompiler.compile(
+                        self._expand(self._cps[name].get('equation', '') or '', [name]),
+                        sandbox_funcs, sandbox_version
+                    )
+                except ValueError as e:
+                    self._compiled[key] = e
+            compiled = self._compiled[key]
+        if isinstance(compiled, ValueError):
+            raise compiled
+        return compiled
+
+    def invalidate(self):
+        ''' The settings file is read again the next time '''
+        with self._lock:
+            self._stamp = None
+
+    def _expand(self, eq, stack):
+        ''' @stack - CPs that are being expanded, to detect circular references '''
+        def repl(match):
+            name = match.group(1)
+            if name not in self._cps:
+                raise ValueError('The computed parameter does not exist: {}'.format(name))
+            if name in stack:
+                raise ValueError('Circular reference to the computed parameter: {}'.format(name))
+            if name not in self._expanded:
+                self._expanded[name] = self._expand(
+                    (self._cps[name].get('equation', '') or '').strip(), stack + [name]
+                )
+            return '({})'.format(self._expanded[name])
+
+        return self.REF.sub(repl, eq.strip())
+
+    def _refresh(self):
+        try:
+            st = os.stat(PROJ_SETTINGS)
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp:
+                return
+            cps = self.env.f_handler.get('computed_params', PROJ_SETTINGS) or []
+        except Exception:
+            raise ValidationError(
+                'Project JSON settings file could be opened to process the calculated parameters',
+                rollback='cd'  # TODO: only if we are loading the files in the initialization
+            )
+        cps = OrderedDict((c['param_name'], c) for c in cps)
+        if cps != self._cps:
+            lg.info('-- PARSE COMPUTED PARAMETERS')
+            self._cps = cps
+            self._expanded = {}
+            self._compiled = {}
+        self._stamp = stamp
@@ -9,6 +9,13 @@ from ocean_data_qc.constants import *
 from ocean_data_qc.data_models.exceptions import ValidationError
 from ocean_data_qc.data_models.computed_parameter import ComputedParameter
 from ocean_data_qc.data_models.cruise_data_export import CruiseDataExport
+from ocean_data_qc.data_models.cruise_data_reader import CruiseDataReader
+from ocean_data_qc.data_models.cruise_data_snapshot import CruiseDataSnapshot
+from ocean_data_qc.data_models.cruise_data_journal import CruiseDataJournal
+from ocean_data_qc.data_models.cruise_data_moves import CruiseDataMoves
+from ocean_data_qc.data_models.cruise_data_keys import RowKeys
+from ocean_data_qc.data_models.cruise_data_stats import ColumnStats
+from ocean_data_qc.data_models.cruise_data_columns import ColumnCatalog
 
 import csv
 import json
@@ -16,7 +23,6 @@ import os
 import pandas as pd
 import numpy as np
 from os import path
-import hashlib
 from datetime import datetime
 from shutil import rmtree
 import re
@@ -27,34 +33,61 @@ class CruiseData(CruiseDataExport):
         the aqc, csv and whp files (instantiated with the children classes)
     '''
     env = CruiseDataExport.env
+    ALL_ATTRS = ['computed', 'param', 'non_qc', 'flag', 'required', 'created']
 
-    def __init__(self, original_type='', cd_aux=False):
+    def __init__(self, original_type='', cd_aux=False, parse_only=False):
+        ''' @parse_only - the file is only read and validated, the computed parameters are not
+                          initialized (the files of a multi-file project are parsed in worker processes)
+        '''
         lg.info('-- INIT CRUISE DATA PARENT')
         self.original_type = original_type        # original.csv type (whp, csv)
         self.cd_aux = cd_aux
-        self.df = None                            # numeric DataFrame
-        self.df_str = None                        # string DataFrame
+        self.df = None                            # typed DataFrame
+        self.precisions = {}                      # {column: decimal places} of the float columns
+        self.notations = {}                       # {column: 'f' or 'e'} of the float columns
+        self.reader = None                        # original.csv reader, with the byte offsets of the rows
+        self._row_keys = None                     # RowKeys of the current index of the DF
+        self.snapshot = CruiseDataSnapshot(TMP) if cd_aux is False else None
+        self.journal = CruiseDataJournal(TMP) if cd_aux is False else None     # flag edits not in data.csv yet
+        self.stats = ColumnStats(self)            # null counts, min, max and flag counts of the columns
         self.moves = None
-        self.cols = {}
+        self.cols = {}                            # ColumnCatalog, see the cols property
+        self._col_positions = (None, {})          # (df.columns, {column: position})
         self.col_mappings = {}                   # to set in external_name
         self.unit_list = []
 
-        self._validate_original_data()
         self._set_moves()                         # TODO: this is not needed for cd_update
         self._set_df()
         self._rmv_empty_columns()
-        self._set_units()
         self._prep_df_columns()
-        self.cp_param = ComputedParameter(self)
+        if not parse_only:
+            self.cp_param = ComputedParameter(self)
+
+    @property
+    def cols(self):
+        return self._cols
+
+    @cols.setter
+    def cols(self, cols):
+        ''' The columns dictionary is always indexed by attribute '''
+        self._cols = cols if isinstance(cols, ColumnCatalog) else ColumnCatalog(cols or {})
+
+    def _report_progress(self, stage=None, rows=None):
+        ''' Sends the loading progress to Electron if the file is loaded in the background.
+            The LoadingCancelled exception is raised here if the user cancelled the loading
+        '''
+        if self.env.loading_task is not None:
+            self.env.loading_task.progress(stage=stage, rows=rows)
 
     def _rmv_empty_columns(self):
-        lg.info('-- REMOVE EMPTY COLUMNS (all values with -999)')
+        lg.info('-- REMOVE EMPTY COLUMNS (all values with -999 or NaN)')
         cols_to_rmv = []
         flags_to_rmv = []
         basic_params = self.env.f_handler.get_custom_cols_by_attr('basic')
+        self.stats.compute_missing()                # all the columns at once, unless they come from the snapshot
         for col in self.df:
             if col not in basic_params:  # empty basic param columns are needed for some calculated params
-                if self.df[col].str.contains(NA_REGEX).all():
+                if self.stats.is_empty(col):            # -999 values are already NaN
                     cols_to_rmv.append(col)
                     if f'{col}_FLAG_W' in self.df:
                         flags_to_rmv.append(f'{col}_FLAG_W')
@@ -71,7 +104,12 @@ class CruiseData(CruiseDataExport):
                 f'{",".join(flags_to_rmv)} flag columns were removed'
             )
         cols_to_rmv.extend(flags_to_rmv)
+        if len(self.unit_list) > 0:  # keep the units aligned with the remaining columns
+            self.unit_list = [u for c, u in zip(self.df.columns, self.unit_list) if c not in cols_to_rmv]
+        for c in cols_to_rmv:
+            self.cols.pop(c, None)  # aqc files have the cols already loaded from settings.json
         self.df = self.df.drop(columns=cols_to_rmv)
+        self.stats.invalidate(cols_to_rmv)
 
     def _set_cols_from_scratch(self):
         """ The main attributes of the object are filled:
@@ -123,75 +161,58 @@ class CruiseData(CruiseDataExport):
         del self.unit_list
         # lg.info(json.dumps(self.cols, sort_keys=True, indent=4))
 
-    def _set_units(self):
-        ''' Checks if the file has an unit row or not.
-            The df should have all strings and nan values
-                * if there is at least one nan in the row               > unit row
-                * if all the cells are strings                          > unit row
-                * if there is at least one number (stored as string)    > no unit row
-        '''
-        lg.info('-- CHECK IF THE UNIT ROW EXISTS')
-        exp = re.compile("^-?\d+?(\.\d+)?$")
-        def is_number(s):
-            ''' Returns True if the string is a number:
-                    float or integer
-            '''
-            if exp.match(s) is None:
-                return s.isdigit()  # to check if all are digits
-            return True
-
-        units_raw = self.df.iloc[0].values.tolist()
-        no_unit_row = False
-        for u in units_raw:  # the loop continues only if it is a string and not number
-            if not isinstance(u, str) and np.isnan(u):
-                break
-            if is_number(u):
-                no_unit_row = True
-                break
-        if no_unit_row is False:
-            self.df = self.df[1:-1].reset_index(drop=True)  # rewrite index column and remove the units row
-            for u in units_raw:
-                if isinstance(u, str):
-                    self.unit_list.append(u.strip())
-                else:
-                    self.unit_list.append('nan')
-
     def _validate_flag_values(self):
         ''' Assign 9 to the rows where the param has an NaN
             Also checks if there is any NaN or incorrect value in the flag columns
+
+            All the param/flag pairs are checked at once: the param and flag blocks are
+            aligned as 2D arrays (one column per pair). The errors of all the flag columns
+            are reported together
         '''
         lg.info('-- VALIDATE FLAG VALUES')
-        for param in self.df:
-            flag = param + FLAG_END
-            if flag in self.df:
-                upds = self.df[self.df[param].isnull() & (self.df[flag] != 9)].index.tolist()
-                if len(upds) > 0:
-                    empty_rows = {}
-                    empty_rows[flag] = 9
-                    self.df[self.df[param].isnull() & (self.df[flag] != 9)] = self.df[self.df[param].isnull() & (self.df[flag] != 9)].assign(**empty_rows)
-                    self.add_moves_element(
-                        'flag_column_updated',
-                        f'The flag column {flag} had some NaN values in the related parameter column. '
-                        f'It was set to the empty default value 9 in {len(upds)} rows.'
-                    )
+        self._report_progress('Validating the flag values')
+        params = [c for c in self.df if c + FLAG_END in self.df]
+        if len(params) == 0:
+            return
+        flags = [p + FLAG_END for p in params]
+        flag_df = self.df[flags]
+        if not all(pd.api.types.is_numeric_dtype(t) for t in flag_df.dtypes):
+            flag_df = flag_df.apply(pd.to_numeric, errors='coerce')  # non numeric values are reported as null
+        flag_values = flag_df.to_numpy(dtype=np.float64, na_value=np.nan)
+        empty_params = self.df[params].isnull().to_numpy()
+
+        set_nine = empty_params & (flag_values != 9)
+        flag_values[set_nine] = 9
+        for pos in np.flatnonzero(set_nine.any(axis=0)):
+            flag = flags[pos]
+            self.df[flag] = self.df[flag].mask(set_nine[:, pos], 9)
+            self.stats.invalidate(flag)
+            self.add_moves_element(
+                'flag_column_updated',
+                f'The flag column {flag} had some NaN values in the related parameter column. '
+                f'It was set to the empty default value 9 in {int(set_nine[:, pos].sum())} rows.'
+            )
 
-                # NOTE: if the flag value is NaN or is not between [0-9] > throw error or reset to 9?
-                if self.df[flag].isnull().any():
-                    raise ValidationError(
-                        'The flag column {} has a/some null value/s in the row/s '
-                        '(row position taking into account just the data cells): {}'.format(
-                            flag, str(self.df[self.df[flag].isnull()].index.tolist())[1:-1]
-                        ),
-                        rollback=self.rollback
-                    )
-                if self.df[(self.df[flag] > 9) | (self.df[flag] < 0)].index.any():
-                    raise ValidationError(
-                        'The flag column {} must have values between 0-9 in the row '
-                        '(row position taking into account just the data cells): {}'.format(
-                            flag, str(self.df[(self.df[flag] > 9) | (self.df[flag] < 0)].index.tolist())[1:-1]
-                        ),
-                        rollback=self.rollback
-                    )
+        # NOTE: if the flag value is NaN or is not between [0-9] > throw error or reset to 9?
+        null_values = np.isnan(flag_values)
+        wrong_values = (flag_values > 9) | (flag_values < 0)      # False for NaN
+        errors = []
+        for pos in np.flatnonzero(null_values.any(axis=0)):
+            errors.append(
+                'The flag column {} has a/some null value/s in the row/s '
+                '(row position taking into account just the data cells): {}'.format(
+                    flags[pos], str(np.flatnonzero(null_values[:, pos]).tolist())[1:-1]
+                )
+            )
+        for pos in np.flatnonzero(wrong_values.any(axis=0)):
+            errors.append(
+                'The flag column {} must have values between 0-9 in the row '
+                '(row position taking into account just the data cells): {}'.format(
+                    flags[pos], str(np.flatnonzero(wrong_values[:, pos]).tolist())[1:-1]
+                )
+            )
+        if len(errors) > 0:
+            raise ValidationError('. '.join(errors), rollback=self.rollback)
 
     def _add_column(self, column='', units=False, export=True):
         ''' Adds a column to the self.cols dictionary
@@ -206,7 +227,7 @@ class CruiseData(CruiseDataExport):
             TODO: add all arguments or add a param as a dictionary with all the attributes
                   this method also should work if something should be modified or removed?
         '''
-        if column not in self.get_cols_by_attrs('all'):
+        if column not in self.cols.get_cols(self.ALL_ATTRS):
             self.cols[column] = {
                 'external_name': [],
                 'attrs': [],
@@ -239,8 +260,7 @@ class CruiseData(CruiseDataExport):
             non_qc_params = self.env.f_handler.get_custom_cols_by_attr('non_qc')
             if flag not in self.df and param not in non_qc_params:
                 lg.info('>> CREATING FLAG COLUMN: {}'.format(flag))
-                values = ['2'] * len(self.df.index)
-                self.df[flag] = values
+                self.df[flag] = np.full(len(self.df.index), 2, dtype=np.int8)
                 self.cols[flag] = {
                     'external_name': [],
                     'attrs': ['flag', 'created'],
@@ -260,8 +280,7 @@ class CruiseData(CruiseDataExport):
         '''
         basic_list = self.env.f_handler.get_custom_cols_by_attr('basic')
         for c in basic_list:
-            all_cols = self.get_cols_by_attrs('all')
-            if c not in all_cols:
+            if c not in self.cols.get_cols(self.ALL_ATTRS):
                 self.df[c] = np.array([np.nan] * self.df.index.size)
                 self.add_moves_element(
                     'column_added',
@@ -301,41 +320,33 @@ class CruiseData(CruiseDataExport):
         if isinstance(column_attrs, str):
             column_attrs = [column_attrs]
         if len(column_attrs) == 1 and 'all' in column_attrs:
-            column_attrs = [
-                'computed', 'param', 'non_qc',
-                'flag', 'required', 'created'
-            ]
-        res = []
-        for t in column_attrs:
-            for c in self.cols:
-                if t in self.cols[c]['attrs']:
-                    if c not in res:
-                        res.append(c)
-        res = list(set(res))  # one column may have multiple attrs
-        df_cols = list(self.df.columns)
-        col_positions = dict(
-            [(df_cols[df_cols.index(x)], df_cols.index(x)) for x in df_cols]  # {'COL1': 0, 'COL2': 1, ...}
-        )
+            column_attrs = self.ALL_ATTRS
+        res = self.cols.get_cols(column_attrs)  # one column may have multiple attrs
+        col_positions = self._get_col_positions()
         try:
-            prepaired_list = [(col_positions[x], x) for x in res]
-        except Exception:
+            final_list = sorted(res, key=col_positions.__getitem__)  # reordering
+        except KeyError:
             raise ValidationError(
                 'Some columns in the settings.json file or '
                 'self.cols object is not in the DataFrame'
             )
-        sorted_list = sorted(prepaired_list, key=lambda elem: elem[0])  # reordering
-        final_list = [x[1] for x in sorted_list]
         if discard_nan:
             final_list = self._discard_nan_columns(final_list)
         return final_list
 
+    def _get_col_positions(self):
+        ''' {column: position} of the DF columns, built again only if the columns change '''
+        if self._col_positions[0] is not self.df.columns:
+            self._col_positions = (self.df.columns, {c: i for i, c in enumerate(self.df.columns)})
+        return self._col_positions[1]
+
     def _discard_nan_columns(self, col_list):
         ''' Most of NaN columns should be removed in "manage_empty_cols"
             This is just for the 'required' columns which are empty
         '''
         final_cols = list(col_list)
         for c in col_list:
-            if self.df[c].isnull().all():
+            if self.stats.is_empty(c):
                 final_cols.remove(c)
         final_cols.sort()
         return final_cols
@@ -348,53 +359,97 @@ class CruiseData(CruiseDataExport):
         return [self.cols[x]['unit'] for x in cols]
 
     def is_flag(self, flag):
-        if flag[-7:] == FLAG_END and flag in self.get_cols_by_attrs(['flag']):
+        if flag[-7:] == FLAG_END and self.cols.has_attr(flag, 'flag') and flag in self.df:
             return True
         else:
             return False
 
     def _set_df(self):
-        """ it creates the self.df dataframe object
-            taking into account if data.csv is created or not
+        """ it creates the self.df dataframe object from the data.csv file
+            of a project that was already saved. The column types are taken
+            from the settings.json file, so the values are parsed directly
+            to their final type
         """
         lg.info('-- SET DF')
-        try:
-            delimiter=self.dialect.delimiter
-        except:
-            delimiter=','
-        try:
-            self.df = pd.read_csv(
-                filepath_or_buffer=self.filepath_or_buffer,
-                comment='#',
-                delimiter=delimiter,
-                skip_blank_lines=True,
-                skipinitialspace=True,
-                engine='c',                 # engine='python' is more versatile, 'c' is faster
-                dtype=str,                  # useful to make some replacements before casting to numeric values
-                skiprows=self.skiprows
-                # verbose=False             # indicates the number of NA values placed in non-numeric columns
-            )
-            lg.info('>> PANDAS using \'c\' engine')
-        except:
-            self.df = pd.read_csv(
-                filepath_or_buffer=self.filepath_or_buffer,
-                comment='#',
-                delimiter=delimiter,
-                skip_blank_lines=True,
-                skipinitialspace=True,
-                engine='python',
-                dtype=str,
-                skiprows=self.skiprows
-                # verbose=False
-            )
-            lg.info('>> PANDAS using \'python\' engine')
-        # lg.info('\n\n>> DF: \n\n{}'.format(self.df))
+        self._report_progress('Reading the project data')
+        self.get_cols_from_settings_file()
+        str_cols = [c for c in self.cols if c in STR_COLS or self.cols[c].get('data_type') in ['string', 'date', 'time']]
+        self.df = pd.read_csv(
+            filepath_or_buffer=self.filepath_or_buffer,
+            delimiter=',',
+            skip_blank_lines=True,
+            engine='c',
+            dtype=dict.fromkeys(str_cols, str),
+            na_values=NA_VALUES,
+        )
+        self.precisions = {
+            c: v['precision'] for c, v in self.cols.items()
+            if v.get('data_type') == 'float' and v.get('precision') is not False
+        }
+
+    def _set_df_from_original(self):
+        """ It creates the self.df dataframe object reading the original.csv file
+            in one single pass. The file is validated and sanitized while it is read
+            and the units row, if it exists, is removed from the data
+        """
+        lg.info('-- SET DF FROM ORIGINAL')
+        self._report_progress('Reading the file')
+        reader = CruiseDataReader(
+            filepath=self.filepath_or_buffer,
+            original_type=self.original_type,
+            rollback=self.rollback,
+            progress=lambda rows: self._report_progress(rows=rows)
+        )
+        self.df = reader.read(prep_header=self._prep_header)
+        self.dialect = reader.dialect
+        self.unit_list = reader.units
+        self.precisions = reader.precisions
+        self.notations = reader.notations
+        self.reader = reader
+
+    def get_original_value(self, hash_id, column):
+        ''' Returns the value of the cell as it is written in the original.csv file.
+            The row is read on demand from its byte offset, so no string copy of the data is kept.
+            None is returned if the rows were not indexed (projects reopened from data.csv)
+        '''
+        if self.reader is None or self.reader.row_offsets is None or column not in self.reader.names:
+            return None
+        if self.reader.row_offsets.size != self.df.index.size:   # rows added or removed afterwards
+            return None
+        if not self.reader.is_unchanged():      # data.csv was saved again
+            return None
+        row = self.df.index.get_loc(hash_id)
+        return self.reader.read_value(
+            int(self.reader.row_offsets[row]), self.reader.names.index(column)
+        )
+
+    def format_value(self, column, value):
+        ''' Returns the float value as a string with the precision and notation of the column.
+            The precision is the number of decimal places in fixed notation, so the digits
+            of the mantissa in scientific notation depend on the exponent: 0.0015 > 1.5E-03
+        '''
+        if column not in self.precisions or pd.isnull(value):
+            return str(value)
+        if self.notations.get(column, 'f') == 'e':
+            exponent = int(np.floor(np.log10(abs(value)))) if value != 0 else 0
+            return '{:.{}E}'.format(value, max(self.precisions[column] + exponent, 0))
+        return '{:.{}f}'.format(value, self.precisions[column])
+
+    def _prep_header(self, names):
+        ''' The column names of the original file are sanitized and mapped to the internal names.
+            With them the column catalog in the custom settings gives the columns to load as strings
+        '''
+        non_sanitized = list(names)
+        names = self._sanitize_cols(non_sanitized)
+        names = self._map_col_names(names, non_sanitized)
+        custom_cols = self.env.f_handler.get('columns', CUSTOM_SETTINGS) or {}
+        str_cols = [
+            c for c in names
+            if c in STR_COLS or custom_cols.get(c, {}).get('data_type', '') in ['string', 'date', 'time']
+        ]
+        return names, str_cols
 
     def _prep_df_columns(self):
-        self.df.replace(r'\s', '', regex=True, inplace=True)  # cleans spaces: \r and \n are managed by read_csv
-        non_sanitized = self.df.columns.tolist()
-        self.df.columns = self._sanitize_cols(self.df.columns.tolist())  # remove spaces from columns
-        self.df.columns = self._map_col_names(self.df.columns.tolist(), non_sanitized)
         self._create_btlnbr_or_sampno_column()  # >> basic params?
         self._manage_date_time()
 
@@ -447,53 +502,63 @@ class CruiseData(CruiseDataExport):
 
         if 'TIME' in self.df:  # fill with zeros on the left: 132 >> 0132
             self.df['TIME'] = self.df[self.df['TIME'].notnull()]['TIME'].astype(float).apply(lambda x: f'{x:04.0f}')
+            self.stats.invalidate('TIME')
 
     def _set_moves(self):
-        """ create the self.moves dataframe object
-            taking into account if moves.csv is already created or not
+        """ create the self.moves object (log of actions), stored in the moves.db database.
+            The auxiliary objects keep the moves only in memory
         """
-        if path.isfile(MOVES_CSV) and os.stat(MOVES_CSV).st_size != 0:
-            self.moves = pd.read_csv(
-                MOVES_CSV, delimiter=',', skip_blank_lines=True,
-                verbose=True, engine='python', index_col=0, dtype=str
-            )
-        else:
-            columns = [
-                'date', 'action', 'stnnbr', 'castno',
-                'btlnbr', 'latitude', 'longitude', 'param', 'value', 'description'
-            ]
-            self.moves = pd.DataFrame(columns=columns, dtype=str)
+        self.moves = CruiseDataMoves(TMP if self.cd_aux is False else None)
 
     def _set_hash_ids(self):
         """ Create a column id for the whp-exchange files
-            this new column is a hash of these fields combined:
+            this new column is a 128 bits hash of these fields combined (see RowKeys):
                 * STNNBR     station number
                 * CASTNO     cast number (it may exist or not)
                 * BTLNBR     bottle number (it may exist or not)
                 * LATITUDE   latitude
                 * LONGITUDE  longitude
+
+            The rows with the same values in all of these fields get the same id, they are reported
         """
-        self.df['HASH_ID'] = pd.util.hash_pandas_object(  # faster, but it may create duplicates
-            self.df[['STNNBR', 'CASTNO', 'BTLNBR', 'LATITUDE', 'LONGITUDE']],
-            index=False
-        )
-        if self.df['HASH_ID'].duplicated().any():
-            # TODO: if the second file (the file to update) uses this other method
-            #       to create the hashes there will many changes in the hashes.
-            #       I could control this with some flag (though it is unlikely to happen)
-            lg.warning('>> HASH ID is being created with hashlib sha256')
-            self.df['HASH_ID'] = self.df[[
-                'STNNBR', 'CASTNO', 'BTLNBR', 'LATITUDE', 'LONGITUDE'   # if BTLNBR is NaN the hash is made correctly as well
-            ]].astype(str).apply(                                       # astype is 4x slower than apply
-                lambda x: hashlib.sha256(str.encode(str(tuple(x)))).hexdigest(), axis=1
-            )
+        lg.info('-- SET HASH IDS')
+        self._report_progress('Computing the row ids')
+        self.df['HASH_ID'] = RowKeys.build(self.df)
         self.df = self.df.set_index(['HASH_ID'])
+        self._report_duplicated_rows()
+
+    def _report_duplicated_rows(self):
+        dup_pos = self.row_keys.get_duplicates()
+        if dup_pos.size > 0:
+            cols = [c for c in RowKeys.KEY_COLS if c in self.df]
+            rows = [
+                '({})'.format(', '.join(str(v) for v in r))
+                for r in self.df[cols].iloc[dup_pos[:20]].itertuples(index=False)
+            ]
+            if dup_pos.size > 20:
+                rows.append('and {} more'.format(dup_pos.size - 20))
+            msg = '{} rows have the same {} values: {}'.format(
+                dup_pos.size, ', '.join(cols), ', '.join(rows)
+            )
+            lg.warning('>> DUPLICATED ROWS: {}'.format(msg))
+            self.add_moves_element('duplicated_rows', msg)
+
+    @property
+    def row_keys(self):
+        ''' Keys of the rows, it uses the hash table of the DF index.
+            The object is kept while the index of the DF is the same
+        '''
+        if self._row_keys is None or self._row_keys.index is not self.df.index:
+            self._row_keys = RowKeys(self.df.index)
+        return self._row_keys
 
     def _validate_required_columns(self):
         lg.info('-- VALIDATE REQUIRED COLUMNS')
+        self._report_progress('Validating the columns')
         required_columns = self.env.f_handler.get_custom_cols_by_attr('required')
-        if (not set(self.get_cols_by_attrs('all')).issuperset(required_columns)):
-            missing_columns = ', '.join(list(set(required_columns) - set(self.get_cols_by_attrs('all'))))
+        all_cols = self.cols.get_cols(self.ALL_ATTRS)
+        if (not all_cols.issuperset(required_columns)):
+            missing_columns = ', '.join(list(set(required_columns) - all_cols))
             raise ValidationError(
                 'Missing required columns in the file: [{}]'.format(missing_columns),
                 rollback=self.rollback
@@ -532,64 +597,29 @@ class CruiseData(CruiseDataExport):
                 self.col_mappings[non_sanitized[pos]] = n + FLAG_END
         return sanitized  # actuallly sanitized and mapped
 
-    def _replace_nan_values(self):
-        ''' Replaces the -990.0, -999.00, etc values to NaN.
-            There will be strings and floats in the same column because NaN is considered a float64
-            and this step should be before the numeric conversion
-        '''
-        lg.info('-- REPLACE MISSING VALUES (-999 >> NaN)')
-        self.df_str = self.df.copy(deep=True)    # TODO: this has to be synchronized when seld.df is updated
-                                                 #       or should not be used anymore
-        self.df.replace(
-            to_replace=NA_REGEX_LIST,
-            value='', #np.nan,
-            inplace=True,
-            regex=True,
-        )
-
-    def _convert_data_to_number(self):
-        ''' Converts the DF from string to numeric values
-            downcasting the resulting data to the smallest numerical dtype possible (int8 is the minimum)
-
-            If the column has float values, all the column will have
-            the same number of decimals (the maximum, zero in the right side is not taking into account)
-
-            If a cell of a column with dtype=np.int8 is assigned to some int64 value, then the column
-            is completely converted to int64
-        '''
-        # treat stations always as strings
-        df_aux = self.df.copy(deep=True)
-        if 'TIME' in df_aux:  # TIME should be string
-            df_aux = df_aux.drop(['TIME'], axis=1)
-        df_aux = df_aux.drop(['STNNBR'], axis=1).apply(lambda x: pd.to_numeric(x, errors='ignore', downcast='integer'))
-        self.df[df_aux.columns] = df_aux
-
-        float_prec_dict = self._set_col_precisions()
-
-        # NOTE: Round each column by the original number of decimal places, if the value is shown somewhere
-        #       or the float comparison, made in cruise_data_update.py, will work better
-        self.df = self.df.round(float_prec_dict)
-
     def _set_col_precisions(self):
         ''' Set the precision of all the columns in self.cols['precision']
                 * get the columns with float values > precision = X
                 * get the columns with int values   > precision = 0
                 * get the columns with str values   > precision = False
+
+            The DF is already typed, the -999 values were converted to NaN while the file was read.
+            The number of decimal places was counted by the reader as well (self.precisions)
+
+            NOTE: Round each column by the original number of decimal places, if the value is shown somewhere
+                  or the float comparison, made in cruise_data_update.py, will work better
         '''
         lg.info('-- SET COL PRECISIONS')
+        self._report_progress('Converting the numeric values')
         pd_precision = 0
         float_prec_dict = {}
         for c in self.df.select_dtypes(include=['float64']):
-            if not self.df[c].isnull().all():
-                df_tmp = self.df_str[c].str.contains(pat='\.', na=False)  # fills na values with False
-                df_tmp = self.df_str[c][df_tmp]
-
-                if df_tmp.index.size == 0:  # are all integer and NaN mixed
+            if not self.stats.is_empty(c):
+                p = min(self.precisions.get(c, 0), 15)
+                if p == 0:  # are all integer and NaN mixed
                     self.cols[c]['precision'] = 0
                     self.cols[c]['data_type'] = 'integer'
                     continue
-
-                p = int(df_tmp.str.rsplit(pat='.', n=1, expand=True)[1].str.len().max())  # always has one '.'
                 if p > pd_precision:
                     pd_precision = p
                 float_prec_dict[c] = p
@@ -601,7 +631,7 @@ class CruiseData(CruiseDataExport):
 
         for c in self.df.select_dtypes(include=['int8', 'int16', 'int32', 'int64']):
             self.cols[c]['precision'] = 0
-            if self.df[self.df[c] == 9][c].index.size == self.df.index.size:
+            if self.stats.all_equal(c, 9):
                 self.cols[c]['data_type'] = 'integer'
                 self.cols[c]['export'] = False
             else:
@@ -616,15 +646,15 @@ class CruiseData(CruiseDataExport):
         if 'TIME' in self.cols.keys():
             self.cols['TIME']['data_type'] = 'time'
 
-        if pd_precision > 15:
-            pd_precision = 15
         pd.set_option('precision', pd_precision)
-        return float_prec_dict
+        self.df = self.df.round(float_prec_dict)
+        self.stats.invalidate(list(float_prec_dict.keys()))
 
-    def update_flag_values(self, column, new_flag_value, row_indices):
+    def update_flag_values(self, column, new_flag_value, row_indices, action='QC Update'):
         """ This method is executed mainly when a flag is pressed to update the values
                 * column: it is the column to update, only one column
                 * new_flag_value: it is the flag value
+                * action: action written in the moves log (QC Update, QC Undo or QC Redo)
         """
         lg.info('-- UPDATE DATA --')
 
@@ -632,11 +662,13 @@ class CruiseData(CruiseDataExport):
         # lg.info('\n\nData previous changed: \n\n%s' % self.df[[ column ]].iloc[row_indices])
 
         empty_column = False
-        if 'empty' in self.cols[column]['attrs'] and self.df[self.df[column] == 9][column].index.size == self.df.index.size:
+        if 'empty' in self.cols[column]['attrs'] and self.stats.all_equal(column, 9):
             empty_column = True
 
         hash_index_list = self.df.index[row_indices]
+        old_values = self.df[column].to_numpy()[row_indices]
         self.df.loc[hash_index_list,(column)] = new_flag_value
+        self.stats.update_flags(column, old_values, new_flag_value)
 
         if new_flag_value != 9 and empty_column:
             lg.warn(f'>> REMOVING EMPTY ATTR FROM COLUMNS {column}')
@@ -644,7 +676,7 @@ class CruiseData(CruiseDataExport):
             self.cols[column]['export'] = True
             self.env.f_handler.set('columns', self.cols, path.join(TMP,'settings.json'))
         elif new_flag_value == 9:
-            if 'empty' not in self.cols[column]['attrs'] and self.df[self.df[column] == 9][column].index.size == self.df.index.size:
+            if 'empty' not in self.cols[column]['attrs'] and self.stats.all_equal(column, 9):
                 lg.warning(f'>> ADDING EMPTY ATTR TO COLUMN {column}')
                 self.cols[column]['attrs'].append('empty')
                 self.cols[column]['export'] = False
@@ -654,39 +686,71 @@ class CruiseData(CruiseDataExport):
 
         # Update the action log
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        action = 'QC Update'
-
-        for row in row_indices:
-            stnnbr = self.df[[ 'STNNBR' ]].iloc[row][0]
-            castno = self.df[[ 'CASTNO' ]].iloc[row][0]
-            btlnbr = self.df[[ 'BTLNBR' ]].iloc[row][0]
-            latitude = self.df[[ 'LATITUDE' ]].iloc[row][0]
-            longitude = self.df[[ 'LONGITUDE' ]].iloc[row][0]
-            description = '{COLUMN} flag was updated to {FLAG}, in [station {STNNBR}, cast number {CASTNO}, bottle {BTLNBR}, latitude {LATITUDE}, longitude {LONGITUDE}]'.format(
-                COLUMN=column, FLAG=new_flag_value, STNNBR=stnnbr, CASTNO=castno,
-                BTLNBR=btlnbr, LATITUDE=latitude, LONGITUDE=longitude,
-            )
-            lg.info('>> MOVES LOG: {}, {}, {}'.format(date, action, description))
 
-            fields = [date, action, stnnbr, castno, btlnbr, latitude, longitude, column, new_flag_value, description]
-            if not self.moves.empty:
-                last_pos = self.moves.tail(1).index[0]
-                self.moves.loc[last_pos + 1] = fields  # fastest way to add a row at the end
+        # the values of the edited rows are taken at once, and the rows of the log are built by columns
+        values = self.df.iloc[
+            row_indices, self.df.columns.get_indexer(['STNNBR', 'CASTNO', 'BTLNBR', 'LATITUDE', 'LONGITUDE'])
+        ].to_numpy().astype(str).astype(object)
+        descriptions = np.full(values.shape[0], '{} flag was updated to {}, in ['.format(column, new_flag_value), dtype=object)
+        for i, label in enumerate(['station ', ', cast number ', ', bottle ', ', latitude ', ', longitude ']):
+            descriptions = descriptions + label + values[:, i]
+        descriptions = descriptions + ']'
+
+        moves = np.empty((values.shape[0], 10), dtype=object)
+        moves[:, 0] = date
+        moves[:, 1] = action
+        moves[:, 2:7] = values      # stnnbr, castno, btlnbr, latitude, longitude
+        moves[:, 7] = column
+        moves[:, 8] = new_flag_value
+        moves[:, 9] = descriptions
+        lg.info('>> MOVES LOG: {}, {}, {} ROWS'.format(date, action, moves.shape[0]))
+        self.moves.append(moves.tolist())       # they are inserted in the database in one transaction by the writer
+
+        if self.journal is not None:    # only the edited rows are written, data.csv is written on compaction
+            self.journal.append(column, hash_index_list, row_indices, new_flag_value)
+            if self.journal.is_full():
+                self.env.cd_writer.mark_dirty(self, columns=[])
             else:
-                self.moves.loc[0] = fields
+                self.env.cd_writer.mark_dirty(self, data=False)
+        else:
+            self.save_tmp_data(columns=[column])
 
-        self.save_tmp_data()
+    def _replay_journal(self):
+        ''' Applies the flag edits that were not written in data.csv yet.
+            Returns the set of columns modified
+        '''
+        if self.journal is not None:
+            columns = self.journal.replay(self.df)
+            if len(columns) > 0:
+                self.stats.invalidate(columns)
+            return columns
+        return set()
 
     def add_moves_element(self, action, description):
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if not self.moves.empty:
-            last_pos = self.moves.tail(1).index[0]
-            self.moves.loc[last_pos + 1] = [date, action, '', '', '', '', '', '', '', description]  # fastest way to add a row at the end
-        else:
-            self.moves.loc[0] = [date, action, '', '', '', '', '', '', '', description]
+        self.moves.add(date, action, description)
+
+    def _set_cps(self):
+        ''' Adds all the calculated parameters to the DF
+            when the file is loaded in the application.
 
-    def recompute_cps(self):
-        ''' Compute all the calculated parameters again. Mainly after a cruise data update
+                NOTE: When the file is open the cps are copied from `custom_settings.json`
+                      So we have all the CP we need in cps['proj_settings_cps']
+        '''
+        lg.info('-- SET COMPUTED PARAMETERS')
+        self.cp_param.compute_cps([
+            c['param_name'] for c in self.cp_param.proj_settings_cps if c['param_name'] not in self.cols
+        ])
+        self.save_col_attribs()     # once for all the computed parameters
+
+    def recompute_cps(self, dirty=None):
+        ''' Compute the calculated parameters again. Mainly after a cruise data update
+
+            @dirty - {column: HASH_IDs of the modified rows, or None if all the rows were modified}.
+                     If it is set only the CPs affected by the changes are computed again (see compute_cps).
+                     Otherwise all of them are computed
+
+            Returns the @dirty dictionary updated with the CPs that changed
 
             NOTE: what should happen if some column cannot be computed?
                   - Check if it is plotted in order to remove the plots?
@@ -694,41 +758,71 @@ class CruiseData(CruiseDataExport):
         '''
         lg.info('-- RECOMPUTE CP PARAMETERS')
         cp_params = self.env.cruise_data.get_cols_by_attrs('computed')
-        for c in cp_params:
-            del self.cols[c]
+        if dirty is None:
+            for c in cp_params:
+                del self.cols[c]
         cps_to_rmv = []
-        for c in self.cp_param.proj_settings_cps:
-            if c['param_name'] not in self.cols:  # exclude the computed parameters
-                res = self.cp_param.add_computed_parameter({
-                    'value': c['param_name'],
-                    'prevent_save': True
-                })
-                if res.get('success', False) is False:
-                    if c['param_name'] in self.env.cur_plotted_cols:
-                        cps_to_rmv.append(c['param_name'])
+        results = self.cp_param.compute_cps([
+            c['param_name'] for c in self.cp_param.proj_settings_cps
+            if c['param_name'] not in self.cols or c['param_name'] in cp_params  # exclude the other columns
+        ], dirty=dirty)
+        for cp, res in results.items():
+            if res.get('success', False) is False:
+                if cp in self.cols:
+                    del self.cols[cp]
+                if cp in self.env.cur_plotted_cols:
+                    cps_to_rmv.append(cp)
         if cps_to_rmv != []:
             self.env.f_handler.remove_cols_from_qc_plot_tabs(cps_to_rmv)
         self._manage_empty_cols()
         self.env.cruise_data.save_col_attribs()
+        return dirty
+
+    def update_flag_cps(self, dirty):
+        ''' Some CPs read the flags directly from the DF (_SALINITY, _OXYGEN, see OctaveEquations.DF_INPUTS).
+            They are computed again when the flags are modified, and also the CPs that depend on them,
+            only in the rows that changed. The messages of the combined columns are not added
+            to the actions history, they were added when the columns were created
+
+            @dirty - {flag column: HASH_IDs of the modified rows, or None if all of them}
+            Returns {CP: positions of the modified rows}
+        '''
+        dirty = {c: rows for c, rows in dirty.items() if self.cp_param.is_input(c)}
+        if dirty == {}:
+            return {}
+        lg.info('-- UPDATE THE CPS THAT DEPEND ON {}'.format(', '.join(dirty.keys())))
+        flags = set(dirty.keys())
+        results = self.cp_param.compute_cps(
+            self.get_cols_by_attrs('computed'), add_cols=False, dirty=dirty, log_moves=False
+        )
+        changed = {}
+        for cp, rows in dirty.items():
+            if cp not in flags and results.get(cp, {}).get('success', False):
+                changed[cp] = np.arange(self.df.index.size) if rows is None else self.df.index.get_indexer(rows)
+        if changed != {}:
+            self.env.cd_writer.mark_dirty(self, columns=list(changed.keys()))
+        return changed
 
     def _manage_empty_cols(self):
         lg.info('-- SET EMPTY COLS')
         cols = self.get_cols_by_attrs(['param', 'non_qc', 'computed'])
         for c in cols:
-            if self.df[c].isnull().all():
+            if self.stats.is_empty(c):
                 attrs = ','.join(self.cols[c]['attrs'])
                 del self.cols[c]
                 del self.df[c]
+                self.stats.invalidate(c)
                 lg.warning(f'>> COLUMN: {c} REMOVED BECAUSE IT WAS EMPTY | {attrs}')
 
                 fc = f'{c}{FLAG_END}'
                 if fc in self.df:
                     del self.cols[fc]
                     del self.df[fc]
+                    self.stats.invalidate(fc)
                     lg.warning(f'>> FLAG COLUMN: {c} REMOVED BECAUSE THE RELATED PARAM WAS EMPTY')
 
         for c in self.get_cols_by_attrs('flag'):
-            if self.df[self.df[c] == 9][c].index.size == self.df.index.size:
+            if self.stats.all_equal(c, 9):
                 self.cols[c]['attrs'].append('empty')
                 lg.warning(f'>> FLAG: {c} IS MARKED AS EMPTY')
 
@@ -737,6 +831,6 @@ class CruiseData(CruiseDataExport):
 
         # required columns can be nan in order to create the hash_id ??
         for c in self.get_cols_by_attrs(['required']):
-            if self.df[c].isnull().all():
-                self.df[c]['attrs'].append('empty')
+            if self.stats.is_empty(c):
+                self.cols[c]['attrs'].append('empty')
                 lg.warning(f'>> COLUMN: {c} MARKED AS EMPTY')
@@ -9,7 +9,6 @@ from ocean_data_qc.constants import *
 from ocean_data_qc.data_models.cruise_data import CruiseData
 from ocean_data_qc.data_models.exceptions import ValidationError
 
-import csv
 
 class CruiseDataAQC(CruiseData):
     ''' This class use to manage the plain AQC files. This file can be come from
@@ -26,27 +25,40 @@ class CruiseDataAQC(CruiseData):
         self.rollback = 'cd' if cd_aux is False else 'cd_update'
         self.working_dir = working_dir
         self.filepath_or_buffer = path.join(self.working_dir, 'data.csv')  # TODO: original.csv should exists and be the same file??
-        self.skiprows = 0
+        self.from_snapshot = False
+        self.replayed_cols = set()      # flag columns modified by the journal after loading the snapshot
         super(CruiseDataAQC, self).__init__(original_type=original_type, cd_aux=cd_aux)
         self.load_file()
 
-    def _validate_original_data(self):
-        ''' Checks if all the rows have the same number of elements
-
-            In this case there is no need to check the data because
-            was already checked when it was open the first time
-        '''
-        lg.info('-- CHECK DATA FORMAT')
+    def _set_df(self):
+        ''' The typed snapshot is used if it is still valid, otherwise the data.csv file is read '''
+        if self.snapshot is not None:
+            self.get_cols_from_settings_file()
+            df = self.snapshot.load(cps=self.env.f_handler.get('computed_params', PROJ_SETTINGS) or [])
+            if df is not None:
+                self.df = df
+                self.stats.load(self.snapshot.get_stats())     # the columns are not read to know if they are empty
+                self.replayed_cols = self._replay_journal()
+                self.precisions = self.snapshot.manifest['precisions']
+                self.notations = self.snapshot.manifest['notations']
+                self.from_snapshot = True
+                return
+        super(CruiseDataAQC, self)._set_df()
 
     def load_file(self):
+        if self.from_snapshot:
+            lg.info('-- LOAD FILE AQC >> LOAD FROM SNAPSHOT')
+            self._set_cps(missing_only=True)   # the snapshot already has the computed parameters
+            if len(self.replayed_cols) > 0:     # but not the flag edits of the journal
+                self.update_flag_cps({c: None for c in self.replayed_cols})
+            return
         lg.info('-- LOAD FILE AQC >> LOAD FROM FILES')
-        self.get_cols_from_settings_file()
-        self._replace_nan_values()         # '-999' >> NaN
-        self._convert_data_to_number()
         self._set_hash_ids()
+        self._replay_journal()
         self._set_cps()
+        self.save_snapshot()
 
-    def _set_cps(self):
+    def _set_cps(self, missing_only=False):
         ''' Adds all the calculated parameters to the DF when the file is loaded in the application.
             The computed parameters from the columns.json should be computed.
 
@@ -55,12 +67,7 @@ class CruiseDataAQC(CruiseData):
                   Also the computed parameters in self.cols is always going to be a subset of the proj_settings_cps
         '''
         lg.info('-- SET COMPUTED PARAMETERS')
-        proj_settings_cps = self.cp_param.proj_settings_cps
-        for c in proj_settings_cps:
-            cp_to_compute = {
-                'computed_param_name': c['param_name'],
-                'eq': c['equation'],
-                'precision': c['precision'],
-            }
-            lg.info('>> COMPUTING PARAMETER: {}'.format(c['param_name']))
-            self.cp_param.compute_equation(cp_to_compute)
\ No newline at end of file
+        self.cp_param.compute_cps([
+            c['param_name'] for c in self.cp_param.proj_settings_cps
+            if not (missing_only and c['param_name'] in self.df.columns)
+        ], add_cols=False)      # they are already in cols
\ No newline at end of file
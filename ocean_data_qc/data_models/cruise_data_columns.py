@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+
+
+class ColumnCatalog(dict):
+    ''' The cols dictionary of the cruise data objects {column: {'attrs': [...], 'unit': ...}}
+        with an inverted index from each attribute to the columns that have it:
+
+            self.index = {
+                'param': {'ALKALI': None, 'SALNTY': None},   # dict as an ordered set
+                'flag': {'ALKALI_FLAG_W': None, ...},
+            }
+
+        The index is kept up to date when a column is added or removed and when
+        the attrs list of a column is modified (append, remove, +=, ...), so the columns with
+        some attribute are got without scanning all the columns
+
+        The version is increased when a column is added or removed, so the results
+        that depend on the available columns can be cached (see ComputedParameter.check_dependencies)
+
+        NOTE: it is still a dict, so it is saved in settings.json as always
+    '''
+
+    def __init__(self, cols={}):
+        super(ColumnCatalog, self).__init__()
+        self.index = {}
+        self.version = 0
+        for column, attribs in cols.items():
+            self[column] = attribs
+
+    def __setitem__(self, column, attribs):
+        if column in self:
+            self._unindex(column)
+        attribs['attrs'] = AttrList(self, column, attribs.get('attrs', []))
+        super(ColumnCatalog, self).__setitem__(column, attribs)
+        for a in attribs['attrs']:
+            self._add(a, column)
+        self.version += 1
+
+    def __delitem__(self, column):
+        self._unindex(column)
+        super(ColumnCatalog, self).__delitem__(column)
+        self.version += 1
+
+    def pop(self, column, *default):
+        if column in self:
+            self._unindex(column)
+            self.version += 1
+        return super(ColumnCatalog, self).pop(column, *default)
+
+    def update(self, cols={}, **kwargs):
+        for column, attribs in dict(cols, **kwargs).items():
+            self[column] = attribs
+
+    def setdefault(self, column, attribs=None):
+        if column not in self:
+            self[column] = attribs if attribs is not None else {}
+        return self[column]
+
+    def clear(self):
+        super(ColumnCatalog, self).clear()
+        self.index = {}
+        self.version += 1
+
+    def __reduce__(self):
+        ''' The copies and pickles are built again from plain dictionaries '''
+        return (ColumnCatalog, ({c: dict(v, attrs=list(v['attrs'])) for c, v in self.items()}, ))
+
+    def get_cols(self, attrs):
+        ''' Set of columns with any of the @attrs '''
+        res = set()
+        for a in attrs:
+            res.update(self.index.get(a, {}))
+        return res
+
+    def has_attr(self, column, attr):
+        return column in self.index.get(attr, {})
+
+    def _add(self, attr, column):
+        self.index.setdefault(attr, {})[column] = None
+
+    def _discard(self, attr, column):
+        ''' The attribute may be repeated in the list, the column keeps it if so '''
+        if attr in self.index and attr not in self[column]['attrs']:
+            self.index[attr].pop(column, None)
+
+    def _unindex(self, column):
+        for a in super(ColumnCatalog, self).__getitem__(column)['attrs']:
+            if a in self.index:
+                self.index[a].pop(column, None)
+
+
+class AttrList(list):
+    ''' The attrs list of a column, it updates the index of the catalog when it is modified '''
+
+    def __init__(self, catalog, column, attrs=[]):
+        super(AttrList, self).__init__(attrs)
+        self.catalog = catalog
+        self.column = column
+
+    def append(self, attr):
+        super(AttrList, self).append(attr)
+        self.catalog._add(attr, self.column)
+
+    def extend(self, attrs):
+        attrs = list(attrs)
+        super(AttrList, self).extend(attrs)
+        for a in attrs:
+            self.catalog._add(a, self.column)
+
+    def __iadd__(self, attrs):
+        self.extend(attrs)
+        return self
+
+    def insert(self, pos, attr):
+        super(AttrList, self).insert(pos, attr)
+        self.catalog._add(attr, self.column)
+
+    def remove(self, attr):
+        super(AttrList, self).remove(attr)
+        self.catalog._discard(attr, self.column)
+
+    def pop(self, pos=-1):
+        attr = super(AttrList, self).pop(pos)
+        self.catalog._discard(attr, self.column)
+        return attr
+
+    def __reduce_ex__(self, protocol):
+        ''' The copies are plain lists, not linked to the catalog '''
+        return (list, (list(self), ))
@@ -28,6 +28,7 @@ class CruiseDataExport(Environment):
             It will export the latest saved data
         """
         lg.info('-- EXPORT WHP')
+        self.compact_journal()
         if path.isfile(path.join(TMP, 'export_whp.csv')):
             os.remove(path.join(TMP, 'export_whp.csv'))
 
@@ -35,7 +36,7 @@ class CruiseDataExport(Environment):
             if self.env.cruise_data.original_type == 'whp':
                 with open(path.join(TMP, 'original.csv')) as f_in:
                     f_out.write(f_in.readline().rstrip().rstrip(',')+'\n')    # get the first line "BOTTLE..." and remove ending ,,, if any
-            elif self.env.cruise_data.original_type == 'csv':
+            elif self.env.cruise_data.original_type in ['csv', 'netcdf']:
                 f_out.write('BOTTLE,{}{}\n'.format(
                     datetime.now().strftime('%Y%m%d'),
                     re.sub(r'\W+', '', APP_SHORT_NAME).upper()
@@ -91,6 +92,7 @@ class CruiseDataExport(Environment):
             It will export the latest saved data
         """
         lg.info('-- EXPORT CSV')
+        self.compact_journal()
         if path.isfile(path.join(TMP, 'export_data.csv')):
             os.remove(path.join(TMP, 'export_data.csv'))
         aux_df = self.df.copy(deep=True)
@@ -139,30 +141,30 @@ class CruiseDataExport(Environment):
                 df[c] = df[c].round(all_cols[c]['precision'])
         return df
 
-    def save_csv_data(self):
-        """ it saves the dataframe self.df to the data.csv file
+    def save_csv_data(self, df=None):
+        """ it saves the dataframe self.df (or @df) to the data.csv file
             the columns x_wm and y_wm are not saved because they are
             automatically generated from LATITUDE and LONGITUDE columns
         """
         lg.info('-- SAVING DATA TO data.csv')
 
-        aux_df = self.df.copy(deep=True)
+        aux_df = self.df if df is None else df
         if 'AUX' in aux_df.columns:
-            del aux_df['AUX']
+            aux_df = aux_df.drop(columns=['AUX'])
 
+        tmp_path = os.path.join(TMP, 'data.csv.tmp')      # the file is replaced when it is complete
         aux_df.to_csv(
-            os.path.join(TMP, 'data.csv'),
+            tmp_path,
             # index_label='HASH_ID',
             index=False,
         )
+        os.replace(tmp_path, os.path.join(TMP, 'data.csv'))
 
     def save_moves(self):
+        ''' The moves are stored in the moves.db database, moves.csv is written to export them '''
         lg.info('-- SAVE MOVES')
-        if not self.moves.empty:
-            self.moves.to_csv(
-                os.path.join(TMP, 'moves.csv'),
-                index_label='index',
-            )
+        if not self.moves.is_empty():
+            self.moves.export_csv(MOVES_CSV)
 
     def save_col_attribs(self):
         """ The columns and their attributes are saved """
@@ -175,6 +177,9 @@ class CruiseDataExport(Environment):
             with open(path.join(TMP, 'original.csv'), 'r', errors="ignore") as file:
                 meta = open(path.join(TMP, 'metadata'),'w')
                 for line in file:
+                    line = line.lstrip(' \t"')         # excel artifacts are not removed from original.csv
+                    if line.startswith('END_DATA'):
+                        break
                     if line.startswith('#'):
                         # NOTE: I strip spaces commas and breaklines in order to clean the result
                         #       sometimes excel adds many commas at the end of each line.
@@ -189,9 +194,54 @@ class CruiseDataExport(Environment):
                         #       and later, it is open with linux again. Because I am afraid
                         #       the breaklines are not going to work well
 
-    def save_tmp_data(self):
-        lg.info('-- SAVE TMP DATA')
+    def save_snapshot(self, columns=None, df=None, attach=True):
+        ''' Saves the typed snapshot used to reopen the project quickly.
+            If @columns is set only those columns are written again.
+
+            After a complete save the DF is attached to the memory-mapped snapshot,
+            so the data of the columns that are not used is not kept in memory
+        '''
+        if self.snapshot is None:
+            return
+        cps = self.env.f_handler.get('computed_params', PROJ_SETTINGS) or []
+        self.snapshot.save(
+            df=self.df if df is None else df,
+            precisions=self.precisions,
+            notations=self.notations,
+            cps=cps,
+            columns=columns
+        )
+        if columns is None and attach:
+            self.attach_snapshot()
+
+    def attach_snapshot(self):
+        if self.snapshot is None:
+            return
+        df = self.snapshot.load(cps=self.env.f_handler.get('computed_params', PROJ_SETTINGS) or [])
+        if df is not None:
+            self.df = df    # the columns in memory are released, they are read from disk when they are used
+
+    def compact_journal(self):
+        ''' The flag edits of the journal are written in data.csv and the snapshot now,
+            and moves.csv is written with the moves of the database.
+            It is called before the exports, also from Electron before zipping the project files
+            or exporting the action history
+        '''
+        lg.info('-- COMPACT JOURNAL')
         self.save_moves()
-        self.save_csv_data()
-        self.save_col_attribs()
-        self.save_metadata()
\ No newline at end of file
+        if self.journal is not None and not self.journal.is_empty():
+            self.env.cd_writer.mark_dirty(self, columns=[])
+        self.env.cd_writer.flush()
+        return True
+
+    def save_tmp_data(self, columns=None):
+        ''' The columns attributes and the metadata are saved now. data.csv, the moves and the snapshot
+            are written by the CruiseDataWriter in the background. If @columns is set only the values of
+            those columns were modified
+        '''
+        lg.info('-- SAVE TMP DATA')
+        self._report_progress('Saving the project')
+        if columns is None:         # the attributes do not change if only some values were modified
+            self.save_col_attribs()
+        self.save_metadata()
+        self.env.cd_writer.mark_dirty(self, columns=columns)
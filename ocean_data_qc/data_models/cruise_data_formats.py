@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+
+from os import path
+import os
+
+
+class CruiseDataFormats(object):
+    ''' Registry of the cruise data classes that can read an original file.
+
+        Each registered class declares a `sniff(head, tail)` classmethod that receives the first
+        and the last bytes of the file and returns True if the class can read it.
+        The formats are checked by priority, so the generic ones should have a lower priority.
+        Only HEAD_SIZE + TAIL_SIZE bytes of the file are read to detect the format, whatever its size.
+
+        New formats are added with the `register_format` decorator:
+
+            @register_format('whp', priority=20)
+            class CruiseDataWHP(CruiseData):
+                @classmethod
+                def sniff(cls, head, tail):
+                    return head.startswith(b'BOTTLE')
+    '''
+    HEAD_SIZE = 65536
+    TAIL_SIZE = 4096
+    formats = []        # [(priority, original_type, class), ...] sorted by priority
+
+    @classmethod
+    def register(cls, original_type, cd_class, priority=0):
+        cls.formats = [f for f in cls.formats if f[1] != original_type]
+        cls.formats.append((priority, original_type, cd_class))
+        cls.formats.sort(key=lambda f: -f[0])
+
+    @classmethod
+    def read_head_tail(cls, f_path):
+        ''' Returns the first and the last bytes of the file. They are the same if the file is small '''
+        size = os.stat(f_path).st_size
+        with open(f_path, 'rb') as f:
+            head = f.read(cls.HEAD_SIZE)
+            if size <= cls.HEAD_SIZE:
+                return head, head
+            f.seek(max(size - cls.TAIL_SIZE, 0))
+            tail = f.read()
+        return head, tail
+
+    @classmethod
+    def detect(cls, f_path):
+        ''' Returns the tuple (original_type, class) of the first format that
+            can read the file, or (None, None) if there is not any
+        '''
+        if not path.isfile(f_path):
+            raise FileNotFoundError('The file was not found: {}'.format(f_path))
+        head, tail = cls.read_head_tail(f_path)
+        for priority, original_type, cd_class in cls.formats:
+            if cd_class.sniff(head, tail):
+                lg.info('>> FILE FORMAT DETECTED: {}'.format(original_type))
+                return original_type, cd_class
+        return None, None
+
+
+def register_format(original_type, priority=0):
+    ''' Class decorator to add a cruise data class to the formats registry '''
+    def decorator(cd_class):
+        CruiseDataFormats.register(original_type, cd_class, priority)
+        return cd_class
+    return decorator
+
+
+TEXT_BYTES = bytes(range(32, 256)) + b'\t\r\n\x0b\x0c\x1a'
+
+
+def is_plain_text(head):
+    ''' Checks if the first bytes of the file are text: no control characters are expected.
+            NOTE: this replaces the libmagic check, which needs an external library
+    '''
+    return len(head.translate(None, TEXT_BYTES)) == 0
+
+
+def get_lines(data, n=None, from_end=False):
+    ''' Decoded lines of the bytes @data without the line endings, Excel quotes and spaces '''
+    lines = data.decode('ascii', errors='replace').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    lines = [l.strip(' \t"') for l in lines]
+    if from_end:
+        lines = [l for l in lines if l.strip(',') != ''][::-1]
+    return lines if n is None else lines[:n]
@@ -9,21 +9,17 @@ from ocean_data_qc.constants import *
 from ocean_data_qc.data_models.cruise_data_aqc import CruiseDataAQC
 from ocean_data_qc.data_models.cruise_data_csv import CruiseDataCSV
 from ocean_data_qc.data_models.cruise_data_whp import CruiseDataWHP
+from ocean_data_qc.data_models.cruise_data_netcdf import CruiseDataNetCDF
+from ocean_data_qc.data_models.cruise_data_multi import CruiseDataMulti
+from ocean_data_qc.data_models.cruise_data_formats import CruiseDataFormats
 from ocean_data_qc.data_models.cruise_data_update import CruiseDataUpdate
 from ocean_data_qc.data_models.computed_parameter import ComputedParameter
 from ocean_data_qc.data_models.exceptions import ValidationError
+from ocean_data_qc.data_models.loading_task import LoadingTask
 from ocean_data_qc.env import Environment
 import re
 
 from os import path
-try:
-    import magic
-except Exception:
-    try:
-        from winmagic import magic  # TODO: is this working on linux/osx?
-                                    #       because I would need only one import
-    except:
-        import mimetypes
 
 
 class CruiseDataHandler(Environment):
@@ -34,8 +30,11 @@ class CruiseDataHandler(Environment):
 
     def get_cruise_data_columns(self):
         lg.info('-- GET CRUISE DATA COLUMNS')
-        if self.env.cruise_data is None:
-            self._init_cruise_data()
+        if self.env.cruise_data is None:  # the columns are sent when the file is loaded
+            return LoadingTask(target=self._init_cruise_data, on_done=self._get_cruise_data_columns)
+        return self._get_cruise_data_columns()
+
+    def _get_cruise_data_columns(self):
         params = self.env.cruise_data.get_cols_by_attrs('param', discard_nan=True)
         if len(params) == 0:
             raise ValidationError(
@@ -56,8 +55,10 @@ class CruiseDataHandler(Environment):
 
     def _init_cruise_data(self, update=False):
         ''' Checks data type and instantiates the appropriate cruise data object
+                The format of original.csv is detected by the classes registered in CruiseDataFormats
                 `whp` and `raw_csv` (csv) >> process file from scratch and validate data
                 `aqc` >> open directly
+                `multi` >> several files in the originals folder, they are merged in original.csv
                 @update - boolean, whether the instantiated object is to make comparisons or not
         '''
         lg.info('-- INIT CRUISE DATA OBJECT')
@@ -71,62 +72,36 @@ class CruiseDataHandler(Environment):
             cd_aux = False
         original_path = path.join(working_dir, 'original.csv')
 
-        if path.isfile(original_path):
-            if self._is_plain_text(original_path):
-                is_whp_format = self._is_whp_format(original_path)
-                if path.isfile(path.join(working_dir, 'data.csv')):   # aqc or pending session
-                    original_type = 'whp' if is_whp_format else 'csv'
-                    CruiseDataAQC(
-                        original_type=original_type,
-                        working_dir=working_dir,
-                        cd_aux=cd_aux,
-                        cd_update=update
-                    )
-                else:
-                    if is_whp_format:
-                        # generates data.csv from original.csv
-                        CruiseDataWHP(working_dir=working_dir, cd_aux=cd_aux, cd_update=update)
-                    else:
-                        # the data.csv should be a copy of original.csv, at the beggining at least
-                        CruiseDataCSV(working_dir=working_dir, cd_aux=cd_aux, cd_update=update)
-            else:
+        if not update and not path.isfile(original_path) and path.isdir(ORIGINALS):
+            CruiseDataMulti(working_dir=working_dir)
+        elif path.isfile(original_path):
+            original_type, cd_class = CruiseDataFormats.detect(original_path)
+            if cd_class is None:
                 raise ValidationError(
                     'The file to open should be a CSV file.'
                     ' That is a plain text file with comma separate values.',
                     rollback=rollback
                 )
+            if path.isfile(path.join(working_dir, 'data.csv')):   # aqc or pending session
+                CruiseDataAQC(
+                    original_type=original_type,
+                    working_dir=working_dir,
+                    cd_aux=cd_aux,
+                    cd_update=update
+                )
+            else:
+                # generates the DF from original.csv, data.csv is saved afterwards
+                cd_class(working_dir=working_dir, cd_aux=cd_aux, cd_update=update)
         else:
             raise ValidationError(
                 'The file could not be open',
                 rollback=rollback
             )
 
-    def _is_plain_text(self, csv_path=''):
-        ''' The original.csv file should be a normal raw csv file '''
-        try:
-            file_type = magic.from_file(csv_path, mime=True)
-        except:
-            file_type = mimetypes.guess_type(csv_path)[0]
-        if file_type != 'text/plain' and file_type != 'text/csv':
-            return False
-        return True
-
-    def _is_whp_format(self, csv_path=None):
-        ''' Open the file and checks if comply to the WHP format requirements '''
-
-        if path.isfile(csv_path):
-            with open(csv_path, 'rt', encoding="ascii", errors="surrogateescape") as f:
-                raw_data = f.read()
-        else:
-            raise FileNotFoundError('The file was not found: {}'.format(csv_path))
-
-        if raw_data.startswith('BOTTLE'):
-            if raw_data.endswith('END_DATA'):
-                return True
-            elif raw_data.split('\n')[-1].startswith('END_DATA'):
-                return True     # has weird end_data
-            elif raw_data.split('\n')[-2].startswith('END_DATA'):
-                return True     # has weird end_data 2
+    def cancel_loading(self):
+        ''' The loading stops in the next progress report and the rollback is run there '''
+        if self.env.loading_task is not None:
+            self.env.loading_task.cancel()
 
     def compare_data(self):
         lg.info('-- COMPARE DATA')
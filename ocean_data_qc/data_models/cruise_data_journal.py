@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.cruise_data_keys import RowKeys
+
+from os import path
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+
+class CruiseDataJournal(object):
+    ''' Append-only binary journal of the flag edits, stored next to data.csv (journal.bin).
+        A flag edit only appends its rows here, data.csv and the snapshot are not written again:
+
+            header:     b'AQCJ' + version (uint16)
+            edit:       b'E' + column name length (uint16) + column name (utf-8)
+                        + number of rows (uint32) + timestamp (float64) + new value (float64)
+                        + one record per row: HASH_ID (16 bytes) + row position (uint32)
+
+        The journal is replayed over the snapshot (or data.csv) when the project is opened.
+        When data.csv is written again the edits that are already there are removed from the head
+        of the journal (see CruiseDataWriter). That is forced when the journal is larger than
+        MAX_SIZE and before the exports, so the exported files always have all the edits.
+
+        NOTE: each edit is written with only one write call, an incomplete edit at the end
+              of the file (the application was killed in the middle) is discarded
+    '''
+    MAGIC = b'AQCJ'
+    VERSION = 2
+    HEADER = struct.Struct('<4sH')
+    EDIT = struct.Struct('<cH')
+    EDIT_VALUES = struct.Struct('<Idd')
+    ROW = np.dtype([('hash', 'u1', (16,)), ('pos', '<u4')])     # 'S16' would drop the trailing zero bytes
+    MAX_SIZE = 4 * 1024 * 1024          # bytes, about 200000 rows edited
+
+    def __init__(self, working_dir=TMP):
+        self.working_dir = working_dir
+        self.journal_path = path.join(working_dir, 'journal.bin')
+        self.columns = set()            # columns with edits in the journal
+        self._size = None
+        self._lock = threading.Lock()   # the head is removed from the writer thread
+
+    @property
+    def size(self):
+        ''' Size of the journal in bytes, 0 if it does not exist '''
+        if self._size is None:
+            self._size = path.getsize(self.journal_path) if path.isfile(self.journal_path) else 0
+        return self._size
+
+    def is_empty(self):
+        return self.size <= self.HEADER.size
+
+    def is_full(self):
+        return self.size > self.MAX_SIZE
+
+    def append(self, column, hash_ids, positions, new_value):
+        ''' Appends the edit of the flag @column in the rows @positions (with @hash_ids) '''
+        name = column.encode('utf-8')
+        rows = np.empty(len(positions), dtype=self.ROW)
+        rows['hash'] = np.frombuffer(bytes.fromhex(''.join(hash_ids)), dtype=np.uint8).reshape(-1, 16)
+        rows['pos'] = positions
+        data = b''.join([
+            self.EDIT.pack(b'E', len(name)), name,
+            self.EDIT_VALUES.pack(rows.size, time.time(), float(new_value)),
+            rows.tobytes(),
+        ])
+        with self._lock:
+            if self.size == 0:
+                data = self.HEADER.pack(self.MAGIC, self.VERSION) + data
+            with open(self.journal_path, 'ab') as f:
+                f.write(data)
+            self._size += len(data)
+            self.columns.add(column)
+
+    def replay(self, df):
+        ''' Applies the edits of the journal to @df, which has the HASH_ID index.
+            The row position is used if it has the same HASH_ID, otherwise the row is searched.
+            Returns the set of columns modified
+        '''
+        edits = self._read()
+        if len(edits) == 0:
+            return set()
+        lg.info('-- REPLAY JOURNAL: {} EDITS'.format(len(edits)))
+        index = df.index.to_numpy()
+        modified = set()
+        for column, new_value, rows in edits:
+            if column not in df.columns:
+                lg.warning('>> THE COLUMN {} OF THE JOURNAL DOES NOT EXIST'.format(column))
+                continue
+            keys = RowKeys.to_hex(rows['hash']).astype(object)
+            pos = rows['pos'].astype(np.int64)
+            valid = pos < index.size
+            valid[valid] = index[pos[valid]] == keys[valid]
+            if not valid.all():             # the rows were moved, they are searched by HASH_ID
+                pos[~valid] = df.index.get_indexer(keys[~valid]) if df.index.is_unique else -1
+            pos = pos[pos >= 0]
+            if df[column].dtype.kind in 'iu' and new_value == int(new_value):
+                new_value = int(new_value)
+            if pos.size > 0:
+                df.iloc[pos, df.columns.get_loc(column)] = new_value
+                modified.add(column)
+        self.columns |= modified
+        return modified
+
+    def discard_head(self, offset):
+        ''' The edits until @offset were written in data.csv, they are removed from the journal '''
+        with self._lock:
+            if offset <= self.HEADER.size or not path.isfile(self.journal_path):
+                return
+            if offset >= self.size:
+                os.remove(self.journal_path)
+                self._size = 0
+                self.columns = set()
+                return
+            with open(self.journal_path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION) + tail)
+            os.replace(tmp_path, self.journal_path)
+            self._size = self.HEADER.size + len(tail)
+
+    def _read(self):
+        ''' Returns the list of edits [(column, new value, rows)]. The incomplete edit at the end is removed '''
+        if self.is_empty():
+            return []
+        with self._lock:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+            magic, version = self.HEADER.unpack_from(data, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                lg.warning('>> THE JOURNAL FORMAT IS UNKNOWN, IT IS DISCARDED')
+                os.remove(self.journal_path)
+                self._size = 0
+                return []
+            edits = []
+            i = self.HEADER.size
+            while i < len(data):
+                try:
+                    kind, name_len = self.EDIT.unpack_from(data, i)
+                    j = i + self.EDIT.size
+                    column = data[j:j + name_len].decode('utf-8')
+                    j += name_len
+                    n, timestamp, new_value = self.EDIT_VALUES.unpack_from(data, j)
+                    j += self.EDIT_VALUES.size
+                    if kind != b'E' or j + n * self.ROW.itemsize > len(data):
+                        raise ValueError('incomplete edit')
+                except (struct.error, ValueError, UnicodeDecodeError):
+                    lg.warning('>> THE LAST EDIT OF THE JOURNAL IS INCOMPLETE, IT IS DISCARDED')
+                    with open(self.journal_path, 'r+b') as f:
+                        f.truncate(i)
+                    self._size = i
+                    break
+                rows = np.frombuffer(data, dtype=self.ROW, count=n, offset=j)
+                edits.append((column, new_value, rows))
+                i = j + n * self.ROW.itemsize
+            return edits
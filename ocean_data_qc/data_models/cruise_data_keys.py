@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+
+import numpy as np
+import pandas as pd
+
+
+class RowKeys(object):
+    ''' Identity of the rows of a cruise data object and the lookup structure from key to row position.
+
+        The key of each row is a 128 bits hash of the columns in KEY_COLS, built with two
+        vectorized 64 bits hashes with different seeds. Each half chains the columns through
+        the murmur3 finalizer, so the halves are independent also when all the columns are numeric.
+        The strings are hashed first with the keyed hash of pandas (a different key per half).
+        The key is represented as a hexadecimal string of 32 characters. The same scheme is always used,
+        so the keys of cruise_data and cd_aux can be compared directly.
+
+        The comparisons are made with the hash table of the pandas Index, which is built only once
+        and shared while the index of the DF does not change
+    '''
+    KEY_COLS = [STNNBR, 'CASTNO', 'BTLNBR', 'LATITUDE', 'LONGITUDE']
+    SEEDS = [0x9e3779b97f4a7c15, 0x2545f4914f6cdd1d]              # initial value of each half
+    HASH_KEYS = ['0123456789abcdef', 'fedcba9876543210']            # hash_array needs 16 characters
+    HEX_TABLE = np.array(['{:02x}'.format(i) for i in range(256)])
+
+    def __init__(self, index):
+        self.index = index if isinstance(index, pd.Index) else pd.Index(index)
+
+    @classmethod
+    def build(cls, df):
+        ''' Returns the array of keys of the rows of @df '''
+        cols = [cls._canonical(df[c]) for c in cls.KEY_COLS if c in df]
+        halves = []
+        for seed, hash_key in zip(cls.SEEDS, cls.HASH_KEYS):
+            h = np.full(len(df.index), seed, dtype=np.uint64)
+            for col in cols:
+                if col.dtype == object:
+                    col = pd.util.hash_array(col, hash_key=hash_key)
+                h = cls._mix(h ^ col)
+            halves.append(h)
+        raw = np.stack(halves, axis=1).astype('>u8').view(np.uint8)     # 16 bytes per row
+        return cls.to_hex(raw)
+
+    @classmethod
+    def to_hex(cls, raw):
+        ''' Keys of the rows of the uint8 array @raw, with 16 bytes per row '''
+        return np.ascontiguousarray(cls.HEX_TABLE[raw]).view('<U32').ravel()
+
+    @staticmethod
+    def _mix(h):
+        ''' murmur3 finalizer, the multiplications wrap around '''
+        h = h ^ (h >> np.uint64(33))
+        h = h * np.uint64(0xff51afd7ed558ccd)
+        h = h ^ (h >> np.uint64(33))
+        h = h * np.uint64(0xc4ceb9fe1a85ec53)
+        return h ^ (h >> np.uint64(33))
+
+    @staticmethod
+    def _canonical(col):
+        ''' The same values must give the same hash whatever the type they were loaded with:
+            the numeric columns are hashed as the bits of the float value (-0.0 as 0.0, and only one NaN)
+            and the strings without spaces
+        '''
+        if pd.api.types.is_numeric_dtype(col):
+            values = col.to_numpy(dtype=np.float64, na_value=np.nan) + 0.0     # -0.0 + 0.0 is 0.0
+            values[np.isnan(values)] = np.nan
+            return values.view(np.uint64)
+        col = col.astype(object)
+        return col.where(col.notnull(), '').astype(str).str.strip().to_numpy(dtype=object)
+
+    def get_duplicates(self):
+        ''' Positions of the rows whose key is repeated '''
+        return np.flatnonzero(self.index.duplicated(keep=False))
+
+    def difference(self, other):
+        ''' Keys of this object that are not in the RowKeys @other '''
+        return self.index[~self.index.isin(other.index)].unique().tolist()
+
+    def intersection(self, other):
+        ''' Keys of this object that are in the RowKeys @other as well '''
+        return self.index[self.index.isin(other.index)].unique().tolist()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+
+from contextlib import closing
+from os import path
+import csv
+import os
+import sqlite3
+import threading
+
+
+class CruiseDataMoves(object):
+    ''' Log of actions (moves) stored in a SQLite database in the working folder (moves.db).
+
+        The new moves are kept in memory and they are inserted in one transaction
+        when flush() is called (see CruiseDataWriter), so flagging thousands of rows
+        is only one insert. The history view reads the moves by pages with query().
+
+        moves.csv is still written by export_csv() before the project is saved
+        or the action history is exported. If the database does not exist (projects
+        saved with older versions) it is created with the rows of moves.csv.
+
+        If the working folder is None (auxiliary cruise data) the moves are only kept in memory
+    '''
+    COLUMNS = [
+        'date', 'action', 'stnnbr', 'castno',
+        'btlnbr', 'latitude', 'longitude', 'param', 'value', 'description'
+    ]
+    FILTERS = {                 # query argument: SQL condition
+        'action': 'action = ?',
+        'station': 'stnnbr = ?',
+        'param': 'param = ?',
+        'date_from': 'date >= ?',
+        'date_to': 'date <= ?',
+    }
+    PAGE_SIZE = 100
+
+    def __init__(self, working_dir=TMP):
+        self.working_dir = working_dir
+        self.db_path = path.join(working_dir, 'moves.db') if working_dir is not None else None
+        self.pending = []               # rows that are not in the database yet
+        self._lock = threading.Lock()   # the moves are inserted from the writer thread
+        if self.db_path is not None:
+            self._init_db()
+
+    def append(self, rows):
+        ''' Adds a list of rows, each one with the values of COLUMNS '''
+        rows = [tuple('' if v is None else str(v) for v in r) for r in rows]
+        with self._lock:
+            self.pending.extend(rows)
+
+    def add(self, date, action, description, stnnbr='', castno='', btlnbr='',
+            latitude='', longitude='', param='', value=''):
+        self.append([(date, action, stnnbr, castno, btlnbr, latitude, longitude, param, value, description)])
+
+    def flush(self):
+        ''' Inserts the pending rows in the database in only one transaction '''
+        if self.db_path is None:
+            return
+        with self._lock:
+            rows, self.pending = self.pending, []
+            if rows == []:
+                return
+            lg.info('-- INSERT MOVES: {}'.format(len(rows)))
+            with closing(self._connect()) as conn:
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO moves ({}) VALUES ({})'.format(
+                            ', '.join(self.COLUMNS), ', '.join(['?'] * len(self.COLUMNS))
+                        ), rows
+                    )
+
+    def query(self, args={}):
+        ''' Paginated query for the action history. Called from JavaScript:
+
+                args = {
+                    'page': 0,
+                    'page_size': 100,
+                    'action': 'QC Update',          # optional filters
+                    'station': '12',
+                    'param': 'SALNTY_FLAG_W',
+                    'date_from': '2020-01-01',
+                    'date_to': '2020-12-31 23:59:59',
+                }
+
+            Returns {'total': number of moves, 'page': page, 'page_size': page_size, 'rows': [{...}]}
+        '''
+        args = args if isinstance(args, dict) else {}
+        page = max(int(args.get('page', 0) or 0), 0)
+        page_size = max(int(args.get('page_size', self.PAGE_SIZE) or self.PAGE_SIZE), 1)
+        self.flush()
+        if self.db_path is None:
+            return {'total': 0, 'page': page, 'page_size': page_size, 'rows': []}
+
+        conditions = []
+        values = []
+        for f, cond in self.FILTERS.items():
+            if args.get(f, '') not in ('', None, False):
+                conditions.append(cond)
+                values.append(str(args[f]))
+        where = ' WHERE {}'.format(' AND '.join(conditions)) if conditions else ''
+        with closing(self._connect()) as conn:
+            total = conn.execute('SELECT COUNT(*) FROM moves{}'.format(where), values).fetchone()[0]
+            cursor = conn.execute(
+                'SELECT id - 1, {} FROM moves{} ORDER BY id LIMIT ? OFFSET ?'.format(
+                    ', '.join(self.COLUMNS), where
+                ), values + [page_size, page * page_size]
+            )
+            rows = [dict(zip(['index'] + self.COLUMNS, r)) for r in cursor]
+        return {'total': total, 'page': page, 'page_size': page_size, 'rows': rows}
+
+    def is_empty(self):
+        if self.pending != []:
+            return False
+        if self.db_path is None:
+            return True
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT 1 FROM moves LIMIT 1').fetchone() is None
+
+    def export_csv(self, f_path=MOVES_CSV):
+        ''' Writes all the moves in the @f_path CSV file, with the same format as the old moves.csv '''
+        lg.info('-- EXPORT MOVES CSV')
+        self.flush()
+        if self.db_path is None:
+            return
+        tmp_path = f_path + '.tmp'
+        with closing(self._connect()) as conn, open(tmp_path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['index'] + self.COLUMNS)
+            writer.writerows(conn.execute(
+                'SELECT id - 1, {} FROM moves ORDER BY id'.format(', '.join(self.COLUMNS))
+            ))
+        os.replace(tmp_path, f_path)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_db(self):
+        exists = path.isfile(self.db_path)
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS moves (id INTEGER PRIMARY KEY AUTOINCREMENT, {})'.format(
+                    ', '.join('{} TEXT'.format(c) for c in self.COLUMNS)
+                ))
+                for c in ['date', 'action', 'stnnbr', 'param']:
+                    conn.execute('CREATE INDEX IF NOT EXISTS moves_{0} ON moves ({0})'.format(c))
+        moves_csv = path.join(self.working_dir, 'moves.csv')
+        if not exists and path.isfile(moves_csv) and os.stat(moves_csv).st_size != 0:
+            self._import_csv(moves_csv)
+
+    def _import_csv(self, f_path):
+        lg.info('-- IMPORT MOVES FROM moves.csv')
+        with open(f_path, 'r', newline='', errors='ignore') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            cols = [header.index(c) if c in header else None for c in self.COLUMNS]
+            self.append([
+                [r[i] if i is not None and i < len(r) else '' for i in cols]
+                for r in reader if len(r) > 0
+            ])
+        self.flush()
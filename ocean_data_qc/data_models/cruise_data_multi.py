@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.cruise_data import CruiseData
+from ocean_data_qc.data_models.cruise_data_formats import CruiseDataFormats
+from ocean_data_qc.data_models.exceptions import ValidationError
+from ocean_data_qc.data_models.files_handler import FilesHandler
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from copy import deepcopy
+from os import path
+import multiprocessing
+import os
+import pandas as pd
+
+
+class CruiseDataPart(object):
+    ''' Mixin to parse one file of a multi-file project with the class of its format.
+        The file is read and validated as if it was opened alone, but nothing is saved
+        and the computed parameters are not initialized. They are computed once for the merged data.
+
+        NOTE: the rollback is not made here, this runs in a worker process
+    '''
+
+    def __init__(self, f_path, original_type):
+        lg.info('-- INIT PART: {}'.format(path.basename(f_path)))
+        self.rollback = False
+        self.working_dir = path.dirname(f_path)
+        self.filepath_or_buffer = f_path
+        self.global_attrs = {}
+        CruiseData.__init__(self, original_type=original_type, cd_aux=True, parse_only=True)
+        self._set_cols_from_scratch()
+        self._validate_required_columns()
+        self._init_basic_params()
+        self._set_col_precisions()
+        self._validate_flag_values()
+
+    def _report_progress(self, stage=None, rows=None):
+        ''' The progress is reported by the main process, the bokeh document is not here '''
+        pass
+
+
+def init_worker():
+    ''' Initializer of the worker processes. The data_models package does not create its objects
+        in them (the bokeh bridge, octave...), only the settings are needed to validate the files
+    '''
+    FilesHandler()
+
+
+def parse_cruise_file(f_path):
+    ''' Worker of the multi-file loading. Returns a dictionary with the parsed
+        data of the file or with the error message if the file is not valid
+    '''
+    f_name = path.basename(f_path)
+    try:
+        original_type, cd_class = CruiseDataFormats.detect(f_path)
+        if cd_class is None:
+            return {'file': f_name, 'error': 'the format of the file is unknown'}
+        part_class = type('CruiseDataPart', (CruiseDataPart, cd_class), {})
+        part = part_class(f_path, original_type)
+    except ValidationError as e:
+        return {'file': f_name, 'error': e.value}
+    return {
+        'file': f_name,
+        'original_type': original_type,
+        'df': part.df,
+        'cols': {c: dict(attrs, attrs=list(attrs['attrs'])) for c, attrs in part.cols.items()},   # plain dicts to pickle them
+        'moves': part.moves.pending,        # rows, the moves of the part are only in memory
+        'precisions': part.precisions,
+        'notations': part.notations,
+    }
+
+
+class CruiseDataMulti(CruiseData):
+    ''' Project built with several files (the legs of a cruise or several cruises).
+        The files are in the originals folder and each one is parsed in its own process
+        with the validation of its format class (WHP, CSV or NetCDF). Then they are merged:
+
+            * the CRUISE_ID column keeps the name of the file of each row
+            * the column catalogs are unified: units, attributes and external names
+            * the moves of each file are kept with the file name
+
+        The merged data is written in original.csv as a plain CSV file,
+        so the project is reopened, updated and exported as any CSV project
+    '''
+    env = CruiseData.env
+
+    def __init__(self, working_dir=TMP):
+        lg.info('-- INIT MULTI')
+        self.env.cruise_data = self
+        self.rollback = 'cd'
+        self.working_dir = working_dir
+        self.originals_dir = path.join(working_dir, 'originals')
+        self.filepath_or_buffer = path.join(working_dir, 'original.csv')
+        super(CruiseDataMulti, self).__init__(original_type='csv', cd_aux=False)
+        self.load_file()
+
+    def _set_df(self):
+        parts = self._parse_files()
+        self._merge_parts(parts)
+        self._write_original()
+
+    def load_file(self):
+        lg.info('-- LOAD FILE MULTI >> FROM SCRATCH')
+        self._validate_required_columns()
+        self._set_col_precisions()
+        self._validate_flag_values()
+        self._set_hash_ids()
+        self._set_cps()
+        self._manage_empty_cols()
+        self.save_tmp_data()
+
+    def _parse_files(self):
+        ''' Parses all the files in parallel, the order of the files is kept '''
+        lg.info('-- PARSE FILES')
+        self._report_progress('Reading the files')
+        f_paths = []
+        if path.isdir(self.originals_dir):
+            f_paths = [
+                path.join(self.originals_dir, f) for f in sorted(os.listdir(self.originals_dir))
+                if path.isfile(path.join(self.originals_dir, f))
+            ]
+        if len(f_paths) == 0:
+            raise ValidationError('There are no files to open in the project.', rollback=self.rollback)
+
+        with self._get_executor(len(f_paths)) as executor:
+            parts = list(executor.map(parse_cruise_file, f_paths))
+
+        errors = ['{}: {}'.format(p['file'], p['error']) for p in parts if 'error' in p]
+        if len(errors) > 0:
+            raise ValidationError(
+                'Some files could not be opened. {}'.format(' | '.join(errors)),
+                rollback=self.rollback
+            )
+        return parts
+
+    def _get_executor(self, n_files):
+        ''' The files are parsed in processes because the csv parsing holds the GIL.
+            They are spawned, not forked: this runs in the LoadingTask thread of the bokeh server
+            and a forked process inherits the locks held by the other threads (logging, writer, sqlite).
+            A spawned process imports the data_models package without creating its objects (see init_worker).
+            A single file is parsed in a thread, it is not worth starting a process
+        '''
+        workers = max(min(n_files, os.cpu_count() or 1), 1)
+        if workers == 1:
+            return ThreadPoolExecutor(max_workers=1)
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker
+        )
+
+    def _merge_parts(self, parts):
+        lg.info('-- MERGE PARTS')
+        self._report_progress('Merging the files')
+        dfs = []
+        for p in parts:
+            cruise_id = path.splitext(p['file'])[0]
+            df = p['df']
+            df.insert(0, CRUISE_ID, cruise_id)
+            dfs.append(df)
+            self.moves.append([
+                list(m[:-1]) + ['[{}] {}'.format(p['file'], m[-1])] for m in p['moves']
+            ])
+        self.df = pd.concat(dfs, ignore_index=True, sort=False)
+
+        for p, df in zip(parts, dfs):
+            missing = [c for c in self.df if c not in df]
+            self.add_moves_element(
+                'file_merged',
+                '{} rows of the {} file {} were merged with the {} {}{}'.format(
+                    df.index.size, p['original_type'], p['file'], CRUISE_ID, df[CRUISE_ID].iat[0],
+                    '. The file does not have these columns: {}'.format(', '.join(missing)) if missing else ''
+                )
+            )
+        for c in self.df:
+            if c.endswith(FLAG_END) and self.df[c].isnull().any():  # the param was not in all the files
+                self.df[c] = pd.to_numeric(self.df[c].fillna(9), downcast='integer')
+
+        self.cols = self._merge_cols(parts)
+        self.precisions = {}
+        self.notations = {}
+        for p in parts:
+            for c, v in p['precisions'].items():
+                self.precisions[c] = max(v, self.precisions.get(c, 0))
+            for c, v in p['notations'].items():
+                if v == 'e' or c not in self.notations:
+                    self.notations[c] = v
+
+    def _merge_cols(self, parts):
+        ''' Union of the column catalogs of the files. A column is only 'created'
+            if the app created it in all the files. The units must be the same in all the files
+        '''
+        cols = {
+            CRUISE_ID: {
+                'external_name': [],
+                'attrs': ['non_qc', 'created'],
+                'unit': False,
+                'precision': False,
+                'data_type': 'string',
+                'export': True
+            }
+        }
+        for p in parts:
+            for c, attrs in p['cols'].items():
+                if c not in cols:
+                    cols[c] = deepcopy(attrs)
+                    continue
+                col = cols[c]
+                if attrs['unit'] and col['unit'] and attrs['unit'] != col['unit']:
+                    lg.warning('>> DIFFERENT UNITS IN THE COLUMN {}'.format(c))
+                    self.add_moves_element(
+                        'units_mismatch',
+                        'The column {} has the unit {} in the file {}, the unit {} is kept'.format(
+                            c, attrs['unit'], p['file'], col['unit']
+                        )
+                    )
+                elif not col['unit']:
+                    col['unit'] = attrs['unit']
+                if 'created' in col['attrs'] and 'created' not in attrs['attrs']:
+                    col['attrs'].remove('created')
+                col['attrs'] += [a for a in attrs['attrs'] if a not in col['attrs'] and a != 'created']
+                col['external_name'] += [n for n in attrs['external_name'] if n not in col['external_name']]
+                col['export'] = col.get('export', True) or attrs.get('export', True)
+        return cols
+
+    def _write_original(self):
+        ''' The merged data is the original file of the project from now on '''
+        lg.info('-- WRITE MERGED ORIGINAL FILE')
+        self.df.to_csv(self.filepath_or_buffer, index=False, na_rep='-999')
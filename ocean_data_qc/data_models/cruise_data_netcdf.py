@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.cruise_data import CruiseData
+from ocean_data_qc.data_models.cruise_data_formats import register_format
+from ocean_data_qc.data_models.exceptions import ValidationError
+
+from os import path
+import re
+import numpy as np
+import pandas as pd
+
+try:
+    import netCDF4                              # NetCDF4 (HDF5) and classic files
+except ImportError:
+    netCDF4 = None
+try:
+    from scipy.io import netcdf_file            # only classic files, scipy is installed with oct2py
+except ImportError:
+    netcdf_file = None
+
+
+@register_format('netcdf', priority=30)
+class CruiseDataNetCDF(CruiseData):
+    ''' This class is used to manage the CF/NetCDF bottle files (as the files distributed by CCHDO)
+
+        The variables are read directly as typed arrays:
+            * the profile variables (N_PROF) are repeated for each level of the profile
+            * the level variables (N_PROF, N_LEVELS) are flattened, the empty levels are discarded
+            * the column name is the `whp_name` attribute or the variable name. Then the names
+              are mapped with the external names of custom_settings.json, as the CSV headers
+            * the `<var>_qc` variables are loaded as the flag column of <var>
+            * the time variable is converted to the DATE and TIME columns
+            * the precision is taken from the C_format attribute
+    '''
+    env = CruiseData.env
+    MAGIC_NUMBERS = (b'CDF\x01', b'CDF\x02', b'\x89HDF\r\n\x1a\n')
+    QC_END = '_qc'
+    TIME_UNITS = {'day': 'D', 'hour': 'h', 'minute': 'min', 'second': 's'}
+
+    def __init__(self, working_dir=TMP, cd_aux=False, cd_update=False):
+        lg.info('-- INIT NETCDF')
+        if not cd_update:
+            self.env.cruise_data = self
+        else:
+            self.env.cd_aux = self
+        self.rollback = 'cd' if cd_aux is False else 'cd_update'
+        self.working_dir = working_dir
+        self.filepath_or_buffer = path.join(working_dir, 'original.csv')   # the file is copied with this name
+        self.global_attrs = {}
+        super(CruiseDataNetCDF, self).__init__(original_type='netcdf', cd_aux=cd_aux)
+        self.load_file()
+
+    @classmethod
+    def sniff(cls, head, tail):
+        return head.startswith(cls.MAGIC_NUMBERS)
+
+    def _set_df(self):
+        ''' The variables of the file are loaded as typed columns, no text is parsed '''
+        lg.info('-- SET DF FROM NETCDF')
+        self._report_progress('Reading the file')
+        variables = self._read_variables()
+        prof_dim, level_dim, n_levels = self._get_dimensions(variables)
+
+        data = {}
+        units = {}
+        for name, (values, attrs, dims) in variables.items():
+            if name.endswith(self.QC_END) and name[:-len(self.QC_END)] in variables:
+                continue
+            if dims == (prof_dim, level_dim):
+                values = values.ravel()
+            elif dims == (prof_dim, ):
+                values = np.repeat(values, n_levels)
+            else:
+                lg.warning('>> THE VARIABLE {} WAS DISCARDED, DIMENSIONS: {}'.format(name, dims))
+                continue
+            if self._is_time(attrs) and 'DATE' not in data:
+                data['DATE'], data['TIME'] = self._get_date_time(values, attrs['units'])
+                continue
+            col = self._get_col_name(name, attrs)
+            data[col] = values
+            units[col] = attrs.get('whp_unit', attrs.get('units', 'nan'))
+            self._set_precision(col, values, attrs)
+
+            qc = variables.get(name + self.QC_END)
+            if qc is not None and qc[2] == dims:
+                flags = qc[0].ravel() if len(dims) == 2 else np.repeat(qc[0], n_levels)
+                data[col + FLAG_END] = flags
+                units[col + FLAG_END] = 'nan'
+
+        df = pd.DataFrame(data)
+        df = df[self._get_valid_levels(variables, prof_dim, level_dim)].reset_index(drop=True)
+
+        names, str_cols = self._prep_header(df.columns.tolist())
+        self.precisions = {n: self.precisions[c] for c, n in zip(df.columns, names) if c in self.precisions}
+        self.unit_list = [units.get(c, 'nan') for c in df.columns]
+        df.columns = names
+        for c in names:
+            if c in str_cols:
+                df[c] = self._as_str(df[c])
+            elif c.endswith(FLAG_END):
+                df[c] = pd.to_numeric(df[c].fillna(9), downcast='integer')    # missing flags: no sample
+            elif df[c].dtype.kind == 'f':
+                df[c] = df[c].where(~df[c].isin(NA_VALUES))
+        self.df = df
+        self._save_global_attrs()
+
+    def load_file(self):
+        lg.info('-- LOAD FILE NETCDF >> FROM SCRATCH')
+        self._set_cols_from_scratch()
+        self._validate_required_columns()
+        self._init_basic_params()
+        self._set_col_precisions()
+        self._validate_flag_values()
+        self._set_hash_ids()
+        self._set_cps()
+        self._manage_empty_cols()
+        if not self.cd_aux:
+            self.save_tmp_data()
+
+    def _read_variables(self):
+        ''' Returns {name: (values, attributes, dimensions)} with the masked values as NaN
+            and the char arrays as strings
+        '''
+        variables = {}
+        if netCDF4 is not None:
+            with netCDF4.Dataset(self.filepath_or_buffer, 'r') as ds:
+                self.global_attrs = {k: ds.getncattr(k) for k in ds.ncattrs()}
+                for name, var in ds.variables.items():
+                    attrs = {k: var.getncattr(k) for k in var.ncattrs()}
+                    variables[name] = (self._unmask(var[...]), attrs, tuple(var.dimensions))
+        elif netcdf_file is not None:
+            try:
+                with netcdf_file(self.filepath_or_buffer, 'r', mmap=False, maskandscale=True) as ds:
+                    self.global_attrs = dict(ds._attributes)
+                    for name, var in ds.variables.items():
+                        attrs = {k: self._decode(v) for k, v in var._attributes.items()}
+                        variables[name] = (self._unmask(var[...]), attrs, tuple(var.dimensions))
+            except TypeError:
+                raise ValidationError(
+                    'NetCDF4 (HDF5) files can be opened only if the netCDF4 library is installed.',
+                    rollback=self.rollback
+                )
+        else:
+            raise ValidationError(
+                'The NetCDF file could not be opened, the netCDF4 or scipy library should be installed.',
+                rollback=self.rollback
+            )
+        return variables
+
+    def _unmask(self, values):
+        if isinstance(values, np.ma.MaskedArray):
+            if values.dtype.kind in 'iu' and values.mask.any():
+                values = values.astype(np.float64)
+            values = values.filled(np.nan if values.dtype.kind == 'f' else values.fill_value)
+        values = np.asarray(values)
+        if values.dtype.kind == 'S' and values.dtype.itemsize == 1 and values.ndim > 1:
+            values = np.ascontiguousarray(values).view('S{}'.format(values.shape[-1]))[..., 0]
+        if values.dtype.kind == 'S':
+            values = np.char.strip(np.char.decode(values, 'utf-8', 'replace'))
+        return values
+
+    def _decode(self, value):
+        return value.decode('utf-8', 'replace') if isinstance(value, bytes) else value
+
+    def _get_dimensions(self, variables):
+        ''' The profile and level dimensions are taken from the numeric variable with two dimensions.
+            Returns the tuple (profile dimension, level dimension, number of levels)
+        '''
+        for values, attrs, dims in variables.values():
+            if len(dims) == 2 and values.dtype.kind in 'iuf':
+                return dims[0], dims[1], values.shape[1]
+        raise ValidationError(
+            'The NetCDF file does not have any variable with the dimensions (profile, level).',
+            rollback=self.rollback
+        )
+
+    def _get_valid_levels(self, variables, prof_dim, level_dim):
+        ''' The levels without any value in the level variables are padding of the profiles '''
+        valid = None
+        for values, attrs, dims in variables.values():
+            if dims == (prof_dim, level_dim) and values.dtype.kind == 'f':
+                v = ~np.isnan(values.ravel())
+                valid = v if valid is None else valid | v
+        return slice(None) if valid is None else valid
+
+    def _get_col_name(self, name, attrs):
+        whp_name = attrs.get('whp_name', name)
+        if isinstance(whp_name, (list, np.ndarray)):
+            whp_name = whp_name[0]
+        return str(whp_name).upper()
+
+    def _is_time(self, attrs):
+        return attrs.get('standard_name', '') == 'time' and ' since ' in str(attrs.get('units', ''))
+
+    def _get_date_time(self, values, units):
+        ''' Returns the DATE (YYYYMMDD) and TIME (HHMM) string arrays from the CF time values '''
+        unit, origin = str(units).split(' since ', 1)
+        unit = self.TIME_UNITS.get(unit.strip().lower().rstrip('s'), 'D')
+        dt = pd.Timestamp(origin.strip().rstrip('Z')) + pd.to_timedelta(values, unit=unit)
+        dt = pd.Series(dt)
+        return (
+            dt.dt.strftime('%Y%m%d').where(dt.notnull()).to_numpy(dtype=object),
+            dt.dt.strftime('%H%M').where(dt.notnull()).to_numpy(dtype=object),
+        )
+
+    def _set_precision(self, col, values, attrs):
+        if values.dtype.kind != 'f':
+            return
+        m = re.search(r'\.(\d+)[fFeEgG]', str(attrs.get('C_format', '')))
+        if m is not None:
+            self.precisions[col] = int(m.group(1))
+        else:
+            v = values[~np.isnan(values)]
+            self.precisions[col] = next(
+                (p for p in range(7) if np.allclose(np.round(v, p), v, rtol=1e-9, atol=0.0)), 7
+            )
+
+    def _as_str(self, col):
+        ''' Station numbers and other string columns may be stored as numbers in the file '''
+        if col.dtype.kind in 'iuf':
+            return col.map(lambda v: np.nan if pd.isnull(v) else (str(int(v)) if v == int(v) else str(v)))
+        return col.where((col != '') & col.notnull())
+
+    def _save_global_attrs(self):
+        ''' The global attributes are the metadata of the file, they are exported in the WHP header '''
+        metadata = path.join(self.working_dir, 'metadata')
+        if self.cd_aux or path.isfile(metadata):
+            return
+        with open(metadata, 'w') as f:
+            for k, v in self.global_attrs.items():
+                f.write('{}: {}\n'.format(k, self._decode(v)))
+
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.exceptions import ValidationError
+
+import csv
+import io
+import locale
+import os
+import re
+import numpy as np
+import pandas as pd
+
+
+class CruiseDataReader(object):
+    ''' Streaming reader for the original.csv files (WHP exchange and plain CSV)
+
+        The file is read only once. While the lines are streamed:
+            * the Excel artifacts are trimmed (leading spaces and quotes of the WHP lines, empty rows).
+              The plain CSV stream is parsed by the csv module as it is, so the quoted fields
+              (also the fields with line breaks) are read correctly
+            * the END_DATA trailer and everything after it is discarded (WHP)
+            * the number of fields of each row is checked against the header,
+              all the wrong rows are reported together at the end
+            * the rows are accumulated in chunks and each column chunk is converted
+              to its final type, so the DataFrame is built without any string stage,
+              without rewriting the file or making a temporary copy of it
+            * the maximum number of decimal places of each numeric column is counted
+              on the tokens of each chunk, before they are converted
+            * the byte offset of each data row is recorded, so an original value
+              can be fetched later from the file instead of keeping a string copy
+    '''
+    CHUNK_SIZE = 50000
+    MAX_REPORTED_ROWS = 50
+    NA_STRINGS = frozenset([
+        '', 'NA', 'N/A', 'n/a', 'NaN', 'nan', '-NaN', '-nan', 'NULL', 'null', '#N/A',
+    ])
+
+    def __init__(self, filepath='', original_type='csv', rollback=False, progress=None):
+        self.filepath = filepath
+        self.original_type = original_type      # whp or csv
+        self.rollback = rollback
+        self.progress = progress                # function called with the number of rows read after each chunk
+        self.dialect = None
+        self.header = []
+        self.units = []                         # empty if the file does not have units row
+        self.line_number = 0                    # current line number in the file
+        self.wrong_rows = []                    # [(line_number, n_fields), ...]
+        self.str_pos = set()                    # positions of the string columns
+        self.precisions = {}                    # {column: max number of decimal places}
+        self.notations = {}                     # {column: 'f' or 'e' (scientific notation)}
+        self.row_offsets = None                 # byte offset of each data row in the file
+        self.encoding = locale.getpreferredencoding(False)
+        self.line_offset = 0                    # byte offset of the current line
+        self.row_offset = 0                     # byte offset of the first line of the current row
+        self._new_row = True                    # the next line is the first line of a row
+        self.indexed = False                    # False if the offsets could not be recorded
+        self.stamp = None                       # (mtime_ns, size) of the file when it was read
+
+    def read(self, prep_header=None):
+        ''' Reads the whole file and returns the typed DataFrame
+
+                @prep_header - function that receives the header list and returns the tuple
+                               (column names, string columns). The rest of the columns
+                               are parsed as numbers and the missing values (-999) set to NaN
+        '''
+        lg.info('-- READ ORIGINAL DATA ({})'.format(self.original_type.upper()))
+        with open(self.filepath, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.stamp = (st.st_mtime_ns, st.st_size)
+            rows = self._get_csv_reader(f)
+            self._read_header(rows)
+            names = self._mangle_dupe_cols(self.header)
+            str_cols = []
+            if prep_header is not None:
+                names, str_cols = prep_header(names)
+            self.str_pos = set([pos for pos, n in enumerate(names) if n in str_cols])
+            columns = [[] for c in names]
+            offsets = []
+            n_rows = 0
+            for chunk, chunk_offsets in self._read_chunks(rows):
+                offsets.append(chunk_offsets)
+                for pos, values in enumerate(zip(*chunk)):
+                    columns[pos].append(self._convert_column(pos, values))
+                n_rows += len(chunk)
+                if self.progress is not None:
+                    self.progress(n_rows)
+        self._check_wrong_rows()
+        mixed = [
+            pos for pos in sorted(self.str_pos)
+            if any(c.dtype != object for c in columns[pos])
+        ]
+        if len(mixed) > 0:      # the original text of the numeric chunks is read again
+            for pos, values in self._read_str_columns(mixed).items():
+                columns[pos] = [values]
+        if self.indexed:
+            self.row_offsets = np.concatenate(offsets) if len(offsets) > 0 else np.array([], dtype=np.int64)
+
+        data = {}
+        for pos, chunks in enumerate(columns):
+            if pos in self.str_pos:
+                data[pos] = np.concatenate(chunks) if len(chunks) > 0 else np.array([], dtype=object)
+            else:
+                data[pos] = np.concatenate(chunks) if len(chunks) > 0 else np.array([], dtype=np.float64)
+                data[pos] = pd.to_numeric(data[pos], downcast='integer')  # int8 at least if there are not NaN values
+        df = pd.DataFrame(data)
+        df.columns = names
+        self.precisions = {
+            names[pos]: p for pos, p in self.precisions.items() if pos not in self.str_pos
+        }
+        self.notations = {
+            names[pos]: n for pos, n in self.notations.items() if pos not in self.str_pos
+        }
+        self.names = names
+        return df
+
+    def read_value(self, offset, pos):
+        ''' Returns the string of the field in the position @pos of the row stored at
+            the byte @offset of the file, as it was written there
+        '''
+        with open(self.filepath, 'rb') as f:
+            f.seek(offset)
+            lines = (raw.decode(self.encoding, 'surrogateescape') for raw in f)
+            if self.original_type == 'whp':
+                lines = (self._clean_whp_line(line) for line in lines)
+            row = next(self._make_reader(lines))
+        return row[pos].strip()
+
+    def is_unchanged(self):
+        ''' The file was not rewritten after reading it, so the offsets are still valid '''
+        try:
+            st = os.stat(self.filepath)
+        except OSError:
+            return False
+        return self.stamp == (st.st_mtime_ns, st.st_size)
+
+    def _iter_raw_lines(self, f):
+        ''' Yields the decoded lines of the binary file @f and keeps the offset of each of them.
+            If the file only uses CR as line ending it is split by the text layer, without offsets
+        '''
+        head = f.read(65536)
+        f.seek(0)
+        if b'\r' in head and b'\n' not in head:
+            for line in io.TextIOWrapper(f, self.encoding, 'surrogateescape', newline=''):
+                yield line
+            return
+        self.indexed = True
+        offset = 0
+        for raw in f:
+            self.line_offset = offset
+            offset += len(raw)
+            yield raw.decode(self.encoding, 'surrogateescape')
+
+    def _iter_lines(self, f):
+        ''' Yields the lines of the file. The WHP lines are cleaned of Excel artifacts
+            and the comments, empty lines and the END_DATA trailer are discarded here.
+            The CSV lines are yielded as they are, the rows are checked in _iter_rows
+        '''
+        first_line = True
+        for line in self._iter_raw_lines(f):
+            self.line_number += 1
+            if self.original_type == 'whp':
+                line = self._clean_whp_line(line)
+                if first_line:
+                    first_line = False
+                    if line.startswith('BOTTLE'):
+                        continue
+                if line == '' or line.strip(', \t"') == '':   # rows with only commas are Excel artifacts
+                    continue
+                if line.startswith('#'):
+                    continue
+                if line.startswith('END_DATA'):
+                    break
+            if self._new_row:
+                self._new_row = False
+                self.row_offset = self.line_offset
+            yield line
+
+    def _clean_whp_line(self, line):
+        return line.lstrip(' \t\r\n\x0b\x0c"').rstrip('\r\n')
+
+    def _iter_rows(self, reader):
+        ''' Yields the rows parsed by the csv @reader. The offset of the first line
+            of each row is kept in row_offset. The empty CSV rows are discarded
+        '''
+        while True:
+            self._new_row = True
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            if self.original_type == 'csv':
+                if len(row) == 0 or all(v.strip() == '' for v in row):  # rows with only commas are Excel artifacts
+                    continue
+                if row[0].lstrip().startswith('#'):
+                    raise ValidationError(
+                        'The file should not start with the # character.',
+                        rollback=self.rollback
+                    )
+            yield row
+
+    def _get_csv_reader(self, f):
+        if self.original_type == 'csv':
+            try:
+                sample = f.read(40960).decode(self.encoding, 'surrogateescape')
+                self.dialect = csv.Sniffer().sniff(sample, delimiters=',;')
+            except Exception:
+                self.dialect = None
+            f.seek(0)
+        return self._iter_rows(self._make_reader(self._iter_lines(f)))
+
+    def _make_reader(self, lines):
+        if self.dialect is not None:
+            return csv.reader(lines, self.dialect, quotechar='"')
+        return csv.reader(lines, delimiter=',', quotechar='"')
+
+    def _read_header(self, rows):
+        ''' Reads the header row and the units row if it exists '''
+        try:
+            header = next(rows)
+        except StopIteration:
+            raise ValidationError(
+                'The file does not have any header row.',
+                rollback=self.rollback
+            )
+        header = [h.strip() for h in header]
+        if '' in header:
+            raise ValidationError(
+                'Some header column name is missing: FILE ROW = {} | COL = {}'.format(
+                    self.line_number, header.index('') + 1
+                ),
+                rollback=self.rollback
+            )
+        self.header = header
+        self._first_row = None
+        self._first_offset = 0
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        if self._is_unit_row(row):
+            self.units = [u.strip() if u.strip() != '' else 'nan' for u in row]
+            self._check_row_length(row)
+        else:
+            self._first_row = row
+            self._first_offset = self.row_offset
+
+    def _is_unit_row(self, row):
+        ''' Checks if the row after the header is the units row:
+                * if there is at least one empty cell in the row              > unit row
+                * if all the cells are strings                                > unit row
+                * if there is at least one number (stored as string)          > no unit row
+        '''
+        exp = re.compile(r'^-?\d+?(\.\d+)?$')
+        for u in row:  # the loop continues only if it is a string and not number
+            u = u.strip()
+            if u == '':
+                return True
+            if exp.match(u) is not None or u.isdigit():
+                return False
+        return True
+
+    def _read_chunks(self, rows):
+        ''' Yields lists of CHUNK_SIZE rows at most with the correct number of fields
+            and the array of byte offsets of those rows
+        '''
+        chunk = []
+        offsets = []
+        if self._first_row is not None:
+            if self._check_row_length(self._first_row):
+                chunk.append(self._first_row)
+                offsets.append(self._first_offset)
+            self._first_row = None
+        for row in rows:
+            if self._check_row_length(row):
+                chunk.append(row)
+                offsets.append(self.row_offset)
+                if len(chunk) == self.CHUNK_SIZE:
+                    yield chunk, np.array(offsets, dtype=np.int64)
+                    chunk = []
+                    offsets = []
+        if len(chunk) > 0:
+            yield chunk, np.array(offsets, dtype=np.int64)
+
+    def _check_row_length(self, row):
+        if len(row) != len(self.header):
+            self.wrong_rows.append((self.line_number, len(row)))
+            return False
+        return True
+
+    def _check_wrong_rows(self):
+        if len(self.wrong_rows) > 0:
+            rows = ', '.join([
+                '{} ({} fields)'.format(n, l) for n, l in self.wrong_rows[:self.MAX_REPORTED_ROWS]
+            ])
+            if len(self.wrong_rows) > self.MAX_REPORTED_ROWS:
+                rows += ' and {} more'.format(len(self.wrong_rows) - self.MAX_REPORTED_ROWS)
+            raise ValidationError(
+                'There is an invalid number of fields in {} rows. The number of header columns fields is: {}.'
+                ' File rows: {}'.format(len(self.wrong_rows), len(self.header), rows),
+                rollback=self.rollback
+            )
+
+    def _convert_column(self, pos, values):
+        ''' Converts the tuple of strings of one column chunk to a numpy array.
+            If some value cannot be parsed as a number the column is treated as string from then on
+        '''
+        if pos not in self.str_pos:
+            try:
+                arr, p, sci = self._to_number(values)
+                self.precisions[pos] = max(p, self.precisions.get(pos, 0))
+                if sci or pos not in self.notations:
+                    self.notations[pos] = 'e' if sci else 'f'
+                return arr
+            except ValueError:
+                lg.warning('>> THE COLUMN {} HAS NON NUMERIC VALUES, IT IS LOADED AS STRING'.format(pos + 1))
+                self.str_pos.add(pos)
+        return self._to_string(values)
+
+    def _to_number(self, values):
+        ''' Returns the float array of the chunk, its maximum number of decimal places
+            and whether the scientific notation is used in the chunk
+        '''
+        tokens = np.array(values)
+        if tokens.dtype.itemsize < np.dtype('<U3').itemsize:
+            tokens = tokens.astype('<U3')
+        tokens[np.isin(tokens, list(self.NA_STRINGS))] = 'nan'
+        arr = tokens.astype(np.float64)         # the spaces around the numbers are ignored here
+        arr[np.isin(arr, NA_VALUES)] = np.nan
+        tokens = tokens[~np.isnan(arr)]
+        return arr, self._count_decimals(tokens), self._is_scientific(tokens)
+
+    def _count_decimals(self, tokens):
+        ''' Maximum number of decimal places written in the tokens, trailing zeros included.
+            The exponent of the scientific notation is taken into account: 1.5E-3 > 4
+        '''
+        if tokens.size == 0:
+            return 0
+        parts = np.char.partition(np.char.lower(np.char.strip(tokens)), 'e')
+        mantissa, exponent = parts[:, 0], parts[:, 2]
+        dot = np.char.find(mantissa, '.')
+        decimals = np.where(dot >= 0, np.char.str_len(mantissa) - dot - 1, 0)
+        if np.any(exponent != ''):
+            exponent = np.where(exponent == '', '0', exponent).astype(np.int64)
+            decimals = np.clip(decimals - exponent, 0, None)
+        return int(decimals.max())
+
+    def _is_scientific(self, tokens):
+        if tokens.size == 0:
+            return False
+        return bool(np.any(np.char.find(np.char.lower(tokens), 'e') >= 0))
+
+    def _to_string(self, values):
+        na_regex = re.compile(NA_REGEX)
+        spaces = re.compile(r'\s')
+        arr = np.empty(len(values), dtype=object)
+        for i, v in enumerate(values):
+            v = spaces.sub('', v)
+            arr[i] = np.nan if v in self.NA_STRINGS or na_regex.match(v) else v
+        return arr
+
+    def _read_str_columns(self, positions):
+        ''' Reads the columns in @positions again as strings. They had numeric values in the first chunks
+            and some non numeric value was found later, so they are loaded as they were written in the file
+        '''
+        lg.info('-- READ AGAIN THE COLUMNS WITH NON NUMERIC VALUES: {}'.format([p + 1 for p in positions]))
+        self.line_number = 0
+        self.wrong_rows = []
+        columns = {pos: [] for pos in positions}
+        with open(self.filepath, 'rb') as f:
+            rows = self._get_csv_reader(f)
+            self._read_header(rows)
+            for chunk, chunk_offsets in self._read_chunks(rows):
+                for pos in positions:
+                    columns[pos].append(self._to_string([r[pos] for r in chunk]))
+        return {
+            pos: np.concatenate(chunks) if len(chunks) > 0 else np.array([], dtype=object)
+            for pos, chunks in columns.items()
+        }
+
+    def _mangle_dupe_cols(self, names):
+        ''' Renames the repeated columns as pandas does: X, X.1, X.2 '''
+        counts = {}
+        result = []
+        for n in names:
+            if n in counts:
+                counts[n] += 1
+                result.append('{}.{}'.format(n, counts[n]))
+            else:
+                counts[n] = 0
+                result.append(n)
+        return result
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.cruise_data_stats import ColumnStats
+
+from os import path
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+class CruiseDataSnapshot(object):
+    ''' Typed columnar copy of the project data, stored next to data.csv in the snapshot folder.
+        Each column is saved in its own .npy file, also the HASH_ID index. The manifest.json file keeps
+        the column order, the float precisions, the stats of each column (ColumnStats)
+        and the hashes that invalidate the snapshot:
+
+            * the content hash of original.csv
+            * the hash of the computed parameters definitions
+            * the size and modification time of data.csv, written at the same time
+
+        On reopen the numeric columns are memory-mapped in copy-on-write mode, so the
+        data is not parsed again and the pages are only read from disk when they are used.
+        The stats are taken from the manifest for the same reason (get_stats).
+
+        NOTE: the files of each save have a new name (generation number) and the old ones are
+              removed afterwards, a mapped file cannot be overwritten on Windows
+    '''
+    VERSION = 3
+
+    def __init__(self, working_dir=TMP):
+        self.working_dir = working_dir
+        self.snapshot_dir = path.join(working_dir, 'snapshot')
+        self.manifest_path = path.join(self.snapshot_dir, 'manifest.json')
+        self.manifest = None
+        self._original_hash = (None, None)  # (stat, hash) of original.csv
+
+    def load(self, cps=[]):
+        ''' Returns the DataFrame stored in the snapshot with the HASH_ID index
+            or None if the snapshot does not exist or it is outdated
+        '''
+        lg.info('-- LOAD SNAPSHOT')
+        manifest = self._read_manifest()
+        if manifest is None:
+            return None
+        if manifest.get('version') != self.VERSION:
+            lg.warning('>> THE SNAPSHOT VERSION IS OUTDATED')
+            return None
+        if manifest.get('original_hash') != self._get_original_hash():
+            lg.warning('>> THE ORIGINAL FILE CHANGED, THE SNAPSHOT IS DISCARDED')
+            return None
+        if manifest.get('cps_hash') != self._get_cps_hash(cps):
+            lg.warning('>> THE COMPUTED PARAMETERS CHANGED, THE SNAPSHOT IS DISCARDED')
+            return None
+        if manifest.get('data_stat') != self._get_data_stat():
+            lg.warning('>> THE data.csv FILE WAS SAVED OUTSIDE THE SNAPSHOT, IT IS DISCARDED')
+            return None
+        try:
+            index = self._load_array(manifest['index'])
+            data = {}
+            for c in manifest['columns']:
+                data[c['name']] = self._load_array(c)
+        except Exception as e:
+            lg.warning('>> THE SNAPSHOT COULD NOT BE LOADED: {}'.format(e))
+            return None
+        self.manifest = manifest
+        return pd.DataFrame(data, index=pd.Index(index, name=manifest['index']['name']), copy=False)
+
+    def save(self, df, precisions={}, notations={}, cps=[], columns=None):
+        ''' Saves the DataFrame @df in the snapshot folder.
+            If @columns is set, only those columns are written again if the rest
+            of the snapshot is still the same (flag edition for instance)
+        '''
+        lg.info('-- SAVE SNAPSHOT')
+        if not path.isdir(self.snapshot_dir):
+            os.makedirs(self.snapshot_dir)
+        manifest = self.manifest if self.manifest is not None else self._read_manifest()
+        cols = [c for c in df.columns if c != 'AUX']
+        partial = (
+            columns is not None and manifest is not None
+            and manifest.get('version') == self.VERSION
+            and manifest.get('n_rows') == df.index.size
+            and [c['name'] for c in manifest['columns']] == cols
+        )
+        gen = manifest.get('generation', 0) + 1 if manifest is not None else 1
+        if partial:
+            entries = {c['name']: c for c in manifest['columns']}
+            index_entry = manifest['index']
+        else:
+            entries = {}
+            index_entry = self._save_array(df.index.to_numpy(), f'{gen}_index.npy')
+            index_entry['name'] = df.index.name
+            columns = cols
+        stats = ColumnStats.compute_stats(df, columns)
+        for c in columns:
+            if c in cols:
+                entries[c] = self._save_array(df[c].to_numpy(), f'{gen}_{cols.index(c)}.npy')
+                entries[c]['name'] = c
+                entries[c]['stats'] = ColumnStats.to_json(stats[c])
+
+        self.manifest = {
+            'version': self.VERSION,
+            'generation': gen,
+            'n_rows': df.index.size,
+            'index': index_entry,
+            'columns': [entries[c] for c in cols],
+            'precisions': precisions,
+            'notations': notations,
+            'original_hash': self._get_original_hash(),
+            'cps_hash': self._get_cps_hash(cps),
+            'data_stat': self._get_data_stat(),
+        }
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self._remove_unused_files()
+
+    def get_stats(self):
+        ''' Returns {column: stats} stored in the manifest of the loaded snapshot '''
+        if self.manifest is None:
+            return {}
+        return {c['name']: c['stats'] for c in self.manifest['columns'] if 'stats' in c}
+
+    def remove(self):
+        self.manifest = None
+        if path.isfile(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def _save_array(self, values, file_name):
+        ''' The numeric arrays are saved directly. The strings are stored as unicode arrays
+            with empty strings instead of NaN values, the reader never keeps empty strings
+        '''
+        if values.dtype.kind in 'biuf':
+            kind = 'num'
+        else:
+            kind = 'str'
+            values = np.array(['' if pd.isnull(v) else str(v) for v in values], dtype=str)
+        np.save(path.join(self.snapshot_dir, file_name), values, allow_pickle=False)
+        return {'file': file_name, 'kind': kind}
+
+    def _load_array(self, entry):
+        f_path = path.join(self.snapshot_dir, entry['file'])
+        if entry['kind'] == 'num':
+            return np.load(f_path, mmap_mode='c', allow_pickle=False)
+        values = np.load(f_path, allow_pickle=False).astype(object)
+        values[values == ''] = np.nan
+        return values
+
+    def _read_manifest(self):
+        if not path.isfile(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            lg.warning('>> THE SNAPSHOT MANIFEST COULD NOT BE READ')
+            return None
+
+    def _remove_unused_files(self):
+        used = [self.manifest['index']['file']] + [c['file'] for c in self.manifest['columns']]
+        for f in os.listdir(self.snapshot_dir):
+            if f.endswith('.npy') and f not in used:
+                try:
+                    os.remove(path.join(self.snapshot_dir, f))
+                except OSError:   # still mapped, it is removed in the next save
+                    pass
+
+    def _get_original_hash(self):
+        ''' Content hash of original.csv, computed only once while the file is not modified '''
+        f_path = path.join(self.working_dir, 'original.csv')
+        if not path.isfile(f_path):
+            return None
+        st = os.stat(f_path)
+        stat = [st.st_size, st.st_mtime_ns]
+        if self._original_hash[0] != stat:
+            h = hashlib.sha1()
+            with open(f_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            self._original_hash = (stat, h.hexdigest())
+        return self._original_hash[1]
+
+    def _get_cps_hash(self, cps):
+        return hashlib.sha1(json.dumps(cps, sort_keys=True).encode()).hexdigest()
+
+    def _get_data_stat(self):
+        f_path = path.join(self.working_dir, 'data.csv')
+        if not path.isfile(f_path):
+            return None
+        st = os.stat(f_path)
+        return [st.st_size, st.st_mtime_ns]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.constants import *
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnStats(object):
+    ''' Catalog with the statistics of the columns of a cruise data object:
+
+            * n_rows, n_null        - number of rows and number of NaN values
+            * min, max              - only for the numeric columns
+            * flag_counts           - number of rows with each flag value [0-9], only for the flag columns
+            * percentiles           - PERCENTILES of the values, computed on demand and cached
+
+        The stats of all the columns are computed at once when the file is loaded. When the project
+        is reopened from the snapshot they are taken from its manifest, so the memory-mapped columns
+        are not read. Then they are updated incrementally: the flag edits only move the counts of
+        the edited rows and the columns that are written again (computed parameters for instance)
+        are invalidated, so they are computed on the next lookup
+    '''
+    PERCENTILES = [1, 5, 25, 50, 75, 95, 99]
+    N_FLAGS = 10
+
+    def __init__(self, cruise_data):
+        self.cruise_data = cruise_data
+        self.stats = {}
+        self.percentiles = {}
+
+    def compute(self, columns=None):
+        ''' Computes the stats of the @columns, all the columns by default '''
+        stats = self.compute_stats(self.cruise_data.df, columns)
+        self.stats.update(stats)
+        for c in stats:
+            self.percentiles.pop(c, None)
+
+    def compute_missing(self):
+        ''' Computes at once the stats of the columns that are not in the catalog.
+            The ones loaded from the snapshot are kept
+        '''
+        self.compute([c for c in self.cruise_data.df.columns if c not in self.stats])
+
+    def load(self, stats):
+        ''' Adds the @stats stored in the snapshot manifest, see to_json '''
+        for c, s in stats.items():
+            s = dict(s)
+            if s['flag_counts'] is not None:
+                s['flag_counts'] = np.array(s['flag_counts'], dtype=np.int64)
+            self.stats[c] = s
+            self.percentiles.pop(c, None)
+
+    @classmethod
+    def compute_stats(cls, df, columns=None):
+        ''' Returns {column: stats} of the @columns of @df, all the columns by default.
+            The null counts, minimums and maximums are computed for the whole block of columns
+        '''
+        columns = df.columns.tolist() if columns is None else [c for c in columns if c in df]
+        if len(columns) == 0:
+            return {}
+        n_rows = df.index.size
+        n_null = df[columns].isnull().sum()
+        numeric = [c for c in columns if pd.api.types.is_numeric_dtype(df[c])]
+        mins = df[numeric].min()
+        maxs = df[numeric].max()
+        return {
+            c: {
+                'n_rows': n_rows,
+                'n_null': int(n_null[c]),
+                'min': cls._scalar(mins[c]) if c in numeric else None,
+                'max': cls._scalar(maxs[c]) if c in numeric else None,
+                'flag_counts': cls._count_flags(df[c]) if c in numeric and c.endswith(FLAG_END) else None,
+            }
+            for c in columns
+        }
+
+    @staticmethod
+    def to_json(stats):
+        ''' The @stats of one column, to be stored in the snapshot manifest '''
+        s = dict(stats)
+        if s['flag_counts'] is not None:
+            s['flag_counts'] = s['flag_counts'].tolist()
+        return s
+
+    def invalidate(self, columns):
+        ''' The stats of the @columns are computed again on the next lookup '''
+        if isinstance(columns, str):
+            columns = [columns]
+        for c in columns:
+            self.stats.pop(c, None)
+            self.percentiles.pop(c, None)
+
+    def reset(self):
+        self.stats = {}
+        self.percentiles = {}
+
+    def get(self, column):
+        s = self.stats.get(column)
+        if s is not None and s['n_rows'] != self.cruise_data.df.index.size:   # rows were added or removed
+            self.reset()
+            s = None
+        if s is None:
+            self.compute([column])
+            s = self.stats[column]
+        return s
+
+    def is_empty(self, column):
+        ''' All the values are NaN (the -999 values are NaN as well) '''
+        s = self.get(column)
+        return s['n_null'] == s['n_rows']
+
+    def all_equal(self, column, value):
+        ''' All the rows have the @value, the flag columns with 9 in all the rows for instance '''
+        s = self.get(column)
+        if s['flag_counts'] is not None and 0 <= value < self.N_FLAGS:
+            return int(s['flag_counts'][value]) == s['n_rows']
+        return s['n_null'] == 0 and s['min'] == value and s['max'] == value
+
+    def get_flag_counts(self, column):
+        ''' Returns {flag value: number of rows} of the flag @column '''
+        counts = self.get(column)['flag_counts']
+        if counts is None:
+            return {}
+        return {v: int(n) for v, n in enumerate(counts) if n > 0}
+
+    def get_percentiles(self, column):
+        ''' Returns {percentile: value} of the numeric @column or None if it is not numeric or it is empty '''
+        if column not in self.percentiles:
+            s = self.get(column)
+            values = None
+            if s['min'] is not None and s['n_null'] < s['n_rows']:
+                values = self.cruise_data.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+                values = dict(zip(self.PERCENTILES, np.nanpercentile(values, self.PERCENTILES).tolist()))
+            self.percentiles[column] = values
+        return self.percentiles[column]
+
+    def update_flags(self, column, old_values, new_value):
+        ''' The rows with the @old_values of the flag @column were set to @new_value.
+            Only the counts of the edited rows are updated
+        '''
+        s = self.stats.get(column)
+        if s is None or s['flag_counts'] is None or s['n_rows'] != self.cruise_data.df.index.size:
+            self.invalidate(column)
+            return
+        old_values = np.asarray(old_values, dtype=np.float64)
+        valid = ~np.isnan(old_values)
+        s['n_null'] -= int((~valid).sum())
+        s['flag_counts'] = s['flag_counts'] - self._bincount(old_values[valid])
+        if 0 <= new_value < self.N_FLAGS:
+            s['flag_counts'][int(new_value)] += old_values.size
+        else:   # out of the flag range, this should not happen
+            self.invalidate(column)
+            return
+        present = np.flatnonzero(s['flag_counts'])
+        s['min'] = int(present[0]) if present.size > 0 else None
+        s['max'] = int(present[-1]) if present.size > 0 else None
+        self.percentiles.pop(column, None)
+
+    @classmethod
+    def _count_flags(cls, col):
+        values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        return cls._bincount(values[~np.isnan(values)])
+
+    @classmethod
+    def _bincount(cls, values):
+        values = values[(values >= 0) & (values < cls.N_FLAGS)].astype(np.int64)
+        return np.bincount(values, minlength=cls.N_FLAGS)
+
+    @staticmethod
+    def _scalar(value):
+        return None if pd.isnull(value) else value.item() if hasattr(value, 'item') else value
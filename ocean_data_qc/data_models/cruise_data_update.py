@@ -58,6 +58,9 @@ class CruiseDataUpdate(Environment):
         # VALUES
         self.diff_val_qty = 0
         self.diff_val_pairs = []
+
+        # {column: set of HASH_IDs of the modified rows, or None if all of them}, to recompute only the affected CPs
+        self.dirty = {}
         self._compute_comparison()
 
     def _compute_comparison(self):
@@ -116,16 +119,15 @@ class CruiseDataUpdate(Environment):
 
     def _compute_rows_comparison(self):
         lg.info('-- COMPUTE ROWS COMPARISON')
-        new_hash_id_list = self.env.cd_aux.df.index.tolist()
-        old_has_id_list = self.env.cruise_data.df.index.tolist()
+        new_keys = self.env.cd_aux.row_keys
+        old_keys = self.env.cruise_data.row_keys
 
-        # a frozenset is more efficient than a list or than a simple set
-        difference_list = frozenset(old_has_id_list).difference(new_hash_id_list)
+        difference_list = old_keys.difference(new_keys)
         self.rmv_rows = len(difference_list)
         self.rmv_rows_hash_list = difference_list
         lg.info('>> REMOVED ROWS: {}'.format(len(difference_list)))
 
-        reverse_difference_list = frozenset(new_hash_id_list).difference(old_has_id_list)
+        reverse_difference_list = new_keys.difference(old_keys)
         self.add_rows = len(reverse_difference_list)
         self.add_rows_hash_list = reverse_difference_list
         lg.info('>> NEW ROWS: {}'.format(len(reverse_difference_list)))
@@ -144,16 +146,12 @@ class CruiseDataUpdate(Environment):
             )
         )
 
-        new_hash_id_list = self.env.cd_aux.df.index.tolist()
-        old_has_id_list = self.env.cruise_data.df.index.tolist()
-        hash_ids_rows = list(frozenset(old_has_id_list).intersection(new_hash_id_list))
+        hash_ids_rows = self.env.cruise_data.row_keys.intersection(self.env.cd_aux.row_keys)
 
         for hash_id in hash_ids_rows:
             for column in columns:
                 new_scalar = self.env.cd_aux.df.loc[hash_id, column]
                 old_scalar = self.env.cruise_data.df.loc[hash_id, column]
-                # TODO: make it with strings self.env.cruise_data.df_str == self.env.cruise_data.df_str
-                #       how to calculate the hash ids?
 
                 # and if they are new_scalar = 'str' and old_scalar = NaN ?????
                 nan_different = False
@@ -176,11 +174,11 @@ class CruiseDataUpdate(Environment):
 
                         # the column flag has to be reset by default
                         # unless the whole flag column was added or the flag cell was modified
-                        if column in self.env.cruise_data.get_cols_by_attrs(['param']):
+                        if self.env.cruise_data.cols.has_attr(column, 'param'):
                             flag_column = column + FLAG_END
-                            if flag_column in self.env.cruise_data.get_cols_by_attrs(['flag']):
+                            if self.env.cruise_data.cols.has_attr(flag_column, 'flag'):
                                 if (hash_id, flag_column) not in self.diff_val_pairs:
-                                    if flag_column in self.env.cd_aux.get_cols_by_attrs('flag'):
+                                    if self.env.cd_aux.cols.has_attr(flag_column, 'flag'):
                                         if flag_column not in self.add_cols:
                                             if self.env.cd_aux.df.loc[hash_id, flag_column] != RESET_FLAG_VALUE:
                                                 self.diff_val_qty += 1
@@ -284,6 +282,12 @@ class CruiseDataUpdate(Environment):
                 elif aux['old_flag_value'] != aux['new_flag_value']:
                     changed = 'flag'
 
+                # the values are shown as they are written in the files
+                if aux['old_param_value'] is not False:
+                    aux['old_param_value'] = self._get_value_text(self.env.cruise_data, hash_id, param)
+                if aux['new_param_value'] is not False:
+                    aux['new_param_value'] = self._get_value_text(self.env.cd_aux, hash_id, param)
+
                 aux.update({
                     'hash_id': hash_id,
                     'castno': str(self.env.cruise_data.df.loc[hash_id, 'CASTNO']),
@@ -303,6 +307,14 @@ class CruiseDataUpdate(Environment):
         lg.info('>> DIFF VALUES JSON STRING: {}'.format(self.diff_values))
         return self.diff_values
 
+    def _get_value_text(self, cruise_data, hash_id, column):
+        """ The value as it is written in the original file, or formatted
+            with the precision of the column if the file rows are not indexed """
+        value = cruise_data.get_original_value(hash_id, column)
+        if value is None:
+            value = cruise_data.format_value(column, cruise_data.df.loc[hash_id, column])
+        return value
+
     def discard_changes(self):
         """ aux folder is removed file is removed """
         self.env.cd_update = None
@@ -340,8 +352,7 @@ class CruiseDataUpdate(Environment):
                 diff_val_qty=params['diff_val_qty'],
                 diff_values=diff_values
             )
-
-        self.env.cruise_data._replace_nan_values()     # -999 >> NaN
+            self.env.cruise_data.stats.reset()  # rows, columns and values were updated
 
         self._update_moves()
         self.env.cruise_data.save_tmp_data()
@@ -361,12 +372,14 @@ class CruiseDataUpdate(Environment):
                 cd_flag_columns = self.env.cruise_data.get_cols_by_attrs(['flag'])
                 flag_cols = [col for col in cd_flag_columns if col not in cd_aux_flag_columns]
                 self.env.cruise_data.df.loc[hash_id, flag_cols] = 9
+                self._mark_dirty(columns + flag_cols, [hash_id])
 
             lg.info('>> Rows added: {}'.format(list(self.add_rows_hash_list)))
 
         if rmv_rows_checked is True and self.rmv_rows_hash_list != []:
             for hash_id in self.rmv_rows_hash_list:
                 self.env.cruise_data.df = self.env.cruise_data.df.drop(hash_id)  # assignation needed
+            self._mark_dirty(self.env.cruise_data.df.columns.tolist(), [])     # the profiles changed
             lg.info('>> Rows removed: {}'.format(list(self.rmv_rows_hash_list)))
 
     def _update_columns(self, add_cols_checked=False, rmv_cols_checked=False):
@@ -387,6 +400,7 @@ class CruiseDataUpdate(Environment):
                     else:
                         self.env.cruise_data.df[column] = self.env.cruise_data.df.index.size * [np.nan]
                     self.env.cruise_data._add_column(column)  # if the column is a flag column is already marked inside
+                    self._mark_dirty([column])
 
                     for i in self.env.cruise_data.df.index.tolist():  # copy all the cell elements one by one
                         if i in self.env.cd_aux.df.index:
@@ -411,12 +425,14 @@ class CruiseDataUpdate(Environment):
                         # lg.warning('>> REMOVING PARAM: {}'.format(column))
                         del self.env.cruise_data.cols[column]
                         del self.env.cruise_data.df[column]
+                        self._mark_dirty([column])
 
                     # TODO: RESET FLAG TO DEFAULT VALUES INSTEAD OF REMOVING THEM
                     if column in self.env.cruise_data.get_cols_by_attrs(['flag']):
                         # lg.warning('>> REMOVING FLAG: {}'.format(column))
                         del self.env.cruise_data.cols[column]
                         del self.env.cruise_data.df[column]
+                        self._mark_dirty([column])
 
                         # NOTE: if the associated param exists, when self.env.cruise_data is reloaded again
                         #       the flag column should be created???
@@ -440,6 +456,7 @@ class CruiseDataUpdate(Environment):
         if diff_val_qty is True:  # update all the values
             for hash_id, column in self.diff_val_pairs:
                 self.env.cruise_data.df.loc[hash_id, column] = self.env.cd_aux.df.loc[hash_id, column]
+                self._mark_dirty([column], [hash_id])
         else:
             if diff_values != {} and diff_values is not False:
                 for param in diff_values:
@@ -448,9 +465,27 @@ class CruiseDataUpdate(Environment):
                             lg.info('>> STT ELEM: {}'.format(elem))
                             if elem['param_checked'] is True:
                                 self.env.cruise_data.df.loc[elem['hash_id'], param] = self.env.cd_aux.df.loc[elem['hash_id'], param]
+                                self._mark_dirty([param], [elem['hash_id']])
                             if elem['flag_checked'] is True:
                                 flag = param + '_FLAG_W'
                                 self.env.cruise_data.df.loc[elem['hash_id'], flag] = self.env.cd_aux.df.loc[elem['hash_id'], flag]
+                                self._mark_dirty([flag], [elem['hash_id']])
+
+    def _mark_dirty(self, columns, hash_ids=None):
+        """ The rows @hash_ids of the @columns were modified, all the rows if it is None.
+            An empty list means that some rows were removed """
+        for c in columns:
+            if hash_ids is None or self.dirty.get(c, False) is None:
+                self.dirty[c] = None
+            else:
+                self.dirty.setdefault(c, set()).update(hash_ids)
+
+    def _get_dirty(self):
+        """ The sets of HASH_IDs are converted to pd.Index, as compute_cps needs them """
+        return {
+            c: None if hash_ids is None else pd.Index(list(hash_ids))
+            for c, hash_ids in self.dirty.items()
+        }
 
     def _update_moves(self):
         """ The log of actions is updated with the new operations """
@@ -488,7 +523,7 @@ class CruiseDataUpdate(Environment):
         for c in self.env.cruise_data.get_cols_by_attrs('param'):
             self.env.cruise_data.create_missing_flag_col(c)
         self.env.cruise_data.cp_param = ComputedParameter()
-        self.env.cruise_data.recompute_cps()
+        self.env.cruise_data.recompute_cps(dirty=self._get_dirty())
         if self.modified is True:
             if path.isfile(path.join(TMP, 'original.old.csv')):
                 os.remove(path.join(TMP, 'original.old.csv'))  # previous old file stored as history
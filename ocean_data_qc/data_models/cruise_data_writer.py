@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.env import Environment
+from ocean_data_qc.constants import *
+
+from functools import partial
+from os import path
+import atexit
+import os
+import threading
+import time
+
+
+class CruiseDataWriter(Environment):
+    ''' Write-behind persistence of the project files: data.csv, the moves database and the snapshot.
+        The flag edits are not written here, they are appended to the journal (CruiseDataJournal)
+        and only the new moves are inserted. data.csv and the snapshot are written when the journal is compacted.
+
+            * save_tmp_data marks the cruise data as modified, the files are written later in a
+              worker thread, when there are no more changes during DELAY seconds (or every MAX_DELAY
+              seconds while the user keeps editing). Many flag edits are written only once
+            * the data is copied in the thread of the bokeh document, where it is modified,
+              and the copies are written in the worker thread, so the document is not blocked.
+              Only the modified columns are copied there (see _copy_df), the rest of the columns
+              are shared and they are only read in the worker thread
+            * the files are written in a temporary file and replaced with os.replace, so a file
+              is never half written
+            * the PENDING_WRITES file exists while there are changes that were not written yet,
+              Electron waits until it is removed before zipping the project files
+
+        If the data is saved from other thread (the LoadingTask for instance) the files are written
+        immediately in that thread, because that thread is the owner of the data in that moment.
+        flush() does the same, it is called before the exports and when the application is closed
+    '''
+    env = Environment
+    DELAY = 0.5                 # seconds without changes before writing the files
+    MAX_DELAY = 5.0             # seconds, the files are written at least this often
+    CAPTURE_TIMEOUT = 30.0      # seconds waiting for the document to copy the data
+
+    def __init__(self):
+        self.env.cd_writer = self
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()     # the files are written by one thread at once
+        self._pending = None                    # changes that were not written yet
+        self._gen = 0                           # generation of the last change
+        self._thread = None
+        atexit.register(self.flush)
+
+    def mark_dirty(self, cruise_data, columns=None, data=True):
+        ''' The @columns of the @cruise_data were modified, all of them if it is None.
+            The new moves are always inserted, data.csv and the snapshot are written only if @data is True
+            (the flag edits are in the journal)
+        '''
+        with self._cond:
+            now = time.monotonic()
+            p = self._pending
+            if p is None or p['cruise_data'] is not cruise_data:
+                p = self._pending = {
+                    'cruise_data': cruise_data,
+                    'data': False,
+                    'columns': set(),
+                    'all': False,
+                    'first': now,
+                }
+                self._touch_marker()
+            if data:
+                p['data'] = True
+                if columns is None:
+                    p['all'] = True
+                else:
+                    p['columns'].update(columns)
+            p['last'] = now
+            self._gen += 1
+            p['gen'] = self._gen
+            if self._in_doc_thread():
+                self._start()
+                self._cond.notify_all()
+                return
+        self.flush()
+
+    def flush(self):
+        ''' Writes the pending changes in the current thread, or waits if they are being written.
+            It must be called from the thread that modifies the data (the bokeh document thread)
+        '''
+        if threading.current_thread() is self._thread:
+            return
+        with self._write_lock:
+            job = self._capture(copy=False)
+            self._write(job)
+        if job is not None and job['data'] and job['columns'] is None:
+            self._attach_snapshot(job)
+        self._remove_marker()
+
+    def discard(self):
+        ''' The project is closed, the pending changes are not written '''
+        with self._cond:
+            self._pending = None
+        with self._write_lock:      # waits for the files that are being written
+            pass
+        self._remove_marker()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='cruise_data_writer', daemon=True)
+            self._thread.start()
+
+    def _in_doc_thread(self):
+        bridge = self.env.bk_bridge
+        return (
+            self.env.doc is not None and bridge is not None
+            and getattr(bridge, 'doc_thread', None) is not None and bridge._in_doc_thread()
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                timeout = self._get_timeout()
+                while timeout != 0:
+                    self._cond.wait(timeout)
+                    timeout = self._get_timeout()
+            captured, job = self._capture_in_doc()     # the write lock is acquired there
+            if not captured:
+                # the document did not run the callback (the session was closed). The changes are kept
+                # pending, they are written by the next thread started by mark_dirty or by flush()
+                lg.warning('>> THE DOCUMENT DID NOT COPY THE CRUISE DATA, THE WRITER THREAD IS STOPPED')
+                with self._cond:
+                    if self._thread is threading.current_thread():
+                        self._thread = None
+                return
+            try:
+                self._write(job)
+            finally:
+                self._write_lock.release()
+            if job is not None and job['data'] and job['columns'] is None:
+                self.env.doc.add_next_tick_callback(partial(self._attach_snapshot, job))
+            self._remove_marker()
+
+    def _get_timeout(self):
+        ''' Seconds to wait until the pending changes should be written, None if there are no changes '''
+        p = self._pending
+        if p is None:
+            return None
+        now = time.monotonic()
+        return max(min(p['last'] + self.DELAY, p['first'] + self.MAX_DELAY) - now, 0)
+
+    def _capture_in_doc(self):
+        ''' The data is copied in the next tick of the document, the worker waits meanwhile.
+            The write lock is acquired before the copy, so the files are always written
+            in the same order the data was copied, also if flush() is called in the meantime.
+
+            Returns (captured, job). If the callback does not run in CAPTURE_TIMEOUT seconds it is
+            cancelled, captured is False and the pending changes are not taken
+        '''
+        done = threading.Event()
+        lock = threading.Lock()
+        res = {'cancelled': False}
+
+        def capture():
+            with lock:
+                if res['cancelled']:
+                    return
+                self._write_lock.acquire()
+                try:
+                    res['job'] = self._capture(copy=True)
+                finally:
+                    done.set()
+
+        doc = self.env.doc
+        if doc is None:
+            return False, None
+        try:
+            doc.add_next_tick_callback(capture)
+        except Exception:
+            lg.exception('>> THE CAPTURE CALLBACK COULD NOT BE ADDED TO THE DOCUMENT')
+            return False, None
+        if not done.wait(self.CAPTURE_TIMEOUT):
+            with lock:
+                if not done.is_set():
+                    res['cancelled'] = True
+                    return False, None
+        return True, res.get('job')
+
+    def _capture(self, copy=True):
+        ''' Takes the pending changes. The data is copied if it is going to be written in other thread '''
+        with self._cond:
+            p, self._pending = self._pending, None
+        if p is None:
+            return None
+        cd = p['cruise_data']
+        if cd is not self.env.cruise_data:      # the project was closed or the loading was cancelled
+            lg.warning('>> THE CHANGES OF A CLOSED PROJECT WERE DISCARDED')
+            return None
+        columns = p['columns']
+        journal_offset = 0
+        if p['data'] and cd.journal is not None:    # the edits of the journal are written in data.csv as well
+            columns = columns | cd.journal.columns
+            journal_offset = cd.journal.size
+        return {
+            'gen': p['gen'],
+            'cruise_data': cd,
+            'data': p['data'],
+            'source_df': cd.df,
+            'df': (self._copy_df(cd.df, None if p['all'] else columns) if copy else cd.df) if p['data'] else None,
+            'columns': None if p['all'] else sorted(columns),
+            'journal_offset': journal_offset,
+        }
+
+    def _copy_df(self, df, columns):
+        ''' Copy of @df to write it in the worker thread. The frame is copied without the data
+            and only the modified @columns (all of them if it is None) get their own copy of the values.
+            The other columns did not change since the last write. If they are modified
+            in the meantime they are marked as dirty and written again in the next round
+        '''
+        if columns is None:
+            return df.copy(deep=True)
+        df_copy = df.copy(deep=False)
+        for c in columns:
+            if c in df_copy.columns:
+                df_copy[c] = df[c].copy(deep=True)
+        return df_copy
+
+    def _write(self, job):
+        ''' The write lock should be acquired by the caller '''
+        if job is None:
+            return
+        lg.info('-- WRITE CRUISE DATA FILES')
+        cd = job['cruise_data']
+        try:
+            cd.moves.flush()
+            if job['data']:
+                cd.save_csv_data(df=job['df'])
+                cd.save_snapshot(columns=job['columns'], df=job['df'], attach=False)
+                if cd.journal is not None:
+                    cd.journal.discard_head(job['journal_offset'])
+        except Exception:
+            lg.exception('>> THE CRUISE DATA FILES COULD NOT BE WRITTEN')
+
+    def _attach_snapshot(self, job):
+        ''' The DF is attached to the snapshot after a complete save,
+            only if it was not modified after the copy
+        '''
+        cd = job['cruise_data']
+        if cd is self.env.cruise_data and cd.df is job['source_df'] and self._gen == job['gen']:
+            cd.attach_snapshot()
+
+    def _touch_marker(self):
+        if path.isdir(TMP):
+            open(PENDING_WRITES, 'w').close()
+
+    def _remove_marker(self):
+        with self._cond:
+            if self._pending is None and path.isfile(PENDING_WRITES):
+                os.remove(PENDING_WRITES)
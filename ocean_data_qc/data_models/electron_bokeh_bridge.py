@@ -6,6 +6,7 @@
 
 from bokeh.util.logconfig import bokeh_logger as lg
 from ocean_data_qc.data_models.exceptions import ValidationError
+from ocean_data_qc.data_models.loading_task import LoadingTask
 from bokeh.io import curdoc
 from bokeh.plotting import figure
 from bokeh.models.sources import ColumnDataSource
@@ -17,6 +18,8 @@ from ocean_data_qc.constants import *
 import json
 import os
 from os import path
+from functools import partial
+import threading
 import traceback
 import hashlib
 
@@ -95,6 +98,7 @@ class ElectronBokehBridge(Environment):
         self.env.bridge_row.css_classes = ['bridge_row']
 
         self.env.doc = curdoc()
+        self.doc_thread = threading.get_ident()    # the bokeh models can only be modified from this thread
         self.env.doc.template = BokehTemplate(open(BOKEH_TEMPLATE).read())
         self.env.doc.add_root(self.env.bridge_row)
 
@@ -104,7 +108,8 @@ class ElectronBokehBridge(Environment):
             @message = {
                 'object': '',
                 'method': '',
-                'args': {}
+                'args': {},
+                'no_response': False    # optional, True if JS is not waiting for the response
             }
         """
         lg.info('-- PYTHON RESPONSE')
@@ -128,6 +133,8 @@ class ElectronBokehBridge(Environment):
         # TODO: try to return the object directly with eval, instead of creating an elif for each model
         if obj == 'cruise.data':
             method = getattr(self.env.cruise_data, method_str)
+        elif obj == 'cruise.data.moves':
+            method = getattr(self.env.cruise_data.moves, method_str)
         elif obj == 'cruise.data.handler':
             method = getattr(self.env.cd_handler, method_str)
         elif obj == 'bokeh.loader':
@@ -138,11 +145,20 @@ class ElectronBokehBridge(Environment):
             method = getattr(self.env.f_handler, method_str)
         elif obj == 'bokeh.plots.handler':
             method = getattr(self.env.bk_plots_handler, method_str)
+        elif obj == 'bokeh.flags':
+            method = getattr(self.env.bk_flags, method_str)
         elif obj == 'octave.equations':
             method = getattr(self.env.oct_eq, method_str)
         elif obj == 'bokeh.export':
             method = getattr(self.env.bk_export, method_str)
 
+        self.call_method(method, args, response=not message.get('no_response', False))
+
+    def call_method(self, method, args=False, response=True):
+        ''' Runs the method and sends the result to JavaScript.
+            If the method returns a LoadingTask, the task is started and
+            the response is sent when the task ends
+        '''
         result = False
         try:
             if args is not False and method is not False:
@@ -150,26 +166,42 @@ class ElectronBokehBridge(Environment):
             else:
                 result = method()
         except Exception as e:
-            if isinstance(e, ValidationError):  # no traceback is needed
-                self.error_js(str(e), err_type='Validation Error')  # to remove the apostrophes on both sides
-            else:
-                trace = traceback.format_exc()
-                lg.exception('')  # the traceback is printed here
+            self.send_exception(e)
+        else:
+            if isinstance(result, LoadingTask):
+                result.start()
+            elif response:
                 self.run_js_code(
-                    signal='python-error',
-                    params=trace
+                    signal='python-response',
+                    params=result
                 )
+
+    def send_exception(self, e):
+        ''' It should be called in the except block, to get the traceback '''
+        if isinstance(e, ValidationError):  # no traceback is needed
+            self.error_js(str(e), err_type='Validation Error')  # to remove the apostrophes on both sides
         else:
+            trace = traceback.format_exc()
+            lg.exception('')  # the traceback is printed here
             self.run_js_code(
-                signal='python-response',
-                params=result
+                signal='python-error',
+                params=trace
             )
 
+    def _in_doc_thread(self):
+        ''' Whether the current thread can modify the bokeh document or not.
+            Other threads (the LoadingTask) should use doc.add_next_tick_callback
+        '''
+        return threading.get_ident() == self.doc_thread
+
     def run_js_code(self, signal, params={}):
         """ General method to run JavaScript inside the iframe
             The signal is sent to the bokeh_renderer.js file
             TODO: they are developing a better way to run JavaScript directly
         """
+        if not self._in_doc_thread():
+            self.env.doc.add_next_tick_callback(partial(self.run_js_code, signal, params))
+            return
         if params != {}:
             params = json.dumps(params, sort_keys=True)
         if len(params) < 5000:
@@ -192,6 +224,9 @@ class ElectronBokehBridge(Environment):
             The signal is sent to the main_renderer.js file
             and calls the 'js_call' method in the tools.js file
         """
+        if not self._in_doc_thread():
+            self.env.doc.add_next_tick_callback(partial(self.call_js, params))
+            return
         if params != {}:
             params = json.dumps(params, sort_keys=True)
         lg.info('>> CALL JS PARAMS: {}'.format(params))
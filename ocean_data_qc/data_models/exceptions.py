@@ -46,3 +46,8 @@ class UserError(Exception, Environment):
         return repr(
             'USER ERROR: {}'.format(self.value)
         )
+
+
+class LoadingCancelled(Exception):
+    ''' Raised inside the loading thread when the user cancels the loading of the file '''
+    pass
@@ -10,11 +10,13 @@ from ocean_data_qc.env import Environment
 
 from configparser import ConfigParser
 from collections import OrderedDict
+from copy import deepcopy
 from more_itertools import unique_everseen
 from os import path
 import os
 import json
 import shutil
+import threading
 from hashlib import md5
 from jinja2 import Template
 
@@ -52,11 +54,18 @@ class FilesHandler(Environment):
     ''' Mainly this manages all the JSON files.
         TODO: Move all the asyncronous tasks on Electron with files to this file if possible
         TODO: the config file could be here as well
+
+        The parsed JSON files are cached in memory: {f_path: (mtime_ns, size, content)}
+        A file is parsed again only if its modification time or its size changed.
+        The writes of this class update the cache as well (write-through), and
+        Electron calls invalidate_cache when it writes any JSON file.
     '''
     env = Environment
 
     def __init__(self):
         self.env.f_handler = self
+        self._json_cache = {}
+        self._json_lock = threading.Lock()      # the LoadingTask reads the settings in its own thread
 
     def load_data(self):
         lg.info('-- LOAD DATA (FilesHandler class)')
@@ -98,10 +107,9 @@ class FilesHandler(Environment):
         '''
         self.graphs = []
         if path.isfile(path.join(TMP, 'settings.json')):
-            with open(path.join(TMP, 'settings.json'), 'r') as f:
-                config = json.load(f,  object_pairs_hook=OrderedDict)
+            config = self._read_json(path.join(TMP, 'settings.json'))
             if 'qc_plot_tabs' in config:
-                self.env.qc_plot_tabs = config.get('qc_plot_tabs', False)
+                self.env.qc_plot_tabs = deepcopy(config.get('qc_plot_tabs', False))
                 cols = []
                 i = 0
                 for tab in self.env.qc_plot_tabs:
@@ -125,26 +133,23 @@ class FilesHandler(Environment):
         '''
         lg.info('-- REMOVE COLS FROM QC PLOT TABS. REMOVING: {}'.format(cols))
         if cols != [] and path.isfile(path.join(TMP, 'settings.json')):
-            config = {}
             tabs = {}
-            with open(path.join(TMP, 'settings.json'), 'r') as f:
-                config = json.load(f,  object_pairs_hook=OrderedDict)
-                if 'qc_plot_tabs' in config:
-                    tabs = config.get('qc_plot_tabs', False)
-                    tabs_to_rmv = []
-                    for tab in tabs:
-                        graphs_to_rmv = []
-                        for graph in tabs[tab]:
-                            if graph.get('x', '') in cols or graph.get('y', '') in cols:
-                                graphs_to_rmv.append(graph)
-                        for g in graphs_to_rmv:
-                            tabs[tab].remove(g)
-                        if tabs[tab] == []:  # if all the plot of some tab were removed
-                            tabs_to_rmv.append(tab)
-                    for t in tabs_to_rmv:
-                        del tabs[t]   # >> take into account that here config is also updated
-            with open(path.join(TMP, 'settings.json'), 'w') as f:
-                json.dump(config, f, indent=4, sort_keys=True)
+            config = deepcopy(self._read_json(path.join(TMP, 'settings.json')))
+            if 'qc_plot_tabs' in config:
+                tabs = config.get('qc_plot_tabs', False)
+                tabs_to_rmv = []
+                for tab in tabs:
+                    graphs_to_rmv = []
+                    for graph in tabs[tab]:
+                        if graph.get('x', '') in cols or graph.get('y', '') in cols:
+                            graphs_to_rmv.append(graph)
+                    for g in graphs_to_rmv:
+                        tabs[tab].remove(g)
+                    if tabs[tab] == []:  # if all the plot of some tab were removed
+                        tabs_to_rmv.append(tab)
+                for t in tabs_to_rmv:
+                    del tabs[t]   # >> take into account that here config is also updated
+            self._write_json(path.join(TMP, 'settings.json'), config)
 
     @property
     def graphs_per_tab(self):
@@ -167,41 +172,40 @@ class FilesHandler(Environment):
         lg.info('-- GET LAYOUT SETTINGS')
         ly_settings = {}
         if path.isfile(path.join(TMP, 'settings.json')):
-            with open(path.join(TMP, 'settings.json'), 'r') as f:
-                config = json.load(f)
-                if 'layout' in config:
-                    ly = config.get('layout', False)
-                    ly_settings['ncols'] = ly.get('plots_per_row', 3)
-                    ly_settings['plot_width'] = ly.get('plots_width', 400)
-                    ly_settings['plot_height'] = ly.get('plots_height', 400)
+            config = self._read_json(path.join(TMP, 'settings.json'))
+            if 'layout' in config:
+                ly = config.get('layout', False)
+                ly_settings['ncols'] = ly.get('plots_per_row', 3)
+                ly_settings['plot_width'] = ly.get('plots_width', 400)
+                ly_settings['plot_height'] = ly.get('plots_height', 400)
         return ly_settings if ly_settings != {} else False
 
     def _load_settings(self):
         ''' Load some settings into object attributes '''
         if path.isfile(path.join(TMP, 'settings.json')):
-            with open(path.join(TMP, 'settings.json'), 'r') as f:
-                config = json.load(f)
-                if 'layout' in config:
-                    ly = config.get('layout', False)
-                    if ly is not False:
-                        self.env.show_titles = ly.get('titles')
+            config = self._read_json(path.join(TMP, 'settings.json'))
+            if 'layout' in config:
+                ly = config.get('layout', False)
+                if ly is not False:
+                    self.env.show_titles = ly.get('titles')
 
     def remove_tmp_folder(self):
         lg.warning('-- REMOVE TMP FOLDER')
+        self.env.cd_writer.discard()
         shutil.rmtree(TMP)
+        self.invalidate_cache()
 
     def get(self, attr, f_path):
         """ Gets data from json files
             * attr: attribute to get
             * f_path: file path where the file is located
 
-            NOTE: This method should be avoided because access to hard disk is very costly
+            NOTE: the file is only read if it was modified, a copy of the cached value is returned
         """
         # lg.info('-- GET ATTR: {} | FROM FILE: {}'.format(attr, f_path))
-        with open(f_path, 'r') as f:
-            json_content = json.load(f)
+        json_content = self._read_json(f_path)
         if attr in json_content:
-            return json_content[attr]
+            return deepcopy(json_content[attr])
         else:
             lg.warning(f'>> The attribute {attr} is not in the JSON file: {f_path}')
 
@@ -211,12 +215,11 @@ class FilesHandler(Environment):
             * value: new value to set
             * f_path: file path where the file is located
         '''
-        with open(f_path, 'r') as f:
-            json_content = json.load(f)
+        json_content = self._read_json(f_path)
         if attr in json_content:
+            json_content = dict(json_content)       # the cached content is not modified in place
             json_content[attr] = value
-            with open(f_path, 'w') as fp:
-                json.dump(json_content, fp, indent=4, sort_keys=True)
+            self._write_json(f_path, json_content)
         else:
             lg.warning(f'>> The attribute {attr} is not in the JSON file: {f_path}')
 
@@ -225,11 +228,8 @@ class FilesHandler(Environment):
               * basic
               * required
               * non_qc_param
-
-              TODO: this is called many times, try to access to disk less by storing the
-                    content of columns somewhere (it just has to be updated when the user modify it)
         '''
-        cols = self.get('columns', CUSTOM_SETTINGS) or {}
+        cols = self._read_json(CUSTOM_SETTINGS).get('columns', {}) or {}
         l = []
         for c in cols:
             if attr in cols[c]['attrs']:
@@ -237,6 +237,50 @@ class FilesHandler(Environment):
         l = sorted(l)
         return l
 
+    def invalidate_cache(self, args={}):
+        ''' Called from Electron after writing some JSON file:
+                args = {'f_path': path of the file}   # all the files if it is not set
+        '''
+        f_path = args.get('f_path', False) if isinstance(args, dict) else False
+        with self._json_lock:
+            if f_path:
+                self._json_cache.pop(self._cache_key(f_path), None)
+            else:
+                self._json_cache = {}
+        if self.env.cp_registry is not None:
+            self.env.cp_registry.invalidate()
+
+    def _cache_key(self, f_path):
+        return path.normcase(path.abspath(f_path))
+
+    def _read_json(self, f_path):
+        ''' Returns the parsed content of the JSON file, from the cache if the file was not modified.
+            NOTE: the content is shared, it must not be modified in place
+        '''
+        key = self._cache_key(f_path)
+        st = os.stat(f_path)
+        with self._json_lock:
+            cached = self._json_cache.get(key)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return cached[2]
+        with open(f_path, 'r') as f:
+            content = json.load(f)
+        with self._json_lock:
+            self._json_cache[key] = (st.st_mtime_ns, st.st_size, content)
+        return content
+
+    def _write_json(self, f_path, content):
+        ''' Writes the file and caches the content as it would be read from the file '''
+        text = json.dumps(content, indent=4, sort_keys=True)
+        tmp_path = f_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, f_path)       # the file is never half written
+        st = os.stat(f_path)
+        with self._json_lock:
+            self._json_cache[self._cache_key(f_path)] = (st.st_mtime_ns, st.st_size, json.loads(text))
+
+
 class BokehTemplate(Template):
     def render(self, *args, **kwargs):
         ''' Adds a hash to the end of the url resources if `with_hash`
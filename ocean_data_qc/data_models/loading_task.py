@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from bokeh.util.logconfig import bokeh_logger as lg
+from ocean_data_qc.env import Environment
+from ocean_data_qc.constants import *
+from ocean_data_qc.data_models.exceptions import ValidationError, LoadingCancelled
+
+import threading
+import time
+
+
+class LoadingTask(Environment):
+    ''' Runs the loading of the cruise data in a worker thread, so the bokeh server
+        keeps answering the messages from Electron meanwhile (the cancel button for instance).
+
+            * The bridge method returns the task instead of the result, the task is started
+              by the bridge and the response is sent when it ends
+            * The stage and the rows read are sent to Electron with the 'load-progress' signal
+            * Each progress report checks if the task was cancelled. If so, the LoadingCancelled
+              exception stops the loading and the rollback is run
+            * @on_done is run in the thread of the bokeh document, because the bokeh models
+              can only be modified there. Its result is the response to Electron
+
+        NOTE: the messages to Electron are sent in the next tick of the document as well,
+              run_js_code schedules them when it is called from this thread
+    '''
+    env = Environment
+    REPORT_INTERVAL = 0.25              # seconds between two reports of the rows read
+
+    def __init__(self, target, on_done=None, rollback='cd'):
+        self.target = target
+        self.on_done = on_done
+        self.rollback = rollback
+        self.stage = ''
+        self._cancel_event = threading.Event()
+        self._last_report = 0.0
+        self.thread = threading.Thread(target=self._run, name='loading_task', daemon=True)
+
+    def start(self):
+        lg.info('-- START LOADING TASK')
+        self.env.loading_task = self
+        self.thread.start()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        lg.warning('-- CANCEL LOADING TASK')
+        self._cancel_event.set()
+
+    def progress(self, stage=None, rows=None):
+        ''' Sends the progress to Electron. The new stages are always sent,
+            the number of rows read only every REPORT_INTERVAL seconds
+        '''
+        if self.cancelled:
+            raise LoadingCancelled()
+        now = time.monotonic()
+        if stage is not None:
+            self.stage = stage
+        elif now - self._last_report < self.REPORT_INTERVAL:
+            return
+        self._last_report = now
+        self.env.bk_bridge.run_js_code(
+            signal='load-progress',
+            params={'stage': self.stage, 'rows': rows}
+        )
+
+    def _run(self):
+        try:
+            self.target()
+        except LoadingCancelled:
+            self.env.loading_task = None
+            ValidationError('The loading was cancelled by the user.', rollback=self.rollback)
+            self.env.bk_bridge.run_js_code(
+                signal='python-response',
+                params={'cancelled': True}
+            )
+        except Exception as e:
+            self.env.loading_task = None
+            self.env.bk_bridge.send_exception(e)
+        else:
+            self.env.loading_task = None
+            self.env.doc.add_next_tick_callback(self._done)
+
+    def _done(self):
+        lg.info('-- LOADING TASK DONE')
+        if self.on_done is not None:
+            self.env.bk_bridge.call_method(self.on_done)
+        else:
+            self.env.bk_bridge.run_js_code(signal='python-response', params=True)
@@ -33,6 +33,15 @@ class OctaveEquations(Environment):
     '''
     env = Environment
 
+    # equations that read the columns from the DF directly instead of receiving them as arguments.
+    # They are not computed row by row, the result depends on all the values of the columns.
+    # They add a move to the actions history, unless they are called with log=False
+    DF_INPUTS = {
+        'nitrate_combined': ['NITRAT', 'NITRIT', 'NO2_NO3'],
+        'salinity_combined': ['CTDSAL', 'SALNTY', 'CTDSAL' + FLAG_END, 'SALNTY' + FLAG_END],
+        'oxygen_combined': ['CTDOXY', 'OXYGEN', 'CTDOXY' + FLAG_END, 'OXYGEN' + FLAG_END],
+    }
+
     def __init__(self):
         lg.info('-- INIT OCTAVE EXECUTABLE')
         self.env.oct_eq = self
@@ -130,7 +139,7 @@ class OctaveEquations(Environment):
         #depth[np.isnan(depth)] = depth_from_pres[np.isnan(depth)]
         return depth_from_pres
 
-    def nitrate_combined(self):
+    def nitrate_combined(self, log=True):
         ''' NO2_NO3 is the sum of NITRAT and NITRIT, sometimes both are reported separately.
             Some other times we need to get the NITRATE from the difference NO2_NO3 - NITRIT.
             NO2_NO3 exists because there are some devices that take the measures together.
@@ -165,26 +174,29 @@ class OctaveEquations(Environment):
             ret = pd.Series([np.nan] * len(df.index))
             msg = '_NITRATE is an empty column because NITRAT and NO2_NO3 columns do not exist or they are all NaN'
 
-        self.env.cruise_data.add_moves_element('column_combined', msg)
+        if log:
+            self.env.cruise_data.add_moves_element('column_combined', msg)
         lg.warning(f'>> {msg}')
         return ret
 
-    def salinity_combined(self):
+    def salinity_combined(self, log=True):
         return self.column_combined(
             msg='Salinity combined in the column _SALINITY.',
-            col1='CTDSAL', col2='SALNTY'
+            col1='CTDSAL', col2='SALNTY', log=log
         )
 
-    def oxygen_combined(self):
+    def oxygen_combined(self, log=True):
         return self.column_combined(
             msg='Oxygen combined in the column _OXYGEN.',
-            col1='CTDOXY', col2='OXYGEN'
+            col1='CTDOXY', col2='OXYGEN', log=log
         )
 
-    def column_combined(self, msg, col1, col2):
+    def column_combined(self, msg, col1, col2, log=True):
         ''' @msg - the beginning of the message that is shown in the actions history
             @col1 - the first column name to combine, more precise than the second
             @col1 - the second column name to combine
+            @log - add the message to the actions history. It is False when the column
+                   is only updated after a flag edit
         '''
         msg = msg
         df = self.env.cruise_data.df
@@ -197,12 +209,12 @@ class OctaveEquations(Environment):
             COL2 = False
 
         if COL1 and not COL2:
-            ret = df[col1].to_numpy()
+            ret = df[col1].to_numpy(dtype=np.float64, copy=True)
             ret[(df[f'{col1}{FLAG_END}'] > 2) & (df[f'{col1}{FLAG_END}'] != 6)] = np.nan
             msg += f' {col1} was taken because {col2} is empty or does not exist.'
             msg += ' Values with flags 3, 4 and 5 were set to NaN.'
         elif COL2 and not COL1:
-            ret = df[col2].to_numpy()
+            ret = df[col2].to_numpy(dtype=np.float64, copy=True)
             ret[(df[f'{col2}{FLAG_END}'] > 2) & (df[f'{col2}{FLAG_END}'] != 6)] = np.nan
             msg += f' {col2} was taken because {col1} is empty or does not exist.'
             msg += ' Values with flags 3, 4 and 5 were set to NaN.'
@@ -210,10 +222,10 @@ class OctaveEquations(Environment):
             ret = pd.Series([np.nan] * len(df.index))
             msg += f' {col1} and {col2} do not exist'
         else:
-            col1_arr = df[col1].to_numpy()
+            col1_arr = df[col1].to_numpy(dtype=np.float64, copy=True)
             # TODO: inform if there is some change here to the user
             col1_arr[(df[f'{col1}{FLAG_END}'] > 2) & (df[f'{col1}{FLAG_END}'] != 6)] = np.nan
-            col2_arr = df[col2].to_numpy()
+            col2_arr = df[col2].to_numpy(dtype=np.float64, copy=True)
             col2_arr[(df[f'{col2}{FLAG_END}'] > 2) & (df[f'{col2}{FLAG_END}'] != 6)] = np.nan
             msg += f' Values from {col1} and {col2} columns with flags 3, 4 and 5 were set to NaN.'
 
@@ -238,7 +250,8 @@ class OctaveEquations(Environment):
                     msg += f' Not filling gaps with {col1} as mean deviation is {dev:.4f} and trying to calibrate gots a R^2={rsq:.3f}'
                     ret = col2_arr
 
-        self.env.cruise_data.add_moves_element('column_combined', msg)
+        if log:
+            self.env.cruise_data.add_moves_element('column_combined', msg)
         lg.warning(f'>> {msg}')
         return ret
 
@@ -274,19 +287,19 @@ class OctaveEquations(Environment):
         return ret
 
     def nitrat_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.nitrat_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.nitrat_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
 
     def phspht_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.phspht_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.phspht_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
 
     def silcat_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.silcat_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.silcat_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
 
     def alkali_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.alkali_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.alkali_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
 
     def tcarbn_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.tcarbn_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.tcarbn_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
 
     def phts25p0_nncanyonb_bit18(self, DATE, LATITUDE, LONGITUDE, PRES, CTDTMP, SAL, OXY):
-        return self.oc.phts25p0_nncanyonb_bit18(np.transpose(np.vstack((DATE.to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
+        return self.oc.phts25p0_nncanyonb_bit18(np.transpose(np.vstack((pd.to_numeric(DATE, errors='coerce').to_numpy() // 10000, LATITUDE, LONGITUDE, -1 * PRES, CTDTMP, SAL, OXY))))
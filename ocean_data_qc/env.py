@@ -107,7 +107,10 @@ class Environment(object):
     f_handler = None                # Files handler (mainly to extract and update JSON files), tabs are managed here as well
     cruise_data = None              # Cruise Data object
     cd_handler = None               # Cruise Data Handler
+    cd_writer = None                # Writes the project files in the background
     cd_update = None                # Cruise Data Update, update values from a similar CSV file
     cd_aux = None                   # Cruise Data Auxiliar, used to make comparisons in with cd_update
+    loading_task = None             # Background loading of the cruise data, it can be cancelled
     cp_param = None                 # Computer Parameters
+    cp_registry = None              # Definitions of the computed parameters of the project, parsed once
     oct_eq = None                   # Octave Executable Path Manager
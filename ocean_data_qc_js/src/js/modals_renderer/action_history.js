@@ -11,9 +11,6 @@ app_module_path.addPath(path.join(__dirname, '../modules'));
 app_module_path.addPath(path.join(__dirname, '../renderer_modules'));
 app_module_path.addPath(__dirname);
 
-const fs = require('fs');
-const csv_parse = require('csv-parse');
-
 const loc = require('locations');
 const lg = require('logging');
 const data = require('data');
@@ -21,57 +18,69 @@ const tools = require('tools');
 
 
 module.exports = {
+    page_size: 100,
+
     load: function() {
+        // The moves are read from the database by pages
         var self = this;
-        var moves_path = path.join(loc.proj_files, 'moves.csv');
-        fs.readFile(moves_path, 'utf8', (err, buffer) => {
-            if (err) {
+        self.page = 0;
+        $('#moves_prev').click(() => { self.load_page(self.page - 1); });
+        $('#moves_next').click(() => { self.load_page(self.page + 1); });
+        self.load_page(0, () => {
+            $('#modal_trigger_moves').click();
+        });
+    },
+
+    load_page: function(page, callback=null) {
+        var self = this;
+        var params = {
+            'object': 'cruise.data.moves',
+            'method': 'query',
+            'args': {
+                'page': page,
+                'page_size': self.page_size,
+            }
+        }
+        tools.call_promise(params).then((result) => {
+            if (result == null) {
                 tools.show_modal({
                     'msg_type': 'text',
                     'type': 'ERROR',
-                    'msg': 'The moves file could not be read.',
+                    'msg': 'The list of the actions could not be loaded',
                 });
-            } else {
-                self.buffer = buffer;
-                self.parse_csv();
+                return;
+            }
+            self.page = result['page'];
+            self.show_rows(result);
+            if (callback != null) {
+                callback();
             }
         });
     },
 
-    parse_csv: function() {
+    show_rows: function(result) {
         var self = this;
-        csv_parse(self.buffer, function(err, records){
-            if (records.length > 1) {
-                if (err) {
-                    tools.show_modal({
-                        'msg_type': 'text',
-                        'type': 'ERROR',
-                        'msg': 'The list of the actions could not be loaded',
-                    });
-                } else {
-                    const INDEX = 0;
-                    const DATE = 1;
-                    const ACTION = 2;
-                    const DESCRIPTION = 10;
-                    for (var i = 1; i < records.length; i++) {
-                        // null values are empty strings => ''
-                        var row = [
-                            '<tr>',
-                            '<th scope="row">' + records[i][INDEX] + '</th>',
-                            '<td>' + records[i][DATE] + '</td>',
-                            '<td>' + records[i][ACTION] + '</td>',
-                            '<td>' + records[i][DESCRIPTION] + '</td>',
-                            '</tr>'
-                        ];
-                        lg.info('FILA: ' + row.join(''));
-                        $('#table_moves tbody').append(row.join(''));
-                    }
-                    $('#modal_trigger_moves').click();
-                }
-            } else {
-                $('#div_table_moves').text('There is no changes to show');
-                $('#modal_trigger_moves').click();
-            }
+        if (result['total'] == 0) {
+            $('#div_table_moves').text('There is no changes to show');
+            $('#moves_pagination').attr('hidden', '');
+            return;
+        }
+        $('#table_moves tbody').empty();
+        result['rows'].forEach((move) => {
+            // null values are empty strings => ''
+            var row = [
+                '<tr>',
+                '<th scope="row">' + move['index'] + '</th>',
+                '<td>' + move['date'] + '</td>',
+                '<td>' + move['action'] + '</td>',
+                '<td>' + move['description'] + '</td>',
+                '</tr>'
+            ];
+            $('#table_moves tbody').append(row.join(''));
         });
+        var n_pages = Math.max(Math.ceil(result['total'] / result['page_size']), 1);
+        $('#moves_page').text('Page ' + (result['page'] + 1) + ' of ' + n_pages + ' (' + result['total'] + ' actions)');
+        $('#moves_prev').prop('disabled', result['page'] == 0);
+        $('#moves_next').prop('disabled', result['page'] + 1 >= n_pages);
     }
 }
@@ -38,6 +38,7 @@ module.exports = {
                 var url = path.join(loc.modals, 'tab_project.html');
                 tools.load_modal(url, function() {
                     self.file_path = args.file_path;
+                    self.file_paths = args.file_paths || [args.file_path];
                     self.file_type = args.file_type;
                     $('#project_name').val(path.basename(
                         self.file_path,
@@ -72,6 +73,8 @@ module.exports = {
         var self = this;
         if (['xlsx', 'ods'].includes(self.file_type)) {
             self.cp_original_csv_from_excel();
+        } else if (self.file_type == 'multi') {
+            self.cp_original_files();
         } else{
             var a = fs.createReadStream(self.file_path)
             var c = fs.createWriteStream(path.join(loc.proj_files, 'original.csv'))
@@ -90,6 +93,36 @@ module.exports = {
         }
     },
 
+    /** The files of a multi-file project are copied in the originals folder with their names.
+     *  The python side merges them and writes original.csv afterwards
+     */
+    cp_original_files: function() {
+        var self = this;
+        var originals = path.join(loc.proj_files, 'originals');
+        fs.mkdir(originals, function(err) {
+            if (err) {
+                tools.showModal('ERROR', 'Something went wrong creating the originals folder');
+                return;
+            }
+            var pending = self.file_paths.length;
+            var failed = false;
+            self.file_paths.forEach(function(f) {
+                fs.copyFile(f, path.join(originals, path.basename(f)), function(err) {
+                    if (failed) return;
+                    if (err) {
+                        failed = true;
+                        tools.showModal('ERROR', 'The file ' + path.basename(f) + ' could not be read');
+                        return;
+                    }
+                    pending -= 1;
+                    if (pending == 0) {
+                        self.create_moves_csv();
+                    }
+                });
+            });
+        });
+    },
+
     cp_original_csv_from_excel: function() {
         lg.info('-- CP ORIGINAL CSV FROM EXCEL');
         var self = this;
@@ -170,6 +203,9 @@ module.exports = {
             'method': 'get_cruise_data_columns',
         };
         tools.call_promise(call_params).then((cols_dict) => {
+            if (cols_dict === null || 'cancelled' in cols_dict) {  // the temp folder was already removed
+                return;
+            }
             self.file_columns = cols_dict['cols'];
             self.cps_columns = cols_dict['cps'];
             self.params = cols_dict['params'];
@@ -88,6 +88,7 @@ module.exports = {
                 self.path,
                 JSON.stringify(self.data, null, 4), 'utf-8'
             );
+            self.invalidate_python_cache(self.path);
             return true;
         } catch(err) {
             throw err;
@@ -111,6 +112,7 @@ module.exports = {
                 self.path,
                 JSON.stringify(self.data, null, 4), 'utf-8'
             );
+            self.invalidate_python_cache(self.path);
         }catch(err){
             throw err;
         }
@@ -127,6 +129,7 @@ module.exports = {
             var data_str = JSON.stringify(self.data, null, 4);
             fs.writeFile(self.path, data_str, 'utf-8', (err) => {
                 if (err) resolve(false);
+                self.invalidate_python_cache(self.path);
                 resolve(true);
             });
         });
@@ -139,6 +142,24 @@ module.exports = {
         self.write(dict);
     },
 
+    invalidate_python_cache: function(path) {
+        // The python side caches the JSON files checking the modification time and the size,
+        // but a file rewritten quickly with the same size may keep the same mtime in some file systems.
+        // This only works in the renderer process, where the bokeh iframe is
+        if (typeof(document) === 'undefined') return;
+        var iframe = document.getElementById('bokeh_iframe');
+        if (iframe === null || iframe.contentWindow === null) return;
+        iframe.contentWindow.postMessage({
+            'signal': 'call-python-promise',
+            'message_data': {
+                'object': 'files.handler',
+                'method': 'invalidate_cache',
+                'args': {'f_path': path},
+                'no_response': true,
+            }
+        }, '*');
+    },
+
     print: function() {
         var self = this;
         lg.info('PRINTING DATA: ' + JSON.stringify(self.data, null, 4));
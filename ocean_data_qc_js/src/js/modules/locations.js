@@ -49,6 +49,7 @@ const locations = {
     'proj_settings': path.join(__user_data, 'files/tmp/settings.json'),
     'proj_data': path.join(__user_data, 'files/tmp/data.csv'),
     'proj_moves': path.join(__user_data, 'files/tmp/moves.csv'),
+    'proj_pending_writes': path.join(__user_data, 'files/tmp/pending_writes'),
     'proj_files': path.join(__user_data, 'files/tmp'),
     'proj_upd': path.join(__user_data, 'files/tmp/update'),
     'proj_export': path.join(__user_data, 'files/tmp/export'),
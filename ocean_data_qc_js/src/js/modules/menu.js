@@ -39,7 +39,7 @@ module.exports = {
         var bokeh_menu = [
             self.bokeh_file_menu,
             self.bokeh_view_menu,
-            // self.bokeh_edit_menu,  // elements are no non-selectable, undo and redo not implemented
+            self.bokeh_edit_menu,
             self.bokeh_data_menu,
             self.help_menu,
         ];
@@ -130,17 +130,16 @@ module.exports = {
             ]
         }
 
-        // this menu is not working anymore
+        // undo and redo the flag updates, or the text edition if some input is focused
         self.bokeh_edit_menu = {
             label: 'Edit',
             submenu: [
-                { label: "Undo [TO-DO]", accelerator: "CmdOrCtrl+Z", selector: "undo:" },
-                { label: "Redo [TO-DO]", accelerator: "Shift+CmdOrCtrl+Z", selector: "redo:" },
-                { type: "separator" },
-                { label: "Cut", accelerator: "CmdOrCtrl+X", selector: "cut:" },
-                { label: "Copy", accelerator: "CmdOrCtrl+C", selector: "copy:" },
-                { label: "Paste", accelerator: "CmdOrCtrl+V", selector: "paste:" },
-                { label: "Select All", accelerator: "CmdOrCtrl+A", selector: "selectAll:" }
+                { label: 'Undo', accelerator: 'CmdOrCtrl+Z', click: () => { self.web_contents.send('undo-flag-update'); } },
+                { label: 'Redo', accelerator: 'Shift+CmdOrCtrl+Z', click: () => { self.web_contents.send('redo-flag-update'); } },
+                { type: 'separator' },
+                { label: 'Cut', accelerator: 'CmdOrCtrl+X', role: 'cut' },
+                { label: 'Copy', accelerator: 'CmdOrCtrl+C', role: 'copy' },
+                { label: 'Paste', accelerator: 'CmdOrCtrl+V', role: 'paste' }
             ]
         }
 
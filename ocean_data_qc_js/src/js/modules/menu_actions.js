@@ -36,7 +36,7 @@ module.exports = {
         lg.info('-- UPDATE FROM CSV')
         dialog.showOpenDialog({
             title: 'Open the AQC file...',
-            filters: [{ name: 'AtlantOS Ocean Data QC file', extensions: ['csv'] }],
+            filters: [{ name: 'AtlantOS Ocean Data QC file', extensions: ['csv', 'nc'] }],
             properties: ['openFile'],
         }).then(result => {
             lg.info(result);
@@ -54,7 +54,7 @@ module.exports = {
             return;
         }
         var file_path = file_paths[0];
-        if (mime.lookup(file_path) == 'text/csv') {
+        if (['text/csv', 'application/x-netcdf'].includes(mime.lookup(file_path))) {
             lg.info('Importing the CSV file name to the temporal folder...');
             try {
                 if (!fs.existsSync(loc.proj_upd)) {  // TODO: remove folder if it is already created
@@ -85,8 +85,8 @@ module.exports = {
         var self = this;
         dialog.showOpenDialog({
             title: 'Open the AQC file...',
-            filters: [{ name: 'AtlantOS Ocean Data QC file', extensions: ['aqc', 'csv', 'xlsx', 'ods'] }],
-            properties: ['openFile'],
+            filters: [{ name: 'AtlantOS Ocean Data QC file', extensions: ['aqc', 'csv', 'xlsx', 'ods', 'nc'] }],
+            properties: ['openFile', 'multiSelections'],   // several csv or nc files are merged in one project
         }).then(result => {
             lg.info(result);
             if (result['canceled'] === false) {
@@ -102,7 +102,7 @@ module.exports = {
         self.web_contents.send('show-wait-cursor');
         fs.access(loc.proj_files, fs.constants.F_OK, (err) => {
             if (err) {  // if the folder does not exist
-                self.open_by_mime_type(file_paths[0]);
+                self.open_files(file_paths);
             } else {
                 rmdir(loc.proj_files, function(err) {  // if there was some folder from the previous execution
                     if (err) {
@@ -112,7 +112,7 @@ module.exports = {
                             code: err.stack
                         });
                     } else {
-                        self.open_by_mime_type(file_paths[0]);
+                        self.open_files(file_paths);
                     }
                 });
             }
@@ -120,6 +120,30 @@ module.exports = {
 
     },
 
+    /** Several files are merged in one project. Each of them is parsed in its own process */
+    open_files: function(file_paths) {
+        var self = this;
+        if (file_paths.length == 1) {
+            self.open_by_mime_type(file_paths[0]);
+            return;
+        }
+        var wrong_files = file_paths.filter(function(f) {
+            return !['text/csv', 'application/x-netcdf'].includes(mime.lookup(f));
+        });
+        if (wrong_files.length > 0) {
+            self.web_contents.send('show-modal', {
+                'type': 'ERROR',
+                'msg': 'Only CSV and NetCDF files can be opened together in one project'
+            });
+        } else {
+            self.web_contents.send('tab-project', {
+                'file_path': file_paths[0],
+                'file_paths': file_paths,
+                'file_type': 'multi'
+            });
+        }
+    },
+
     open_by_mime_type: function(file_path) {
         var self = this;
         mime.define(                        // adding new extension to node mime-types
@@ -140,6 +164,11 @@ module.exports = {
                 'file_path': file_path,
                 'file_type': 'csv'
             });
+        } else if (mime_type == 'application/x-netcdf') {  // binary file, copied as original.csv as well
+            self.web_contents.send('tab-project', {
+                'file_path': file_path,
+                'file_type': 'nc'
+            });
         } else if (mime_type == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet') {
             self.web_contents.send('tab-project', {
                 'file_path': file_path,
@@ -153,7 +182,7 @@ module.exports = {
         } else {
             self.web_contents.send('show-modal', {   // it is impossible to get to here, because is out of domain ['csv', 'aqc']
                 'type': 'ERROR',
-                'msg': 'Wrong filetype!! It must be an AQC, CSV, ODS or XLSX file'
+                'msg': 'Wrong filetype!! It must be an AQC, CSV, ODS, XLSX or NetCDF file'
             });
         }
     },
@@ -244,22 +273,28 @@ module.exports = {
             }
             lg.info('>> URL PROJECT FILE: ' + file_path);
             if (file_path !== false && fs.existsSync(file_path)) {
-                try {
-                    zip.zipSync(loc.proj_files, file_path);
-                    self.web_contents.send('enable-watcher', { 'mark': 'saved' });
-                    lg.warn('>> SAVE FROM VALUE: ' + self.save_from);
-                    if (typeof(self.save_from) !== 'undefined' && self.save_from == 'closing_process') {
-                        self.web_contents.send('show-project-saved-dialog')
-                    } else {
-                        self.web_contents.send('show-snackbar', {'msg': 'The project was saved correctly' });
+                self.compact_project_data();
+                self.wait_pending_writes().then(() => {
+                    try {
+                        zip.zipSync(loc.proj_files, file_path);
+                        self.web_contents.send('enable-watcher', { 'mark': 'saved' });
+                        lg.warn('>> SAVE FROM VALUE: ' + self.save_from);
+                        if (typeof(self.save_from) !== 'undefined' && self.save_from == 'closing_process') {
+                            self.web_contents.send('show-project-saved-dialog')
+                        } else {
+                            self.web_contents.send('show-snackbar', {'msg': 'The project was saved correctly' });
+                        }
+                    } catch(err) {
+                        self.web_contents.send('show-modal', {
+                            'type': 'ERROR',
+                            'msg': 'The file could not be saved!'
+                        });
                     }
-                } catch(err) {
-                    self.web_contents.send('show-modal', {
-                        'type': 'ERROR',
-                        'msg': 'The file could not be saved!'
-                    });
-                }
-                resolve(true);
+                    resolve(true);
+                }).catch((err) => {
+                    self.show_pending_writes_error(err);
+                    resolve(false);
+                });
             } else {
                 self.save_file_as();
             }
@@ -280,6 +315,9 @@ module.exports = {
                     title: 'Save Project',
                     defaultPath: '~/examples/' + settings.project_name + '.aqc',    // TODO >> previuos opened folder?? https://github.com/electron/electron/issues/1541
                     filters: [{ extensions: ['aqc'] }]
+            }).then((results) => {
+                self.compact_project_data();
+                return self.wait_pending_writes().then(() => { return results; });
             }).then((results) => {
                 if (results['canceled'] === false) {
                     var file_path = results['filePath'];
@@ -314,6 +352,9 @@ module.exports = {
                     }
                 }
                 resolve(true);
+            }).catch((err) => {
+                self.show_pending_writes_error(err);
+                resolve(false);
             });
         });
     },
@@ -356,27 +397,78 @@ module.exports = {
         if (typeof(fileLocation) !== 'undefined') {
             lg.info('>> No debe entrar por aquí ??');
             var moves_path = path.join(loc.proj_files, 'moves.csv')
-
-            var read = fs.createReadStream(moves_path);
-            read.on("error", function(err) {
-                self.web_contents.send('show-modal', {
-                    'type': 'ERROR',
-                    'msg': 'The file could not be saved!'
-                });
+            self.compact_project_data();    // moves.csv is written from the moves database
+            self.wait_pending_writes().then(() => {
+                self.copy_moves(moves_path, fileLocation);
+            }).catch((err) => {
+                self.show_pending_writes_error(err);
             });
+        }
+    },
 
-            var write = fs.createWriteStream(fileLocation);
-            write.on("error", function(err) {
-                self.web_contents.send('show-modal', {
-                    'type': 'ERROR',
-                    'msg': 'The file could not be saved!'
-                });
+    copy_moves: function(moves_path, fileLocation) {
+        var self = this;
+        var read = fs.createReadStream(moves_path);
+        read.on("error", function(err) {
+            self.web_contents.send('show-modal', {
+                'type': 'ERROR',
+                'msg': 'The file could not be saved!'
             });
-            write.on("close", function(ex) {
-                self.web_contents.send('show-snackbar', {'msg': 'File saved!'});
+        });
+
+        var write = fs.createWriteStream(fileLocation);
+        write.on("error", function(err) {
+            self.web_contents.send('show-modal', {
+                'type': 'ERROR',
+                'msg': 'The file could not be saved!'
             });
-            read.pipe(write);
+        });
+        write.on("close", function(ex) {
+            self.web_contents.send('show-snackbar', {'msg': 'File saved!'});
+        });
+        read.pipe(write);
+    },
+
+    compact_project_data: function() {
+        // The flag edits are stored in a journal file, python writes them in data.csv before the
+        // project is zipped, and moves.csv with the moves database.
+        // The pending_writes file is created here and python removes it when it is done
+        var self = this;
+        try {
+            fs.writeFileSync(loc.proj_pending_writes, '');
+        } catch(err) {
+            lg.warn('>> THE PENDING WRITES FILE COULD NOT BE CREATED: ' + err);
+            return;
         }
+        self.web_contents.send('compact-project-data');
+    },
+
+    wait_pending_writes: function(timeout=10000) {
+        // Python writes the project files in the background after the changes,
+        // the pending_writes file exists while some changes are not written yet
+        return new Promise((resolve, reject) => {
+            var start = Date.now();
+            var check = function() {
+                if (!fs.existsSync(loc.proj_pending_writes)) {
+                    resolve(true);
+                } else if (Date.now() - start > timeout) {
+                    // the marker is kept, the files are not complete yet
+                    lg.warn('>> THE PROJECT FILES ARE STILL BEING WRITTEN');
+                    reject(new Error('The project files are still being written, try it again in a moment'));
+                } else {
+                    setTimeout(check, 100);
+                }
+            };
+            check();
+        });
+    },
+
+    show_pending_writes_error: function(err) {
+        var self = this;
+        self.web_contents.send('show-modal', {
+            'type': 'ERROR',
+            'msg': 'The file could not be saved!<br />' + err.message
+        });
     },
 
     close_project: function() {
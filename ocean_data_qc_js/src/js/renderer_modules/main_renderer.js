@@ -97,6 +97,8 @@ window.onmessage = function(e){
             $('body').data('python_error', e.data.params);
         } else if (e.data.signal == 'js-call') {
             tools.js_call(e.data.params);
+        } else if (e.data.signal == 'load-progress') {
+            tools.show_loading_progress(e.data.params);
         } else if (e.data.signal == 'on-ready') {
             server_renderer.run_on_ready_final_step();
         } else if (e.data.signal == 'deselect-tool' || e.data.signal == 'esc-pressed') {
@@ -213,6 +215,35 @@ ipcRenderer.on('set-octave-path', (event, arg) => {
     server_renderer.set_octave_path(arg.manual_octave_folder_path);
 });
 
+ipcRenderer.on('compact-project-data', (event, arg) => {
+    tools.call_python({
+        'object': 'cruise.data',
+        'method': 'compact_journal',
+    });
+});
+
+ipcRenderer.on('undo-flag-update', (event, arg) => {
+    if ($(document.activeElement).is('input, textarea')) {     // a form is being edited
+        document.execCommand('undo');
+    } else {
+        tools.call_python({
+            'object': 'bokeh.flags',
+            'method': 'undo',
+        });
+    }
+});
+
+ipcRenderer.on('redo-flag-update', (event, arg) => {
+    if ($(document.activeElement).is('input, textarea')) {
+        document.execCommand('redo');
+    } else {
+        tools.call_python({
+            'object': 'bokeh.flags',
+            'method': 'redo',
+        });
+    }
+});
+
 ipcRenderer.on('export-pdf-file', (event, arg) => {
     bokeh_export.export_pdf_file();
 });
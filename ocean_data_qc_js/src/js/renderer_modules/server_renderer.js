@@ -93,6 +93,13 @@ module.exports = {
             }
         }
         tools.call_promise(call_params).then((result) => {
+            if (result !== null && typeof(result) === 'object' && 'cancelled' in result) {
+                $('.loader_container').fadeOut('slow', function() {
+                    $('body').css('overflow-y', 'auto');
+                    $('.welcome_container').fadeIn('slow');
+                });
+                return;
+            }
             self.run_on_ready();
         });
     },
@@ -173,6 +173,22 @@ module.exports = {
         });
     },
 
+    /** Calls a python method without waiting for the response.
+     *  It can be called while a promise is waiting, the response of the promise is not replaced
+     */
+    call_python: function(params={}) {
+        var message = {
+            'object': params.object,
+            'method': params.method,
+            'args': params.args,
+            'no_response': true,
+        }
+        document.getElementById('bokeh_iframe').contentWindow.postMessage({
+            "signal": "call-python-promise",
+            "message_data": message
+        } , '*');
+    },
+
     call_promise: function(params={}) {
         /* The params argument should be something like this
                 params = {
@@ -360,6 +376,32 @@ module.exports = {
         if ($('#loader_mask').css('display') == 'block') {
             $('#loader_mask').css('display', 'none');
         }
+        $('#loading_progress').css('display', 'none');
+    },
+
+    /** Stage and rows read while a file is loaded in the background.
+     *  The loading can be cancelled, the python side runs the rollback then
+     */
+    show_loading_progress: function(params={}) {
+        var self = this;
+        var text = params.stage;
+        if (params.rows !== null && typeof(params.rows) !== 'undefined') {
+            text += ': ' + params.rows.toLocaleString() + ' rows';
+        }
+        $('#loading_progress_text').text(text);
+        if ($('#loading_progress').css('display') == 'none') {
+            $('#cancel_loading').prop('disabled', false);
+            $('#cancel_loading').off('click').on('click', function() {
+                $(this).prop('disabled', true);
+                $('#loading_progress_text').text('Cancelling...');
+                self.call_python({
+                    'object': 'cruise.data.handler',
+                    'method': 'cancel_loading',
+                });
+            });
+            $('#loader_mask').css('display', 'block');
+            $('#loading_progress').css('display', 'block');
+        }
     },
 
     show_loader: function() {
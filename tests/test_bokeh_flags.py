@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from ocean_data_qc.bokeh_models.bokeh_flags import BokehFlags
+from ocean_data_qc.data_models.cruise_data_keys import RowKeys
+from ocean_data_qc.env import Environment
+
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+
+
+class FakeCruiseData(object):
+    def __init__(self, keys, flags):
+        self.df = pd.DataFrame({'SALNTY_FLAG_W': flags}, index=pd.Index(keys, name='HASH_ID'))
+
+    @property
+    def row_keys(self):
+        return RowKeys(self.df.index)
+
+
+@pytest.fixture
+def bk_flags(monkeypatch):
+    ''' The flag updates are applied directly to the DF, the plots are not involved '''
+    monkeypatch.setattr(Environment, 'cruise_data', FakeCruiseData(['a', 'b', 'c', 'd'], [2, 2, 2, 2]))
+    flags = BokehFlags.__new__(BokehFlags)
+    flags.undo_stack = []
+    flags.redo_stack = []
+    flags.messages = []
+
+    def set_flag_values(column, rows, old_values, new_values, action='QC Update'):
+        df = Environment.cruise_data.df
+        df.iloc[rows, df.columns.get_loc(column)] = new_values
+
+    monkeypatch.setattr(flags, '_set_flag_values', set_flag_values)
+    monkeypatch.setattr(flags, '_show_snackbar', flags.messages.append)
+    return flags
+
+
+def test_undo_redo(bk_flags):
+    df = Environment.cruise_data.df
+    bk_flags.update_flag_value(flag_value=4, flag_to_update='SALNTY_FLAG_W', row_indexes=[1, 2])
+    assert df['SALNTY_FLAG_W'].tolist() == [2, 4, 4, 2]
+    bk_flags.undo()
+    assert df['SALNTY_FLAG_W'].tolist() == [2, 2, 2, 2]
+    bk_flags.redo()
+    assert df['SALNTY_FLAG_W'].tolist() == [2, 4, 4, 2]
+
+
+def test_undo_after_update(bk_flags):
+    bk_flags.update_flag_value(flag_value=4, flag_to_update='SALNTY_FLAG_W', row_indexes=[1, 2])
+
+    # a cruise data update removes the row 'a' and adds the row 'e' at the beginning
+    cd = Environment.cruise_data
+    cd.df = pd.DataFrame(
+        {'SALNTY_FLAG_W': [9, 4, 4, 2]},
+        index=pd.Index(['e', 'b', 'c', 'd'], name='HASH_ID')
+    ).iloc[[0, 3, 1, 2]]
+    bk_flags.undo()
+    assert cd.df['SALNTY_FLAG_W'].to_dict() == {'e': 9, 'd': 2, 'b': 2, 'c': 2}
+    bk_flags.redo()
+    assert cd.df['SALNTY_FLAG_W'].to_dict() == {'e': 9, 'd': 2, 'b': 4, 'c': 4}
+
+
+def test_undo_after_removing_the_rows(bk_flags):
+    bk_flags.update_flag_value(flag_value=4, flag_to_update='SALNTY_FLAG_W', row_indexes=[1])
+    cd = Environment.cruise_data
+    cd.df = cd.df.drop(index=['b'])
+    bk_flags.undo()
+    assert cd.df['SALNTY_FLAG_W'].tolist() == [2, 2, 2]
+    assert bk_flags.undo_stack == [] and bk_flags.redo_stack == []
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from ocean_data_qc.data_models.cruise_data_journal import CruiseDataJournal
+
+import pandas as pd
+
+
+KEYS = [
+    '0f' * 15 + '00',       # the last byte is zero
+    '00' * 16,
+    '0123456789abcdef' * 2,
+]
+
+
+def _df():
+    return pd.DataFrame({'SALNTY_FLAG_W': [2, 2, 2]}, index=pd.Index(KEYS, name='HASH_ID'))
+
+
+def test_replay_keys_ending_in_zero_bytes(tmp_path):
+    journal = CruiseDataJournal(str(tmp_path))
+    journal.append('SALNTY_FLAG_W', KEYS[:2], [0, 1], 3)
+    df = _df()
+    assert journal.replay(df) == {'SALNTY_FLAG_W'}
+    assert df['SALNTY_FLAG_W'].tolist() == [3, 3, 2]
+
+
+def test_replay_moved_rows(tmp_path):
+    journal = CruiseDataJournal(str(tmp_path))
+    journal.append('SALNTY_FLAG_W', KEYS, [0, 1, 2], 4)
+    journal.append('SALNTY_FLAG_W', KEYS[:1], [0], 6)
+    df = _df().iloc[::-1].copy()        # the positions stored are not valid anymore
+    CruiseDataJournal(str(tmp_path)).replay(df)
+    assert df.loc[KEYS, 'SALNTY_FLAG_W'].tolist() == [6, 4, 4]
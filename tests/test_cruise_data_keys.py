@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from ocean_data_qc.data_models.cruise_data_keys import RowKeys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _station(stnnbr, n=2000):
+    return pd.DataFrame({
+        'STNNBR': [stnnbr] * n,
+        'CASTNO': np.ones(n),
+        'BTLNBR': np.arange(n) % 36 + 1,
+        'LATITUDE': np.linspace(10, 11, n),
+        'LONGITUDE': np.linspace(-20, -21, n),
+    })
+
+
+def _halves(keys):
+    return np.array([[int(k[:16], 16), int(k[16:], 16)] for k in keys], dtype=np.uint64)
+
+
+@pytest.mark.parametrize('stnnbr', [12, '12'])
+def test_halves_are_independent(stnnbr):
+    h = _halves(RowKeys.build(_station(stnnbr)))
+    assert (h[:, 0] != h[:, 1]).all()
+    # the second half must not follow the first one within a station
+    assert np.unique(h[:, 0] ^ h[:, 1]).size == h.shape[0]
+    bits = np.unpackbits((h[:, 0] ^ h[:, 1]).view(np.uint8))
+    assert 0.47 < bits.mean() < 0.53
+
+
+def test_same_keys_whatever_the_type():
+    df = _station('12', n=10)
+    other = df.astype({'CASTNO': int, 'BTLNBR': float})
+    other['STNNBR'] = ' 12 '
+    assert (RowKeys.build(df) == RowKeys.build(other)).all()
+
+
+def test_duplicates():
+    df = pd.concat([_station('12', n=3), _station('12', n=1)], ignore_index=True)
+    keys = RowKeys(RowKeys.build(df))
+    assert keys.get_duplicates().tolist() == [0, 3]
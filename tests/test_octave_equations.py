@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#    License, authors, contributors and copyright information at:       #
+#    AUTHORS and LICENSE files at the root folder of this application   #
+#########################################################################
+
+from ocean_data_qc.data_models.octave_equations import OctaveEquations
+from ocean_data_qc.env import Environment
+
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def oct_eq(monkeypatch):
+    ''' The equations that read the DF directly do not need octave '''
+    df = pd.DataFrame({
+        'CTDSAL': [35.1, 35.2, 35.3, 35.4],
+        'CTDSAL_FLAG_W': [2, 2, 2, 2],
+    })
+    monkeypatch.setattr(Environment, 'cruise_data', SimpleNamespace(df=df), raising=False)
+    return OctaveEquations.__new__(OctaveEquations)
+
+
+def test_flag_edit_does_not_modify_the_source_column(oct_eq):
+    df = Environment.cruise_data.df
+    df.loc[[1, 2], 'CTDSAL_FLAG_W'] = 4
+    ret = oct_eq.salinity_combined(log=False)
+    assert np.isnan(ret[[1, 2]]).all()
+    assert df['CTDSAL'].tolist() == [35.1, 35.2, 35.3, 35.4]
+
+
+def test_flag_edit_with_both_columns(oct_eq):
+    df = Environment.cruise_data.df
+    df['SALNTY'] = [35.1, 35.2, 35.3, 35.4]
+    df['SALNTY_FLAG_W'] = [2, 2, 2, 3]
+    df.loc[0, 'CTDSAL_FLAG_W'] = 3
+    oct_eq.salinity_combined(log=False)
+    assert df['CTDSAL'].tolist() == [35.1, 35.2, 35.3, 35.4]
+    assert df['SALNTY'].tolist() == [35.1, 35.2, 35.3, 35.4]